@@ -0,0 +1,234 @@
+import os
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional
+
+from fastapi import Depends, HTTPException, status
+from sqlalchemy import exists, or_, select
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import func
+
+from auth import Principal, get_current_principal
+from database import get_db, get_async_db
+from models import Upload, UploadShare
+from services.ttl_cache import TTLCache
+
+# Access decisions are cached per process for a short time. Sharing changes made in
+# this process invalidate immediately; other processes converge within the TTL.
+ACCESS_CACHE_TTL_SECONDS = float(os.getenv("ACCESS_CACHE_TTL_SECONDS", 30))
+ACCESS_CACHE_MAX_ENTRIES = int(os.getenv("ACCESS_CACHE_MAX_ENTRIES", 10000))
+
+access_cache = TTLCache(maxsize=ACCESS_CACHE_MAX_ENTRIES, ttl=ACCESS_CACHE_TTL_SECONDS)
+
+OWNER = "owner"
+SHARED = "shared"
+DENIED = "denied"
+NOT_FOUND = "not_found"
+
+
+@dataclass(frozen=True)
+class AccessDecision:
+    upload_id: str
+    level: str  # owner, shared, denied or not_found
+    owner_id: Optional[str] = None
+
+    @property
+    def allowed(self) -> bool:
+        return self.level in (OWNER, SHARED)
+
+    @property
+    def is_owner(self) -> bool:
+        return self.level == OWNER
+
+
+def _upload_key(upload_id) -> str:
+    """Canonical cache key, so every spelling of one UUID shares (and loses) the same entries"""
+    try:
+        return str(uuid.UUID(str(upload_id)))
+    except ValueError:
+        return str(upload_id)
+
+
+def invalidate_upload_access(upload_id):
+    """Forget cached decisions for an upload (share created/revoked, upload deleted)"""
+    upload_key = _upload_key(upload_id)
+    access_cache.invalidate_where(lambda key: key[0] == upload_key)
+
+
+def _active_share_filter(user_id):
+    return (
+        UploadShare.upload_id == Upload.id,
+        UploadShare.shared_with_user_id == user_id,
+        or_(UploadShare.expires_at.is_(None), UploadShare.expires_at > func.now())
+    )
+
+
+def _access_columns(user_id):
+    """Upload owner, whether an unexpired share exists and when it expires"""
+    share_expires_at = select(UploadShare.expires_at).where(
+        *_active_share_filter(user_id)
+    ).order_by(UploadShare.expires_at.desc().nullsfirst()).limit(1).correlate(Upload).scalar_subquery()
+
+    return (
+        Upload.user_id,
+        exists().where(*_active_share_filter(user_id)).label("has_share"),
+        share_expires_at.label("share_expires_at")
+    )
+
+
+def _access_statement(upload_id: uuid.UUID, user_id):
+    return select(*_access_columns(user_id)).where(Upload.id == upload_id)
+
+
+def _access_many_statement(upload_ids: List[uuid.UUID], user_id):
+    return select(Upload.id, *_access_columns(user_id)).where(Upload.id.in_(upload_ids))
+
+
+def _decide(upload_key: str, user_id, row) -> AccessDecision:
+    ttl = None
+    if not row:
+        decision = AccessDecision(upload_key, NOT_FOUND)
+    elif str(row.user_id) == str(user_id):
+        decision = AccessDecision(upload_key, OWNER, str(row.user_id))
+    elif row.has_share:
+        decision = AccessDecision(upload_key, SHARED, str(row.user_id))
+        if row.share_expires_at is not None:
+            ttl = (row.share_expires_at - datetime.now(timezone.utc)).total_seconds()
+    else:
+        decision = AccessDecision(upload_key, DENIED, str(row.user_id))
+
+    access_cache.set((upload_key, str(user_id)), decision, ttl=ttl)
+    return decision
+
+
+def _cached_or_parse(upload_id, user_id):
+    """(cached decision, None) on a hit; (None, parsed uuid) on a miss; (not_found, None) for bad ids"""
+    upload_key = _upload_key(upload_id)
+    cached = access_cache.get((upload_key, str(user_id)))
+    if cached is not None:
+        return cached, None
+    try:
+        return None, uuid.UUID(upload_key)
+    except ValueError:
+        return AccessDecision(upload_key, NOT_FOUND), None
+
+
+def resolve_upload_access(db: Session, upload_id: str, user_id) -> AccessDecision:
+    """
+    Owner/shared/denied for one upload in a single query (upload owner, whether an
+    unexpired share exists and when it expires), cached across requests. A cached
+    "shared" decision never outlives the share's expires_at.
+    """
+    decision, parsed_id = _cached_or_parse(upload_id, user_id)
+    if decision is not None:
+        return decision
+    row = db.execute(_access_statement(parsed_id, user_id)).first()
+    return _decide(str(parsed_id), user_id, row)
+
+
+async def resolve_upload_access_async(db, upload_id: str, user_id) -> AccessDecision:
+    """resolve_upload_access for an AsyncSession"""
+    decision, parsed_id = _cached_or_parse(upload_id, user_id)
+    if decision is not None:
+        return decision
+    row = (await db.execute(_access_statement(parsed_id, user_id))).first()
+    return _decide(str(parsed_id), user_id, row)
+
+
+async def resolve_upload_access_many_async(db, upload_ids: Iterable[str], user_id) -> Dict[str, AccessDecision]:
+    """
+    resolve_upload_access_async for several uploads: cache hits first, one query
+    for the rest. Decisions are keyed by the canonical id (_upload_key).
+    """
+    decisions: Dict[str, AccessDecision] = {}
+    missing: Dict[uuid.UUID, str] = {}
+    for upload_id in upload_ids:
+        decision, parsed_id = _cached_or_parse(upload_id, user_id)
+        if decision is not None:
+            decisions[_upload_key(upload_id)] = decision
+        else:
+            missing[parsed_id] = str(parsed_id)
+    if missing:
+        rows = {row.id: row for row in await db.execute(_access_many_statement(list(missing), user_id))}
+        for parsed_id, upload_key in missing.items():
+            decisions[upload_key] = _decide(upload_key, user_id, rows.get(parsed_id))
+    return decisions
+
+
+def _check(decision: AccessDecision, owner_only: bool, not_found_detail: str, forbidden_detail: str) -> AccessDecision:
+    if decision.level == NOT_FOUND or (owner_only and not decision.is_owner):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=not_found_detail)
+    if not decision.allowed:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=forbidden_detail)
+    return decision
+
+
+class UploadAccessResolver:
+    """
+    Request-scoped access checks for the current user. Decisions are memoised for
+    the rest of the request on top of the cross-request cache.
+    """
+
+    def __init__(self, db: Session, user: Principal):
+        self.db = db
+        self.user = user
+        self._decisions: Dict[str, AccessDecision] = {}
+
+    def resolve(self, upload_id: str) -> AccessDecision:
+        upload_key = _upload_key(upload_id)
+        if upload_key not in self._decisions:
+            self._decisions[upload_key] = resolve_upload_access(self.db, upload_key, self.user.id)
+        return self._decisions[upload_key]
+
+    def require(self, upload_id: str, owner_only: bool = False, not_found_detail: str = "Upload not found", forbidden_detail: str = "Access denied") -> AccessDecision:
+        """
+        Raise 404 for unknown uploads and 403 when the user has no access.
+        With owner_only, anything but ownership is reported as 404 (matching the
+        owner-scoped lookups this replaces).
+        """
+        return _check(self.resolve(upload_id), owner_only, not_found_detail, forbidden_detail)
+
+
+class AsyncUploadAccessResolver:
+    """UploadAccessResolver for routes running on an AsyncSession"""
+
+    def __init__(self, db, user: Principal):
+        self.db = db
+        self.user = user
+        self._decisions: Dict[str, AccessDecision] = {}
+
+    async def resolve(self, upload_id: str) -> AccessDecision:
+        upload_key = _upload_key(upload_id)
+        if upload_key not in self._decisions:
+            self._decisions[upload_key] = await resolve_upload_access_async(self.db, upload_key, self.user.id)
+        return self._decisions[upload_key]
+
+    async def require(self, upload_id: str, owner_only: bool = False, not_found_detail: str = "Upload not found", forbidden_detail: str = "Access denied") -> AccessDecision:
+        return _check(await self.resolve(upload_id), owner_only, not_found_detail, forbidden_detail)
+
+    async def require_many(self, upload_ids: List[str], owner_only: bool = False) -> List[AccessDecision]:
+        """require() for a batch of uploads with at most one query; errors name the failing upload"""
+        unresolved = [upload_id for upload_id in upload_ids if _upload_key(upload_id) not in self._decisions]
+        if unresolved:
+            self._decisions.update(await resolve_upload_access_many_async(self.db, unresolved, self.user.id))
+        return [
+            _check(self._decisions[_upload_key(upload_id)], owner_only, f"Upload {upload_id} not found", f"Access denied to upload {upload_id}")
+            for upload_id in upload_ids
+        ]
+
+
+def get_upload_access(
+    current_user: Principal = Depends(get_current_principal),
+    db: Session = Depends(get_db)
+) -> UploadAccessResolver:
+    """Dependency providing the request's access resolver"""
+    return UploadAccessResolver(db, current_user)
+
+
+def get_upload_access_async(
+    current_user: Principal = Depends(get_current_principal),
+    db=Depends(get_async_db)
+) -> AsyncUploadAccessResolver:
+    """Dependency providing the request's access resolver on the async session"""
+    return AsyncUploadAccessResolver(db, current_user)
@@ -1,14 +1,98 @@
-from fastapi import APIRouter, Depends, Response, HTTPException, status
-from sqlalchemy.orm import Session
+import os
+import re
+import base64
+import json
+import uuid
+from datetime import datetime
+from typing import List, Optional
+from fastapi import APIRouter, Depends, Response, HTTPException, Query, Header, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, undefer
 from models import Upload, AnalysisResult
-from database import get_db
-from auth import get_current_user
+from database import get_db, get_async_db, SessionLocal
+from auth import Principal, get_current_principal
+from access import (
+    UploadAccessResolver, AsyncUploadAccessResolver,
+    get_upload_access, get_upload_access_async, invalidate_upload_access
+)
 from models import User
 from pydantic import BaseModel, EmailStr
-from services.pdf_service import pdf_service
+from services.report_renderer import report_renderer, BulkReport, EXPORT_FORMATS, EXPORT_MEDIA_TYPES
+from services.data_export import (
+    DATA_EXPORT_FORMATS, DATA_EXPORT_MEDIA_TYPES,
+    stream_csv, stream_ndjson, stream_xlsx, xlsx_available
+)
+from services.response_cache import (
+    CachedResponse, PRIVATE_CACHE_CONTROL, response_cache,
+    make_etag, serialize, conditional_response
+)
 
 router = APIRouter()
 
+def _load_upload_with_analysis(db: Session, upload_id: str, *document_columns):
+    """
+    Upload and its analysis result (or None) in one query; 404 if the upload is gone.
+    Only the deferred document columns passed in are loaded.
+    """
+    row = db.query(Upload, AnalysisResult).outerjoin(
+        AnalysisResult, AnalysisResult.upload_id == Upload.id
+    ).options(*[undefer(column) for column in document_columns]).filter(Upload.id == upload_id).first()
+    if not row:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Upload not found")
+    return row
+
+async def _load_upload_with_analysis_async(db: AsyncSession, upload_id: str, *document_columns):
+    """_load_upload_with_analysis on the async session (upload_id already validated)"""
+    row = (await db.execute(
+        select(Upload, AnalysisResult).outerjoin(
+            AnalysisResult, AnalysisResult.upload_id == Upload.id
+        ).options(*[undefer(column) for column in document_columns]).where(Upload.id == uuid.UUID(str(upload_id)))
+    )).first()
+    if not row:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Upload not found")
+    return row
+
+# Page size for upload listings (keyset pagination on created_at, id)
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+UPLOAD_STATUSES = ("pending", "processing", "completed", "failed")
+
+def _encode_cursor(created_at: datetime, row_id) -> str:
+    """Opaque cursor pointing just past the given row"""
+    payload = json.dumps({"c": created_at.isoformat(), "i": str(row_id)})
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+def _decode_cursor(cursor: str):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        return datetime.fromisoformat(payload["c"]), uuid.UUID(payload["i"])
+    except Exception:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+async def _paginate(db: AsyncSession, stmt, created_at_column, id_column, limit: int, cursor: Optional[str]):
+    """
+    Apply keyset pagination (newest first) and fetch one extra row to learn whether
+    another page exists. Every page is an index range scan, so deep pages cost the
+    same as the first. Returns (rows, next_cursor).
+    """
+    if cursor:
+        cursor_created_at, cursor_id = _decode_cursor(cursor)
+        stmt = stmt.where(tuple_(created_at_column, id_column) < tuple_(cursor_created_at, cursor_id))
+    rows = (await db.execute(stmt.order_by(created_at_column.desc(), id_column.desc()).limit(limit + 1))).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, _encode_cursor(last.page_created_at, last.page_id)
+
+def _filename_filter(column, filename: str):
+    """Case-insensitive substring match with LIKE wildcards escaped"""
+    escaped = filename.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return column.ilike(f"%{escaped}%", escape="\\")
+
 class ShareRequest(BaseModel):
     email: EmailStr
 
@@ -20,22 +104,53 @@ class CompareRequest(BaseModel):
     upload_id_a: str
     upload_id_b: str
 
+class BulkExportRequest(BaseModel):
+    upload_ids: List[str]
+
+BULK_EXPORT_MAX_UPLOADS = 50
+
+def _bulk_upload_ids(upload_ids: List[str]) -> List[str]:
+    """Ids in request order, deduplicated by UUID value; invalid ids are kept so they 404"""
+    unique = {}
+    for upload_id in upload_ids:
+        try:
+            key = str(uuid.UUID(upload_id))
+        except ValueError:
+            key = upload_id
+        unique.setdefault(key, None)
+    return list(unique)
+
+def _report_data_loader(analysis_id, filename: str):
+    """Blocking loader for one bulk-export document, on a session of its own (the request's is gone while streaming)"""
+    def load() -> Optional[dict]:
+        with SessionLocal() as db:
+            document = db.execute(
+                select(AnalysisResult.executive_summary, AnalysisResult.themes_json, AnalysisResult.agile_risks_json)
+                .where(AnalysisResult.id == analysis_id)
+            ).first()
+        if document is None:
+            return None
+        return {
+            "filename": filename,
+            "executive_summary": document.executive_summary,
+            "themes": document.themes_json or [],
+            "agile_risks": document.agile_risks_json
+        }
+    return load
+
 @router.post("/analysis/{upload_id}/feedback")
-async def submit_theme_feedback(
+def submit_theme_feedback(
     upload_id: str,
     request: ThemeFeedbackRequest,
-    current_user: User = Depends(get_current_user),
+    access: UploadAccessResolver = Depends(get_upload_access),
     db: Session = Depends(get_db)
 ):
     """Store helpful/not helpful feedback for a specific theme."""
-    upload = db.query(Upload).filter(
-        Upload.id == upload_id,
-        Upload.user_id == current_user.id
-    ).first()
-    if not upload:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Upload not found")
+    access.require(upload_id, owner_only=True)
 
-    analysis = db.query(AnalysisResult).filter(AnalysisResult.upload_id == upload_id).first()
+    analysis = db.query(AnalysisResult).options(
+        undefer(AnalysisResult.theme_feedback_json)
+    ).filter(AnalysisResult.upload_id == upload_id).first()
     if not analysis:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Analysis not found")
 
@@ -50,31 +165,16 @@ async def submit_theme_feedback(
 @router.post("/analysis/compare")
 async def compare_analyses(
     request: CompareRequest,
-    current_user: User = Depends(get_current_user),
+    access: UploadAccessResolver = Depends(get_upload_access),
     db: Session = Depends(get_db)
 ):
     """Compare two past analyses using AI synthesis."""
     from services.ai_service import ai_service
-    from sqlalchemy import or_
-    from models import UploadShare
-    from sqlalchemy.sql import func as sqlfunc
 
     def get_accessible_analysis(upload_id: str):
-        upload = db.query(Upload).filter(Upload.id == upload_id).first()
-        if not upload:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Upload {upload_id} not found")
-
-        is_owner = upload.user_id == current_user.id
-        has_access = is_owner or db.query(UploadShare).filter(
-            UploadShare.upload_id == upload_id,
-            UploadShare.shared_with_user_id == current_user.id,
-            or_(UploadShare.expires_at.is_(None), UploadShare.expires_at > sqlfunc.now())
-        ).first() is not None
+        access.require(upload_id, not_found_detail=f"Upload {upload_id} not found")
 
-        if not has_access:
-            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Access denied")
-
-        analysis = db.query(AnalysisResult).filter(AnalysisResult.upload_id == upload_id).first()
+        upload, analysis = _load_upload_with_analysis(db, upload_id, AnalysisResult.themes_json)
         if not analysis or not analysis.themes_json:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Analysis for {upload_id} has no themes")
 
@@ -98,103 +198,56 @@ async def compare_analyses(
 
 
 @router.get("/analysis/trends")
-async def get_analysis_trends(
-    current_user: User = Depends(get_current_user),
+def get_analysis_trends(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    bucket: Optional[str] = None,
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """
     Get historical trend data for all successful analyses belonging to the user.
-    Aggregates product health scores and top theme frequencies by date.
+    Served from the analysis_rollups table (health score + theme counts per analysis).
+    Optional start/end limit the date range; bucket=day|week|month aggregates points.
+    `complete` is false while older analyses are still being rolled up.
     """
-    # Join Upload and AnalysisResult, filter by current user, order by creation date ASC
-    records = db.query(Upload, AnalysisResult).join(
-        AnalysisResult, Upload.id == AnalysisResult.upload_id
-    ).filter(
-        Upload.user_id == current_user.id,
-        Upload.status == "completed"
-    ).order_by(Upload.created_at.asc()).all()
-    
-    trend_data = []
-    
-    for upload, analysis in records:
-        # Only process if we actually have themes / a successful AI run
-        if not analysis.themes_json or len(analysis.themes_json) == 0:
-            continue
-            
-        # Extract Product Health Score (could be None if old analysis)
-        health_score = None
-        if analysis.agile_risks_json:
-            health_score = analysis.agile_risks_json.get('product_health_score')
-            
-        # Map out theme frequencies
-        # Themes might be stored uniquely, but we'll extract their 'count' attribute 
-        theme_volumes = {}
-        for t in analysis.themes_json:
-            name = t.get('name', 'Unknown')
-            count = t.get('count', 0)
-            theme_volumes[name] = count
-            
-        trend_data.append({
-            "upload_id": str(upload.id),
-            "date": upload.created_at.isoformat() if upload.created_at else None,
-            "filename": upload.filename,
-            "health_score": health_score,
-            "themes": theme_volumes
-        })
-        
-    print("DEBUG TRENDS:", trend_data)
-    return {"trends": trend_data}
+    from services.trends import TREND_BUCKETS, ensure_user_rollups, query_trends
+
+    if bucket and bucket not in TREND_BUCKETS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid bucket. Use one of: {', '.join(TREND_BUCKETS)}")
+
+    # Analyses stored before rollups existed are rolled up a batch at a time
+    complete = ensure_user_rollups(db, current_user.id)
+
+    return {
+        "trends": query_trends(db, current_user.id, start=start, end=end, bucket=bucket),
+        "complete": complete
+    }
 
 @router.get("/analysis/{upload_id}")
 async def get_analysis(
     upload_id: str,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_principal),
+    access: AsyncUploadAccessResolver = Depends(get_upload_access_async),
+    db: AsyncSession = Depends(get_async_db),
+    if_none_match: Optional[str] = Header(None)
 ):
     """
     Get analysis results for a specific upload.
     
     Requires authentication. User must own the upload or have shared access.
+    Stored analyses are served from the response cache with an ETag; a matching
+    If-None-Match gets 304. Pending analyses are never cached.
     """
-    from models import UploadShare
-    from sqlalchemy import or_
-    from sqlalchemy.sql import func
-    
-    # Get the upload
-    upload = db.query(Upload).filter(Upload.id == upload_id).first()
-    
-    if not upload:
-        from fastapi import HTTPException, status
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Upload not found"
-        )
-    
-    # Check if user owns the upload
-    is_owner = upload.user_id == current_user.id
-    
-    # Check if upload is shared with user
-    has_shared_access = db.query(UploadShare).filter(
-        UploadShare.upload_id == upload_id,
-        UploadShare.shared_with_user_id == current_user.id,
-        or_(
-            UploadShare.expires_at.is_(None),
-            UploadShare.expires_at > func.now()
-        )
-    ).first() is not None
+    await access.require(upload_id, forbidden_detail="Access denied. You don't have permission to view this upload.")
     
-    # Deny access if user doesn't own and doesn't have shared access
-    if not is_owner and not has_shared_access:
-        from fastapi import HTTPException, status
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Access denied. You don't have permission to view this upload."
-        )
+    # plan_tier is part of the body, so it is part of the cache key and the ETag
+    cache_key = ("analysis", str(uuid.UUID(upload_id)), current_user.plan_tier)
+    cached = response_cache.get(cache_key)
+    if cached is not None:
+        return conditional_response(cached, if_none_match, PRIVATE_CACHE_CONTROL)
     
-    # Get analysis result
-    analysis = db.query(AnalysisResult).filter(
-        AnalysisResult.upload_id == upload_id
-    ).first()
+    upload, analysis = await _load_upload_with_analysis_async(db, upload_id, AnalysisResult.themes_json, AnalysisResult.agile_risks_json)
     
     if not analysis:
         return {
@@ -206,9 +259,9 @@ async def get_analysis(
         }
     
     # Check if analysis has actual themes or is an error placeholder
-    has_themes = analysis.themes_json and len(analysis.themes_json) > 0
+    has_themes = bool(analysis.themes_json) and len(analysis.themes_json) > 0
     
-    return {
+    payload = {
         "upload_id": upload_id,
         "filename": upload.filename,
         "row_count": upload.row_count,
@@ -221,80 +274,185 @@ async def get_analysis(
         "agile_risks": analysis.agile_risks_json,
         "created_at": analysis.created_at.isoformat() if analysis.created_at else None,
         "has_themes": has_themes,
-        "plan_tier": current_user.usage_quota.plan_tier if current_user.usage_quota else "demo"
+        "plan_tier": current_user.plan_tier
     }
+    cached = CachedResponse(
+        etag=make_etag(analysis.id, analysis.created_at.isoformat() if analysis.created_at else None, current_user.plan_tier),
+        body=serialize(payload)
+    )
+    response_cache.set(cache_key, cached)
+    return conditional_response(cached, if_none_match, PRIVATE_CACHE_CONTROL)
+
+async def _require_analysis_id(db: AsyncSession, upload_id: str):
+    """Id of the upload's stored analysis; 400 while there is none"""
+    analysis_id = (await db.execute(
+        select(AnalysisResult.id).where(AnalysisResult.upload_id == uuid.UUID(upload_id))
+    )).scalar_one_or_none()
+    if analysis_id is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Analysis not yet complete. Cannot export empty report."
+        )
+    return analysis_id
 
 @router.get("/analysis/{upload_id}/export")
 async def export_analysis(
     upload_id: str,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    export_format: str = Query("pdf", alias="format", description="pdf, json or csv"),
+    current_user: Principal = Depends(get_current_principal),
+    access: AsyncUploadAccessResolver = Depends(get_upload_access_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
-    Export analysis results as a professional PDF.
+    Export analysis results as a professional PDF, or the themes as JSON/CSV.
     Requires authentication. User must own the upload or have shared access.
-    """
-    from models import UploadShare
-    from sqlalchemy import or_
-    from sqlalchemy.sql import func
-    from fastapi import HTTPException, status
-    
-    # Get the upload
-    upload = db.query(Upload).filter(Upload.id == upload_id).first()
-    
-    if not upload:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Upload not found"
-        )
-    
-    # Check if user owns the upload
-    is_owner = upload.user_id == current_user.id
-    
-    # Check if upload is shared with user
-    has_shared_access = db.query(UploadShare).filter(
-        UploadShare.upload_id == upload_id,
-        UploadShare.shared_with_user_id == current_user.id,
-        or_(
-            UploadShare.expires_at.is_(None),
-            UploadShare.expires_at > func.now()
-        )
-    ).first() is not None
     
-    # Deny access if user doesn't own and doesn't have shared access
-    if not is_owner and not has_shared_access:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Access denied. You don't have permission to export this upload."
+    Exports are built in the background when an analysis completes and cached on
+    disk per analysis and tier, so most exports are served straight from the file
+    (read in full first, so cache eviction cannot cut a download short).
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid format. Use one of: {', '.join(EXPORT_FORMATS)}")
+    await access.require(upload_id, forbidden_detail="Access denied. You don't have permission to export this upload.")
+    
+    analysis_id = await _require_analysis_id(db, upload_id)
+    
+    user_tier = current_user.plan_tier
+    filename = f"ProductLogik_Report_{upload_id[:8]}.{export_format}"
+    content = await report_renderer.read_cached(analysis_id, user_tier, export_format)
+    if content is None:
+        upload, analysis = await _load_upload_with_analysis_async(
+            db, upload_id, AnalysisResult.themes_json, AnalysisResult.agile_risks_json
         )
+        if not analysis:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Analysis not yet complete. Cannot export empty report."
+            )
+        report_data = {
+            "filename": upload.filename,
+            "executive_summary": analysis.executive_summary,
+            "themes": analysis.themes_json or [],
+            "agile_risks": analysis.agile_risks_json
+        }
+        content = await report_renderer.read_export(analysis.id, user_tier, report_data, export_format)
     
-    # Get analysis result
-    analysis = db.query(AnalysisResult).filter(
-        AnalysisResult.upload_id == upload_id
-    ).first()
-    
-    if not analysis:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Analysis not yet complete. Cannot export empty report."
-        )
+    return Response(
+        content=content,
+        media_type=EXPORT_MEDIA_TYPES[export_format],
+        headers={
+            "Content-Disposition": f"attachment; filename={filename}"
+        }
+    )
+
+@router.get("/analysis/{upload_id}/export/data")
+def export_analysis_data(
+    upload_id: str,
+    export_format: str = Query("csv", alias="format", description="csv, xlsx or ndjson"),
+    access: UploadAccessResolver = Depends(get_upload_access),
+    db: Session = Depends(get_db)
+):
+    """
+    Tabular export of the themes and every feedback entry (with its metadata and
+    the themes it is evidence for), streamed from a server-side cursor so large
+    uploads export in constant memory.
+    Requires authentication. User must own the upload or have shared access.
+    """
+    if export_format not in DATA_EXPORT_FORMATS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid format. Use one of: {', '.join(DATA_EXPORT_FORMATS)}")
+    if export_format == "xlsx" and not xlsx_available():
+        raise HTTPException(status_code=status.HTTP_501_NOT_IMPLEMENTED, detail="XLSX export is not available on this server")
+    access.require(upload_id, forbidden_detail="Access denied. You don't have permission to export this upload.")
+    
+    upload, analysis = _load_upload_with_analysis(db, upload_id, AnalysisResult.themes_json)
+    themes = (analysis.themes_json if analysis else None) or []
+    
+    # The stream opens its own session; the request's is released before streaming starts
+    if export_format == "csv":
+        body = stream_csv(SessionLocal, upload.id, themes)
+    elif export_format == "xlsx":
+        body = stream_xlsx(SessionLocal, upload.id, themes)
+    else:
+        header = {
+            "upload_id": str(upload.id),
+            "filename": upload.filename,
+            "row_count": upload.row_count,
+            "executive_summary": analysis.executive_summary if analysis else None
+        }
+        body = stream_ndjson(SessionLocal, upload.id, themes, header)
     
-    # Prepare data for PDF
-    report_data = {
-        "filename": upload.filename,
-        "executive_summary": analysis.executive_summary,
-        "themes": analysis.themes_json or []
+    filename = f"ProductLogik_Data_{upload_id[:8]}.{export_format}"
+    return StreamingResponse(
+        body,
+        media_type=DATA_EXPORT_MEDIA_TYPES[export_format],
+        headers={
+            "Content-Disposition": f"attachment; filename={filename}"
+        }
+    )
+
+@router.get("/analysis/{upload_id}/export/status")
+async def get_export_status(
+    upload_id: str,
+    current_user: Principal = Depends(get_current_principal),
+    access: AsyncUploadAccessResolver = Depends(get_upload_access_async),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Whether each export format is ready, still rendering or not built yet
+    ("missing" exports are built on request). Reflects this server's cache only.
+    """
+    await access.require(upload_id, forbidden_detail="Access denied. You don't have permission to export this upload.")
+    analysis_id = await _require_analysis_id(db, upload_id)
+    return {
+        "upload_id": upload_id,
+        "exports": report_renderer.export_status(analysis_id, current_user.plan_tier)
     }
-    
-    # Generate PDF
-    user_tier = current_user.usage_quota.plan_tier if current_user.usage_quota else "demo"
-    pdf_buffer = pdf_service.generate_report(report_data, tier=user_tier)
-    
-    # Return as response
-    filename = f"ProductLogik_Report_{upload_id[:8]}.pdf"
-    return Response(
-        content=pdf_buffer.getvalue(),
-        media_type="application/pdf",
+
+@router.post("/analysis/export/bulk")
+async def export_analyses_bulk(
+    request: BulkExportRequest,
+    current_user: Principal = Depends(get_current_principal),
+    access: AsyncUploadAccessResolver = Depends(get_upload_access_async),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Export the PDF reports of several analyses as one ZIP download.
+    Access to every upload is checked up front in a single query; uploads without
+    a stored analysis are skipped and listed in export_errors.txt. PDFs that are
+    not cached yet render in parallel and are streamed into the archive as they
+    finish; each analysis document is read only when its render starts.
+    """
+    upload_ids = _bulk_upload_ids(request.upload_ids)
+    if not upload_ids:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No uploads selected for export")
+    if len(upload_ids) > BULK_EXPORT_MAX_UPLOADS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"You can export at most {BULK_EXPORT_MAX_UPLOADS} analyses at once")
+    await access.require_many(upload_ids)
+    
+    parsed_ids = [uuid.UUID(upload_id) for upload_id in upload_ids]
+    rows = {row.upload_id: row for row in (await db.execute(
+        select(Upload.id.label("upload_id"), Upload.filename, AnalysisResult.id.label("analysis_id")).outerjoin(
+            AnalysisResult, AnalysisResult.upload_id == Upload.id
+        ).where(Upload.id.in_(parsed_ids))
+    )).all()}
+    
+    reports, notes = [], []
+    for index, parsed_id in enumerate(parsed_ids, start=1):
+        row = rows.get(parsed_id)
+        if row is None or row.analysis_id is None:
+            notes.append(f"{row.filename if row else parsed_id}: skipped, analysis not yet complete")
+            continue
+        stem = re.sub(r"[^A-Za-z0-9._-]+", "_", os.path.splitext(row.filename or "")[0]).strip("_")[:60] or "report"
+        reports.append(BulkReport(
+            archive_name=f"{index:02d}_{stem}_{str(parsed_id)[:8]}.pdf",
+            analysis_id=row.analysis_id,
+            load_data=_report_data_loader(row.analysis_id, row.filename)
+        ))
+    
+    filename = f"ProductLogik_Reports_{datetime.now().strftime('%Y%m%d')}.zip"
+    return StreamingResponse(
+        report_renderer.stream_zip(reports, current_user.plan_tier, notes),
+        media_type="application/zip",
         headers={
             "Content-Disposition": f"attachment; filename={filename}"
         }
@@ -302,40 +460,62 @@ async def export_analysis(
 
 @router.get("/uploads")
 async def get_user_uploads(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    status_filter: Optional[str] = Query(None, alias="status"),
+    filename: Optional[str] = None,
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
-    Get all uploads for the current user with their analysis status.
+    Get the current user's uploads with their analysis status, newest first.
+    Pass `next_cursor` from the previous response as `cursor` to get the next page.
+    Single joined query; theme_count is computed in SQL so themes_json is never loaded.
     """
-    uploads = db.query(Upload).filter(
+    if status_filter and status_filter not in UPLOAD_STATUSES:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid status. Use one of: {', '.join(UPLOAD_STATUSES)}")
+
+    stmt = select(
+        Upload.id,
+        Upload.filename,
+        Upload.row_count,
+        Upload.status,
+        Upload.created_at,
+        AnalysisResult.id.label("analysis_id"),
+        AnalysisResult.theme_count.label("theme_count"),
+        Upload.created_at.label("page_created_at"),
+        Upload.id.label("page_id")
+    ).outerjoin(
+        AnalysisResult, AnalysisResult.upload_id == Upload.id
+    ).where(
         Upload.user_id == current_user.id
-    ).order_by(Upload.created_at.desc()).limit(50).all()
+    )
+    if status_filter:
+        stmt = stmt.where(Upload.status == status_filter)
+    if filename:
+        stmt = stmt.where(_filename_filter(Upload.filename, filename))
+
+    rows, next_cursor = await _paginate(db, stmt, Upload.created_at, Upload.id, limit, cursor)
     
     result = []
-    for upload in uploads:
-        # Check if analysis exists
-        analysis = db.query(AnalysisResult).filter(
-            AnalysisResult.upload_id == upload.id
-        ).first()
-        
+    for row in rows:
         result.append({
-            "upload_id": str(upload.id),
-            "filename": upload.filename,
-            "row_count": upload.row_count,
-            "status": upload.status,
-            "created_at": upload.created_at.isoformat() if upload.created_at else None,
-            "has_analysis": analysis is not None,
-            "theme_count": len(analysis.themes_json) if analysis and analysis.themes_json else 0
+            "upload_id": str(row.id),
+            "filename": row.filename,
+            "row_count": row.row_count,
+            "status": row.status,
+            "created_at": row.created_at.isoformat() if row.created_at else None,
+            "has_analysis": row.analysis_id is not None,
+            "theme_count": row.theme_count
         })
     
-    return {"uploads": result}
+    return {"uploads": result, "next_cursor": next_cursor}
 
 @router.post("/uploads/{upload_id}/share")
-async def share_upload(
+def share_upload(
     upload_id: str,
     request: ShareRequest,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """
@@ -411,6 +591,7 @@ async def share_upload(
             
         db.commit()
         db.refresh(share)
+        invalidate_upload_access(upload.id)
         
         return {
             "share_id": str(share.id),
@@ -466,6 +647,7 @@ async def share_upload(
         
     db.commit()
     db.refresh(share)
+    invalidate_upload_access(upload.id)
     
     return {
         "share_id": str(share.id),
@@ -480,10 +662,10 @@ async def share_upload(
     }
 
 @router.delete("/uploads/{upload_id}/share/{share_id}")
-async def unshare_upload(
+def unshare_upload(
     upload_id: str,
     share_id: str,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """
@@ -520,13 +702,14 @@ async def unshare_upload(
     
     db.delete(share)
     db.commit()
+    invalidate_upload_access(upload_id)
     
     return {"message": "Share revoked successfully"}
 
 @router.get("/uploads/{upload_id}/shares")
-async def get_upload_shares(
+def get_upload_shares(
     upload_id: str,
-    current_user: User = Depends(get_current_user),
+    access: UploadAccessResolver = Depends(get_upload_access),
     db: Session = Depends(get_db)
 ):
     """
@@ -534,19 +717,9 @@ async def get_upload_shares(
     Only the owner can view shares.
     """
     from models import UploadShare
-    from fastapi import HTTPException, status
     
     # Verify upload belongs to current user
-    upload = db.query(Upload).filter(
-        Upload.id == upload_id,
-        Upload.user_id == current_user.id
-    ).first()
-    
-    if not upload:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Upload not found or you don't own this upload"
-        )
+    access.require(upload_id, owner_only=True, not_found_detail="Upload not found or you don't own this upload")
     
     # Get all shares for this upload
     shares = db.query(UploadShare).filter(
@@ -584,45 +757,63 @@ async def get_upload_shares(
 
 @router.get("/uploads/shared-with-me")
 async def get_shared_uploads(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    filename: Optional[str] = None,
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
-    Get all uploads shared with the current user.
+    Get uploads shared with the current user, most recently shared first.
+    Paginated like GET /uploads. Share, upload, owner and analysis status come
+    back in one joined query.
     """
-    from models import UploadShare, AnalysisResult
+    from models import UploadShare
     from sqlalchemy import or_
+    from sqlalchemy.sql import func
     
-    # Get all shares for current user
-    shares = db.query(UploadShare).filter(
+    stmt = select(
+        Upload.id,
+        Upload.filename,
+        Upload.row_count,
+        User.email.label("owner_email"),
+        User.full_name.label("owner_name"),
+        UploadShare.created_at.label("shared_at"),
+        UploadShare.permission_level,
+        AnalysisResult.id.label("analysis_id"),
+        AnalysisResult.theme_count.label("theme_count"),
+        UploadShare.created_at.label("page_created_at"),
+        UploadShare.id.label("page_id")
+    ).select_from(UploadShare).join(
+        Upload, Upload.id == UploadShare.upload_id
+    ).outerjoin(
+        User, User.id == Upload.user_id
+    ).outerjoin(
+        AnalysisResult, AnalysisResult.upload_id == Upload.id
+    ).where(
         UploadShare.shared_with_user_id == current_user.id,
         or_(
             UploadShare.expires_at.is_(None),
             UploadShare.expires_at > func.now()
         )
-    ).all()
+    )
+    if filename:
+        stmt = stmt.where(_filename_filter(Upload.filename, filename))
+
+    rows, next_cursor = await _paginate(db, stmt, UploadShare.created_at, UploadShare.id, limit, cursor)
     
     result = []
-    for share in shares:
-        upload = db.query(Upload).filter(Upload.id == share.upload_id).first()
-        if not upload:
-            continue
-            
-        owner = db.query(User).filter(User.id == upload.user_id).first()
-        analysis = db.query(AnalysisResult).filter(
-            AnalysisResult.upload_id == upload.id
-        ).first()
-        
+    for row in rows:
         result.append({
-            "upload_id": str(upload.id),
-            "filename": upload.filename,
-            "row_count": upload.row_count,
-            "owner_email": owner.email if owner else "Unknown",
-            "owner_name": owner.full_name if owner else "Unknown",
-            "shared_at": share.created_at.isoformat() if share.created_at else None,
-            "permission": share.permission_level,
-            "has_analysis": analysis is not None,
-            "theme_count": len(analysis.themes_json) if analysis and analysis.themes_json else 0
+            "upload_id": str(row.id),
+            "filename": row.filename,
+            "row_count": row.row_count,
+            "owner_email": row.owner_email or "Unknown",
+            "owner_name": row.owner_name if row.owner_email else "Unknown",
+            "shared_at": row.shared_at.isoformat() if row.shared_at else None,
+            "permission": row.permission_level,
+            "has_analysis": row.analysis_id is not None,
+            "theme_count": row.theme_count
         })
     
-    return {"uploads": result}
+    return {"uploads": result, "next_cursor": next_cursor}
@@ -3,15 +3,21 @@ import os
 logging.info("DEBUG: Loading auth.py module")
 # logging.basicConfig is already called in main but safe to call again or rely on existing handlers if shared
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from jose import JWTError, jwt
 from datetime import datetime, timedelta, timezone
+from dataclasses import dataclass
 from sqlalchemy.orm import Session
-import bcrypt
+import uuid
+import hashlib
+import secrets
 
-from database import get_db
-from models import User, UsageQuota, UploadShare
+from database import get_db, SessionLocal
+from models import User, UsageQuota, UploadShare, RefreshToken
 from pydantic import BaseModel, EmailStr
+from services.ttl_cache import TTLCache
+from services.password_hashing import password_hasher, PasswordHasherBusy
 
 # --- Config ---
 SECRET_KEY = os.getenv("SECRET_KEY")
@@ -22,6 +28,15 @@ else:
     logging.info("✅ SECRET_KEY loaded from environment variables")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
+# Refresh tokens rotate on every use; a rotated token presented again revokes its family
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", 30))
+# A token rotated this recently may be presented again (two tabs or a retried
+# request refreshing at once) without being treated as reuse
+REFRESH_REUSE_GRACE_SECONDS = int(os.getenv("REFRESH_REUSE_GRACE_SECONDS", 30))
+# Authenticated principals are cached per process so identity-only routes skip the
+# users lookup; profile updates invalidate, other processes converge within the TTL
+PRINCIPAL_CACHE_TTL_SECONDS = float(os.getenv("PRINCIPAL_CACHE_TTL_SECONDS", 60))
+PRINCIPAL_CACHE_MAX_ENTRIES = int(os.getenv("PRINCIPAL_CACHE_MAX_ENTRIES", 10000))
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/token")
 
@@ -37,21 +52,50 @@ class UserCreate(BaseModel):
 class Token(BaseModel):
     access_token: str
     token_type: str
+    refresh_token: str | None = None
+    expires_in: int | None = None
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
 
 class UserProfileUpdate(BaseModel):
     full_name: str | None = None
     company_name: str | None = None
 
+@dataclass(frozen=True)
+class Principal:
+    """The authenticated user as seen by identity-only routes (no DB session attached)"""
+    id: uuid.UUID
+    email: str
+    full_name: str | None
+    company_name: str | None
+    role: str | None
+    plan_tier: str
+    created_at: datetime | None
+
+principal_cache = TTLCache(maxsize=PRINCIPAL_CACHE_MAX_ENTRIES, ttl=PRINCIPAL_CACHE_TTL_SECONDS)
+
 # --- Password Hashing ---
+# All hashing goes through the bounded pool in services/password_hashing.py.
+# Routes await it; these blocking helpers are for scripts and tooling.
 def get_password_hash(password: str) -> str:
-    """Hash a password using bcrypt"""
-    salt = bcrypt.gensalt()
-    hashed = bcrypt.hashpw(password.encode('utf-8'), salt)
-    return hashed.decode('utf-8')
+    """Hash a password using bcrypt at the configured work factor"""
+    return password_hasher.hash(password)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against its hash"""
-    return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
+    return password_hasher.verify(plain_password, hashed_password)
+
+async def _run_password_hasher(operation, *args):
+    """Await a hashing call for a request handler; a full queue becomes 503"""
+    try:
+        return await operation(*args)
+    except PasswordHasherBusy:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many sign-in requests right now. Please try again in a moment.",
+            headers={"Retry-After": "1"},
+        )
 
 # --- JWT Token ---
 def create_access_token(data: dict, expires_delta: timedelta | None = None):
@@ -64,48 +108,144 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    credentials_exception = HTTPException(
+def create_user_token(user: User) -> str:
+    """Access token carrying the user id and role alongside the email subject"""
+    return create_access_token(
+        data={"sub": user.email, "uid": str(user.id), "role": user.role},
+        expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    )
+
+def _token_response(user, refresh_token: str) -> dict:
+    return {
+        "access_token": create_user_token(user),
+        "token_type": "bearer",
+        "refresh_token": refresh_token,
+        "expires_in": ACCESS_TOKEN_EXPIRE_MINUTES * 60
+    }
+
+# --- Refresh Tokens ---
+def _hash_refresh_token(token: str) -> str:
+    # Tokens are 384 random bits, so a fast hash is enough (no bcrypt on refresh)
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+def issue_refresh_token(db: Session, user_id, family_id=None) -> tuple:
+    """Add a new refresh token to the session; returns (token, row). The caller commits."""
+    token = secrets.token_urlsafe(48)
+    row = RefreshToken(
+        id=uuid.uuid4(),
+        user_id=user_id,
+        family_id=family_id or uuid.uuid4(),
+        token_hash=_hash_refresh_token(token),
+        expires_at=datetime.now(timezone.utc) + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+    )
+    db.add(row)
+    return token, row
+
+def revoke_refresh_family(db: Session, family_id) -> int:
+    return db.query(RefreshToken).filter(
+        RefreshToken.family_id == family_id,
+        RefreshToken.revoked_at.is_(None)
+    ).update({RefreshToken.revoked_at: datetime.now(timezone.utc)}, synchronize_session=False)
+
+def _rotated_within_grace(db: Session, token: RefreshToken, now: datetime) -> bool:
+    """True when a revoked token was rotated (not logged out) moments ago and its replacement is unrevoked"""
+    if token.replaced_by_id is None or now - token.revoked_at > timedelta(seconds=REFRESH_REUSE_GRACE_SECONDS):
+        return False
+    replacement = db.query(RefreshToken.revoked_at).filter(RefreshToken.id == token.replaced_by_id).first()
+    return replacement is not None and replacement.revoked_at is None
+
+def _credentials_exception():
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+def _decode_token(token: str) -> tuple:
+    """Return (user_id or None, email) from a valid token"""
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
     except JWTError:
-        raise credentials_exception
-        
-    user = db.query(User).filter(User.email == email).first()
+        raise _credentials_exception()
+    email = payload.get("sub")
+    if email is None:
+        raise _credentials_exception()
+    user_id = None
+    if payload.get("uid"):
+        try:
+            user_id = uuid.UUID(payload["uid"])
+        except ValueError:
+            raise _credentials_exception()
+    return user_id, email
+
+def _load_user(db: Session, user_id, email: str):
+    # Tokens issued before the uid claim existed are resolved by email
+    if user_id is not None:
+        return db.get(User, user_id)
+    return db.query(User).filter(User.email == email).first()
+
+def _principal_from_user(user: User, quota: UsageQuota | None) -> Principal:
+    return Principal(
+        id=user.id,
+        email=user.email,
+        full_name=user.full_name,
+        company_name=user.company_name,
+        role=user.role,
+        plan_tier=getattr(quota, "plan_tier", None) or "demo",
+        created_at=user.created_at
+    )
+
+def invalidate_principal(user_id):
+    principal_cache.pop(str(user_id))
+
+def get_current_principal(token: str = Depends(oauth2_scheme)) -> Principal:
+    """
+    Authenticate from the token alone when the principal is cached. On a miss the
+    user and quota are loaded in one query from a short-lived session.
+    Use get_current_user instead when the route needs the ORM User.
+    """
+    user_id, email = _decode_token(token)
+    if user_id is not None:
+        cached = principal_cache.get(str(user_id))
+        if cached is not None:
+            return cached
+
+    db = SessionLocal()
+    try:
+        query = db.query(User, UsageQuota).outerjoin(UsageQuota, UsageQuota.user_id == User.id)
+        if user_id is not None:
+            row = query.filter(User.id == user_id).first()
+        else:
+            row = query.filter(User.email == email).first()
+    finally:
+        db.close()
+    if row is None:
+        raise _credentials_exception()
+
+    principal = _principal_from_user(*row)
+    if user_id is not None:
+        principal_cache.set(str(user_id), principal)
+    return principal
+
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    """The authenticated ORM User, attached to the request's session (for writes)"""
+    user_id, email = _decode_token(token)
+    user = _load_user(db, user_id, email)
     if user is None:
-        raise credentials_exception
+        raise _credentials_exception()
     return user
 
 # --- Routes ---
 
-@router.post("/register")
-def register(user: UserCreate, db: Session = Depends(get_db)):
-    # Validate Password Strength
-    if len(user.password) < 8:
-        raise HTTPException(status_code=400, detail="Password must be at least 8 characters long")
-
-    # Validate Email Format
-    if "@" not in user.email or "." not in user.email:
-        raise HTTPException(status_code=400, detail="Please enter a valid email address")
-
-    # Check if user exists
-    db_user = db.query(User).filter(User.email == user.email).first()
-    if db_user:
-        raise HTTPException(status_code=400, detail="This email is already registered. Please log in.")
+def _email_registered(db: Session, email: str) -> bool:
+    return db.query(User.id).filter(User.email == email).first() is not None
 
+def _create_user(db: Session, user: UserCreate, hashed_password: str) -> dict:
+    """Blocking part of register: user, quota, pending invites and the verification email"""
     try:
         # Create new user
-        import secrets
         verification_token = secrets.token_urlsafe(32)
         
-        hashed_password = get_password_hash(user.password)
         new_user = User(
             email=user.email,
             password_hash=hashed_password,
@@ -167,8 +307,6 @@ def register(user: UserCreate, db: Session = Depends(get_db)):
             "email": new_user.email,
             "verification_required": True
         }
-    except HTTPException:
-        raise
     except Exception as e:
         db.rollback()
         logging.error(f"❌ Registration error: {e}")
@@ -176,10 +314,49 @@ def register(user: UserCreate, db: Session = Depends(get_db)):
         logging.error(traceback.format_exc())
         raise HTTPException(status_code=500, detail=f"Registration failed: {str(e)}")
 
+@router.post("/register")
+async def register(user: UserCreate, db: Session = Depends(get_db)):
+    # Validate Password Strength
+    if len(user.password) < 8:
+        raise HTTPException(status_code=400, detail="Password must be at least 8 characters long")
+
+    # Validate Email Format
+    if "@" not in user.email or "." not in user.email:
+        raise HTTPException(status_code=400, detail="Please enter a valid email address")
+
+    # Check if user exists (DB work runs on the threadpool, hashing on its own pool)
+    if await run_in_threadpool(_email_registered, db, user.email):
+        raise HTTPException(status_code=400, detail="This email is already registered. Please log in.")
+
+    hashed_password = await _run_password_hasher(password_hasher.hash_async, user.password)
+    return await run_in_threadpool(_create_user, db, user, hashed_password)
+
+def _find_user(db: Session, email: str):
+    return db.query(User).filter(User.email == email).first()
+
+def _rehash_password(db: Session, user: User, password_hash: str):
+    try:
+        user.password_hash = password_hash
+        db.commit()
+        logging.info(f"🔐 Rehashed password for {user.email} at cost {password_hasher.rounds}")
+    except Exception as e:
+        db.rollback()
+        logging.warning(f"⚠️ Password rehash skipped for {user.email}: {e}")
+
+def _start_session(db: Session, user: User) -> dict:
+    # Start a new refresh token family and drop this user's expired tokens
+    db.query(RefreshToken).filter(
+        RefreshToken.user_id == user.id,
+        RefreshToken.expires_at < datetime.now(timezone.utc)
+    ).delete(synchronize_session=False)
+    refresh_token, _ = issue_refresh_token(db, user.id)
+    db.commit()
+    return _token_response(user, refresh_token)
+
 @router.post("/token", response_model=Token)
-def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.email == form_data.username).first()
-    if not user or not verify_password(form_data.password, user.password_hash):
+async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+    user = await run_in_threadpool(_find_user, db, form_data.username)
+    if not user or not await _run_password_hasher(password_hasher.verify_async, form_data.password, user.password_hash):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
@@ -193,16 +370,85 @@ def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db:
             detail="Please verify your email before logging in. Check your inbox for the verification link.",
         )
     
-    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
-        data={"sub": user.email}, expires_delta=access_token_expires
+    # Transparently upgrade hashes made with an older BCRYPT_ROUNDS
+    if password_hasher.needs_rehash(user.password_hash):
+        try:
+            new_hash = await password_hasher.hash_async(form_data.password)
+        except PasswordHasherBusy:
+            new_hash = None
+        if new_hash:
+            await run_in_threadpool(_rehash_password, db, user, new_hash)
+    
+    return await run_in_threadpool(_start_session, db, user)
+
+@router.post("/refresh", response_model=Token)
+def refresh_access_token(request: RefreshRequest, db: Session = Depends(get_db)):
+    """
+    Exchange a refresh token for a new access token and a new refresh token.
+    The presented token is rotated out; presenting it again revokes the whole
+    family (every token descending from the same login), except within
+    REFRESH_REUSE_GRACE_SECONDS of its rotation while its replacement is still
+    live: concurrent refreshes then each get a token in the same family.
+    """
+    invalid_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Invalid or expired refresh token",
+        headers={"WWW-Authenticate": "Bearer"},
     )
-    return {"access_token": access_token, "token_type": "bearer"}
+    now = datetime.now(timezone.utc)
+    
+    # Row lock serialises concurrent refreshes of the same token
+    current = db.query(RefreshToken).filter(
+        RefreshToken.token_hash == _hash_refresh_token(request.refresh_token)
+    ).with_for_update().first()
+    if not current:
+        raise invalid_exception
+    
+    if current.revoked_at is not None:
+        if _rotated_within_grace(db, current, now):
+            user = principal_cache.get(str(current.user_id)) or db.get(User, current.user_id)
+            if user is None:
+                raise invalid_exception
+            refresh_token, _ = issue_refresh_token(db, current.user_id, current.family_id)
+            db.commit()
+            return _token_response(user, refresh_token)
+        revoked = revoke_refresh_family(db, current.family_id)
+        db.commit()
+        logging.warning(f"⚠️ Refresh token reuse detected for user {current.user_id}; revoked {revoked} token(s) in family")
+        raise invalid_exception
+    
+    if current.expires_at <= now:
+        raise invalid_exception
+    
+    # Claims come from the principal cache when warm, so refresh is a single lookup
+    user = principal_cache.get(str(current.user_id)) or db.get(User, current.user_id)
+    if user is None:
+        raise invalid_exception
+    
+    refresh_token, replacement = issue_refresh_token(db, current.user_id, current.family_id)
+    current.revoked_at = now
+    current.replaced_by_id = replacement.id
+    db.commit()
+    
+    return _token_response(user, refresh_token)
+
+@router.post("/logout")
+def logout(request: RefreshRequest, db: Session = Depends(get_db)):
+    """Revoke the refresh token (and its rotation family). Access tokens expire on their own."""
+    current = db.query(RefreshToken).filter(
+        RefreshToken.token_hash == _hash_refresh_token(request.refresh_token)
+    ).first()
+    if current:
+        revoke_refresh_family(db, current.family_id)
+        db.commit()
+    return {"message": "Logged out"}
 
 # Get current user profile
 @router.get("/me")
-def get_current_user_profile(current_user: User = Depends(get_current_user)):
+def get_current_user_profile(current_user: Principal = Depends(get_current_principal), db: Session = Depends(get_db)):
     """Get the current authenticated user's profile"""
+    # Usage changes as analyses complete, so it is read fresh rather than cached
+    quota = db.query(UsageQuota).filter(UsageQuota.user_id == current_user.id).first()
     return {
         "id": str(current_user.id),
         "email": current_user.email,
@@ -211,9 +457,9 @@ def get_current_user_profile(current_user: User = Depends(get_current_user)):
         "role": current_user.role,
         "created_at": current_user.created_at.isoformat() if current_user.created_at else None,
         "usage_quota": {
-            "plan_tier": getattr(current_user.usage_quota, "plan_tier", "demo") if current_user.usage_quota else "demo",
-            "analyses_limit": getattr(current_user.usage_quota, "analyses_limit", 3) if current_user.usage_quota else 3,
-            "analyses_used": current_user.usage_quota.analyses_used if current_user.usage_quota else 0
+            "plan_tier": current_user.plan_tier,
+            "analyses_limit": getattr(quota, "analyses_limit", 3) if quota else 3,
+            "analyses_used": quota.analyses_used if quota else 0
         }
     }
 
@@ -233,6 +479,7 @@ def update_user_profile(
     
     db.commit()
     db.refresh(current_user)
+    invalidate_principal(current_user.id)
     
     return {
         "id": str(current_user.id),
@@ -0,0 +1,71 @@
+"""
+Micro-benchmark for PDFService.generate_report.
+
+Renders synthetic reports with 5, 20 and 100 themes and prints the median and best
+render time per report for each size. No database or API keys needed.
+
+Run with: python bench_pdf_service.py [--runs 20] [--tier pro]
+"""
+import os
+import sys
+import time
+import argparse
+import statistics
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from services.pdf_service import pdf_service
+
+THEME_COUNTS = (5, 20, 100)
+
+
+def make_report(theme_count: int) -> dict:
+    themes = []
+    for i in range(theme_count):
+        themes.append({
+            "name": f"Theme {i + 1}: Checkout & payment issues",
+            "sentiment": "negative" if i % 3 else "mixed",
+            "confidence": 70 + i % 30,
+            "count": 10 + i,
+            "summary": "Users report that the checkout flow fails intermittently when applying "
+                       "discount codes, and that error messages like <timeout> are unclear. " * 2,
+            "evidence": [
+                f"I tried to pay three times and it failed every time (#{i})",
+                "The discount code field <b>never</b> accepts my code",
+                "Support told me to \"just retry\" & it still didn't work"
+            ]
+        })
+    return {
+        "filename": "bench.csv",
+        "executive_summary": "Checkout reliability is the dominant complaint across channels.",
+        "themes": themes,
+        "agile_risks": {
+            "product_health_score": 64,
+            "product_health_reasoning": "Core purchase flow has recurring failures."
+        }
+    }
+
+
+def bench(theme_count: int, runs: int, tier: str):
+    report = make_report(theme_count)
+    pdf_service.generate_report(report, tier=tier)  # warm-up
+    timings = []
+    size = 0
+    for _ in range(runs):
+        started = time.perf_counter()
+        size = len(pdf_service.generate_report(report, tier=tier).getvalue())
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings), min(timings), size
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark PDF report rendering")
+    parser.add_argument("--runs", type=int, default=20, help="Renders per theme count")
+    parser.add_argument("--tier", default="pro", help="Plan tier to render for (demo adds the watermark)")
+    args = parser.parse_args()
+
+    print(f"PDF render benchmark ({args.runs} runs, tier={args.tier})")
+    print(f"{'themes':>8} {'median ms':>10} {'best ms':>10} {'size KB':>9}")
+    for count in THEME_COUNTS:
+        median, best, size = bench(count, args.runs, args.tier)
+        print(f"{count:>8} {median:>10.1f} {best:>10.1f} {size / 1024:>9.1f}")
@@ -11,7 +11,7 @@ class ContactRequest(BaseModel):
 
 
 @router.post("/contact")
-async def submit_contact(request: ContactRequest):
+def submit_contact(request: ContactRequest):
     from services.email_service import email_service
 
     sent = email_service.send_contact_email(
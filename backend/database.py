@@ -1,6 +1,10 @@
 import os
-from sqlalchemy import create_engine
+import time
+import threading
+from sqlalchemy import create_engine, event, exc, text
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
 from dotenv import load_dotenv
 
 # Load .env file
@@ -48,17 +52,127 @@ else:
         database=dbname,
     )
 
-# Create Engine
-# pool_pre_ping=True issues a SELECT 1 before returning a connection from the pool.
-# pool_recycle=300 discards connections after 5 minutes so Supabase's PgBouncer never
+# --- Pool Config ---
+# DB_POOL_RECYCLE discards connections after 5 minutes so Supabase's PgBouncer never
 # silently kills an idle socket before we try to use it (common cause of the
 # "SSL connection has been closed unexpectedly" error).
+# Instead of pool_pre_ping (a SELECT 1 on every checkout), a connection is pinged
+# only when it has sat idle in the pool for longer than DB_POOL_PING_IDLE_SECONDS;
+# busy connections are handed out without a round-trip.
+# DB_STATEMENT_CACHE_SIZE is asyncpg's prepared statement cache; set it to 0 when
+# connecting through PgBouncer in transaction mode (Supabase port 6543).
+# The sync and async engines hold separate pools, so each process can open up to
+# DB_POOL_SIZE + DB_MAX_OVERFLOW + DB_ASYNC_POOL_SIZE + DB_ASYNC_MAX_OVERFLOW
+# connections (15 by default, the same as the single pool before). Keep that times
+# the number of processes under the database's connection limit.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 3))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 5))
+DB_ASYNC_POOL_SIZE = int(os.getenv("DB_ASYNC_POOL_SIZE", 2))
+DB_ASYNC_MAX_OVERFLOW = int(os.getenv("DB_ASYNC_MAX_OVERFLOW", 5))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 300))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 30))
+DB_POOL_PING_IDLE_SECONDS = float(os.getenv("DB_POOL_PING_IDLE_SECONDS", 30))
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", 100))
+
+
+class PoolMetrics:
+    """Checkout wait times for one pool, reported by /api/health/metrics"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.waited = 0  # Checkouts that had to wait more than 1ms
+        self.total_wait_ms = 0.0
+        self.max_wait_ms = 0.0
+        self.liveness_pings = 0
+        self.stale_connections = 0
+
+    def record_wait(self, wait_ms: float, timed_out: bool = False):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+                return
+            self.checkouts += 1
+            self.total_wait_ms += wait_ms
+            self.max_wait_ms = max(self.max_wait_ms, wait_ms)
+            if wait_ms > 1:
+                self.waited += 1
+
+    def record_ping(self, stale: bool = False):
+        with self._lock:
+            self.liveness_pings += 1
+            if stale:
+                self.stale_connections += 1
+
+    def snapshot(self, pool) -> dict:
+        return {
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "overflow": pool.overflow(),
+            "checkouts": self.checkouts,
+            "waited": self.waited,
+            "timeouts": self.timeouts,
+            "avg_wait_ms": round(self.total_wait_ms / self.checkouts, 2) if self.checkouts else 0.0,
+            "max_wait_ms": round(self.max_wait_ms, 2),
+            "liveness_pings": self.liveness_pings,
+            "stale_connections": self.stale_connections
+        }
+
+
+class _TimedPoolMixin:
+    metrics: PoolMetrics
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            conn = super()._do_get()
+        except exc.TimeoutError:
+            self.metrics.record_wait(0, timed_out=True)
+            raise
+        self.metrics.record_wait((time.perf_counter() - start) * 1000)
+        return conn
+
+
+class TimedQueuePool(_TimedPoolMixin, QueuePool):
+    metrics = PoolMetrics()
+
+
+class TimedAsyncQueuePool(_TimedPoolMixin, AsyncAdaptedQueuePool):
+    metrics = PoolMetrics()
+
+
+def _install_liveness_check(sync_engine, metrics: PoolMetrics):
+    """Ping connections that were idle longer than DB_POOL_PING_IDLE_SECONDS on checkout"""
+
+    @event.listens_for(sync_engine, "checkin")
+    def _mark_idle(dbapi_connection, connection_record):
+        connection_record.info["checked_in_at"] = time.monotonic()
+
+    @event.listens_for(sync_engine, "checkout")
+    def _ping_if_idle(dbapi_connection, connection_record, connection_proxy):
+        checked_in_at = connection_record.info.get("checked_in_at")
+        if checked_in_at is None or time.monotonic() - checked_in_at < DB_POOL_PING_IDLE_SECONDS:
+            return
+        try:
+            sync_engine.dialect.do_ping(dbapi_connection)
+        except Exception:
+            metrics.record_ping(stale=True)
+            # The pool discards this connection and retries with a fresh one
+            raise exc.DisconnectionError("Idle connection failed liveness ping")
+        metrics.record_ping()
+
+
+# Create Engine
 # TCP keepalive settings instruct the OS to send probe packets on idle connections,
 # preventing the SSL session from being dropped by network intermediaries.
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL,
-    pool_pre_ping=True,
-    pool_recycle=300,
+    poolclass=TimedQueuePool,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_recycle=DB_POOL_RECYCLE,
+    pool_timeout=DB_POOL_TIMEOUT,
     connect_args={
         'sslmode': 'require',
         'keepalives': 1,
@@ -68,12 +182,80 @@ engine = create_engine(
     }
 )
 
+_install_liveness_check(engine, TimedQueuePool.metrics)
+
 # Session Local
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# --- Async Engine ---
+# asyncpg engine for async routes, created on first use so scripts that only
+# need the sync engine do not require asyncpg.
+_async_engine = None
+_async_sessionmaker = None
+_async_lock = threading.Lock()
+
+
+def _async_database_url():
+    url = make_url(SQLALCHEMY_DATABASE_URL).set(drivername="postgresql+asyncpg")
+    # libpq-only options; SSL is passed to asyncpg through connect_args
+    url = url.difference_update_query(["sslmode", "keepalives", "keepalives_idle", "keepalives_interval", "keepalives_count"])
+    # SQLAlchemy's own prepared statement cache for the asyncpg dialect
+    return url.update_query_dict({"prepared_statement_cache_size": str(DB_STATEMENT_CACHE_SIZE)})
+
+
+def get_async_engine():
+    global _async_engine, _async_sessionmaker
+    if _async_engine is None:
+        with _async_lock:
+            if _async_engine is None:
+                from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+                _async_engine = create_async_engine(
+                    _async_database_url(),
+                    poolclass=TimedAsyncQueuePool,
+                    pool_size=DB_ASYNC_POOL_SIZE,
+                    max_overflow=DB_ASYNC_MAX_OVERFLOW,
+                    pool_recycle=DB_POOL_RECYCLE,
+                    pool_timeout=DB_POOL_TIMEOUT,
+                    connect_args={
+                        "ssl": "require",
+                        "statement_cache_size": DB_STATEMENT_CACHE_SIZE,
+                    },
+                )
+                _install_liveness_check(_async_engine.sync_engine, TimedAsyncQueuePool.metrics)
+                _async_sessionmaker = async_sessionmaker(_async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+    return _async_engine
+
+
+def pool_metrics() -> dict:
+    metrics = {"sync": TimedQueuePool.metrics.snapshot(engine.pool)}
+    if _async_engine is not None:
+        metrics["async"] = TimedAsyncQueuePool.metrics.snapshot(_async_engine.pool)
+    return metrics
+
+
+async def dispose_async_engine():
+    if _async_engine is not None:
+        await _async_engine.dispose()
+
 # Base class for models
 Base = declarative_base()
 
+# Columns added to existing tables after their first release. create_all() only
+# creates missing tables, so these idempotent statements run after it on startup
+# (same statements as in supabase_schema.sql).
+SCHEMA_UPGRADES = (
+    "ALTER TABLE public.analysis_results ADD COLUMN IF NOT EXISTS run_metadata_json JSONB",
+    "ALTER TABLE public.feedback_entries ADD COLUMN IF NOT EXISTS row_index INTEGER",
+    "CREATE INDEX IF NOT EXISTS idx_feedback_upload_row ON public.feedback_entries(upload_id, row_index)",
+)
+
+def create_schema():
+    """Create missing tables, then add columns that existing tables are missing"""
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        for statement in SCHEMA_UPGRADES:
+            conn.execute(text(statement))
+
 # Dependency to get DB session
 def get_db():
     db = SessionLocal()
@@ -81,3 +263,9 @@ def get_db():
         yield db
     finally:
         db.close()
+
+# Dependency to get an async DB session (for async def routes)
+async def get_async_db():
+    get_async_engine()
+    async with _async_sessionmaker() as db:
+        yield db
@@ -1,5 +1,6 @@
 
 import os
+import asyncio
 import logging
 from fastapi import FastAPI, Request, Depends
 from fastapi.middleware.cors import CORSMiddleware
@@ -18,7 +19,7 @@ print(f"Environment: RENDER={os.getenv('RENDER')}, PORT={os.getenv('PORT')}")
 import sys
 sys.stdout.flush()
 
-from database import engine, Base
+from database import SessionLocal, create_schema
 print("--- DATABASE IMPORTED ---")
 sys.stdout.flush()
 from auth import router as auth_router
@@ -26,6 +27,7 @@ from upload import router as upload_router
 from analysis import router as analysis_router
 from contact import router as contact_router
 from shared import router as shared_router
+from services.job_queue import AnalysisWorker
 
 # Configure logging
 handlers = [logging.StreamHandler()]
@@ -49,14 +51,30 @@ async def lifespan(app: FastAPI):
     # Startup
     logging.info("Initializing database tables...")
     try:
-        Base.metadata.create_all(bind=engine)
+        create_schema()
         logging.info("Database tables initialized successfully.")
     except Exception as e:
         logging.error(f"Error during database initialization: {e}")
         # Note: We continue startup even if DB fails so Render sees the app as "up"
+
+    # In-process analysis worker (recovers orphaned jobs and backfills trend rollups on
+    # startup). Disable it with ANALYSIS_WORKER_INPROCESS=false when running dedicated
+    # `python worker.py` processes.
+    worker, worker_task = None, None
+    if os.getenv("ANALYSIS_WORKER_INPROCESS", "true").lower() == "true":
+        worker = AnalysisWorker(SessionLocal)
+        worker_task = asyncio.create_task(worker.run())
     yield
     # Shutdown
     logging.info("Shutting down backend...")
+    if worker:
+        worker.stop()
+        await worker_task
+    from services.password_hashing import password_hasher
+    password_hasher.shutdown()
+    from services.report_renderer import report_renderer
+    report_renderer.shutdown()
+    await dispose_async_engine()
 
 app = FastAPI(title="ProductLogik API", lifespan=lifespan)
 
@@ -88,6 +106,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],
 )
 
 # Debug middleware to log origins
@@ -104,29 +123,48 @@ async def log_origin(request: Request, call_next):
 async def read_root():
     return {"status": "ProductLogik API is running"}
 
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import text
-from database import get_db
+from database import get_async_db, pool_metrics, dispose_async_engine
 
 @app.get("/health")
 @app.head("/health")
-async def health_check(db: Session = Depends(get_db)):
+async def health_check(db: AsyncSession = Depends(get_async_db)):
     try:
         # Perform a lightweight query to keep Supabase connection active
-        db.execute(text("SELECT 1"))
+        await db.execute(text("SELECT 1"))
         return {"status": "healthy", "database": "connected"}
     except Exception as e:
         return {"status": "unhealthy", "error": str(e)}
 
 @app.get("/api/health/db")
-async def db_keepalive(db: Session = Depends(get_db)):
+async def db_keepalive(db: AsyncSession = Depends(get_async_db)):
     try:
-        db.execute(text("SELECT 1"))
+        await db.execute(text("SELECT 1"))
         return {"status": "ok", "database": "reachable"}
     except Exception as e:
         from fastapi import HTTPException
         raise HTTPException(status_code=503, detail=f"Database unreachable: {str(e)}")
 
+@app.get("/api/health/metrics")
+async def runtime_metrics():
+    """Process-local counters for caches and pools"""
+    from services.analysis_cache import analysis_cache
+    from access import access_cache
+    from auth import principal_cache
+    from services.response_cache import response_cache
+    from services.report_renderer import report_renderer
+    from services.password_hashing import password_hasher
+    return {
+        "analysis_cache": analysis_cache.stats(),
+        "access_cache": access_cache.stats(),
+        "principal_cache": principal_cache.stats(),
+        "response_cache": response_cache.stats(),
+        "password_hashing": password_hasher.stats(),
+        "pdf_reports": report_renderer.stats(),
+        "db_pool": pool_metrics()
+    }
+
 # Include routers
 app.include_router(auth_router, prefix="/api/auth", tags=["auth"])
 app.include_router(upload_router, prefix="/api", tags=["upload"])
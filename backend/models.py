@@ -1,6 +1,6 @@
-from sqlalchemy import Column, String, Integer, DateTime, ForeignKey, Text, Float, BigInteger
+from sqlalchemy import Column, String, Integer, DateTime, ForeignKey, Text, Float, BigInteger, Index, case
 from sqlalchemy.dialects.postgresql import UUID, JSONB
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, deferred, column_property
 from sqlalchemy.sql import func
 import uuid
 from database import Base
@@ -49,8 +49,15 @@ class Upload(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     user = relationship("User", back_populates="uploads")
-    feedback_entries = relationship("FeedbackEntry", back_populates="upload", cascade="all, delete-orphan")
-    analysis_result = relationship("AnalysisResult", back_populates="upload", uselist=False, cascade="all, delete-orphan")
+    # passive_deletes: the database's ON DELETE CASCADE removes children, so deleting
+    # an upload does not first load thousands of feedback rows and the analysis document
+    feedback_entries = relationship("FeedbackEntry", back_populates="upload", cascade="all, delete-orphan", passive_deletes=True)
+    analysis_result = relationship("AnalysisResult", back_populates="upload", uselist=False, cascade="all, delete-orphan", passive_deletes=True)
+
+    __table_args__ = (
+        # Keyset pagination of a user's uploads, newest first
+        Index("idx_uploads_user_created", "user_id", created_at.desc(), id.desc()),
+    )
 
 class FeedbackEntry(Base):
     __tablename__ = "feedback_entries"
@@ -61,27 +68,46 @@ class FeedbackEntry(Base):
     source = Column(String)
     sentiment_score = Column(Float)
     metadata_json = Column(JSONB, name="metadata") # Renamed to avoid reserved word conflict, mapped to "metadata" column
+    row_index = Column(Integer)  # Position in the uploaded file (NULL for rows stored before it existed)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     upload = relationship("Upload", back_populates="feedback_entries")
 
+    __table_args__ = (
+        # Exports stream an upload's entries in file order
+        Index("idx_feedback_upload_row", "upload_id", "row_index"),
+    )
+
 class AnalysisResult(Base):
     __tablename__ = "analysis_results"
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     upload_id = Column(UUID(as_uuid=True), ForeignKey("uploads.id", ondelete="CASCADE"), unique=True, nullable=False)
     
-    themes_json = Column(JSONB)
-    agile_risks_json = Column(JSONB)
-    theme_feedback_json = Column(JSONB, nullable=True)
+    # The analysis document is deferred: loading an AnalysisResult fetches only the
+    # scalar columns below plus theme_count. Routes that render the document ask for
+    # it with undefer(...) / undefer_group("document").
+    themes_json = deferred(Column(JSONB), group="document")
+    agile_risks_json = deferred(Column(JSONB), group="document")
+    theme_feedback_json = deferred(Column(JSONB, nullable=True), group="document")
     executive_summary = Column(Text)
     
     confidence_score = Column(Float)
     processing_time_ms = Column(Integer)
+    run_metadata_json = deferred(Column(JSONB, nullable=True), group="document")  # Model used, per-stage timings and other run diagnostics
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     upload = relationship("Upload", back_populates="analysis_result")
 
+# Number of themes, computed in Postgres so summaries and existence checks never
+# transfer themes_json
+AnalysisResult.theme_count = column_property(
+    case(
+        (func.jsonb_typeof(AnalysisResult.__table__.c.themes_json) == 'array', func.jsonb_array_length(AnalysisResult.__table__.c.themes_json)),
+        else_=0
+    )
+)
+
 class UploadShare(Base):
     __tablename__ = "upload_shares"
     
@@ -98,3 +124,56 @@ class UploadShare(Base):
     upload = relationship("Upload", foreign_keys=[upload_id])
     owner = relationship("User", foreign_keys=[owner_id])
     shared_with_user = relationship("User", foreign_keys=[shared_with_user_id])
+
+    __table_args__ = (
+        # Keyset pagination of "shared with me", newest share first
+        Index("idx_upload_shares_recipient_created", "shared_with_user_id", created_at.desc(), id.desc()),
+    )
+
+class AnalysisJob(Base):
+    __tablename__ = "analysis_jobs"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    upload_id = Column(UUID(as_uuid=True), ForeignKey("uploads.id", ondelete="CASCADE"), nullable=False, index=True)
+    status = Column(String, default="pending")  # pending, processing, completed, failed
+    attempts = Column(Integer, default=0)
+    ignored_words = Column(Text, nullable=True)
+    persona = Column(String, nullable=True)
+    worker_id = Column(String, nullable=True)  # Worker currently holding the lease
+    locked_at = Column(DateTime(timezone=True), nullable=True)  # Lease heartbeat; stale leases are recovered
+    error_message = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    __table_args__ = (
+        Index("idx_analysis_jobs_status_created", "status", "created_at"),
+    )
+
+class AnalysisRollup(Base):
+    """Narrow per-analysis summary written on completion; serves /analysis/trends"""
+    __tablename__ = "analysis_rollups"
+
+    upload_id = Column(UUID(as_uuid=True), ForeignKey("uploads.id", ondelete="CASCADE"), primary_key=True)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    analyzed_at = Column(DateTime(timezone=True), nullable=False)  # Upload.created_at, the date trends are plotted on
+    filename = Column(String)
+    health_score = Column(Float, nullable=True)
+    theme_counts = Column(JSONB, nullable=False, default=dict)  # {"Theme name": count}
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        Index("idx_analysis_rollups_user_analyzed", "user_id", "analyzed_at"),
+    )
+
+class RefreshToken(Base):
+    """Rotating refresh token; only the SHA-256 of the token is stored"""
+    __tablename__ = "refresh_tokens"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    family_id = Column(UUID(as_uuid=True), nullable=False, index=True)  # All rotations descending from one login
+    token_hash = Column(String, unique=True, nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=False)
+    revoked_at = Column(DateTime(timezone=True), nullable=True)  # Set on rotation, logout or reuse detection
+    replaced_by_id = Column(UUID(as_uuid=True), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
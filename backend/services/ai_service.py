@@ -1,19 +1,49 @@
 import os
+import re
 import json
+import asyncio
 from typing import List, Dict, Optional
 import time
 import logging
 
+from services.analysis_cache import analysis_cache
+from services.dedup import collapse_near_duplicates, DEDUP_ENABLED
+from services.sampling import sample_entries
+from services.prompt_builder import pack_items, truncate_item, estimate_tokens, record_prompt, start_token_log, summarize_token_log
+
 PERSONA_PROMPTS = {
     "strict_agile": "You are a strict Agile practitioner. Focus exclusively on user stories, sprint deliverables, acceptance criteria violations, and agile process dysfunctions. Ignore non-process feedback.",
     "blue_sky": "You are a visionary product strategist. Focus on innovative opportunities, emerging trends, and transformative ideas hidden within the feedback. Reframe negatives as opportunity areas.",
     "risk_churn": "You are a risk and retention analyst. Focus exclusively on churn signals, frustration patterns, deal-breakers, and retention risks embedded in the feedback.",
 }
 
+# Upper bound for a single provider call. Calls go through the providers' async
+# clients, so a slow model only delays its own analysis, never the event loop.
+AI_CALL_TIMEOUT_SECONDS = float(os.getenv("AI_CALL_TIMEOUT_SECONDS", 60))
+
+# Analysis mode: "sample" sends the first ANALYSIS_SAMPLE_SIZE entries in one prompt;
+# "map_reduce" extracts themes from every entry in token-budgeted batches (at most
+# AI_MAX_CONCURRENCY provider calls in flight) and merges them with real counts.
+ANALYSIS_MODE = os.getenv("ANALYSIS_MODE", "sample")
+ANALYSIS_SAMPLE_SIZE = 100
+MAP_BATCH_TOKEN_BUDGET = int(os.getenv("MAP_BATCH_TOKEN_BUDGET", 6000))
+MAP_BATCH_MAX_ITEMS = int(os.getenv("MAP_BATCH_MAX_ITEMS", 150))
+AI_MAX_CONCURRENCY = int(os.getenv("AI_MAX_CONCURRENCY", 4))
+
+# Compare prompt limits
+COMPARE_MAX_THEMES = 20
+COMPARE_SUMMARY_MAX_TOKENS = 400
+
+# Suffix added to collapsed near-duplicate items (see services/dedup.py)
+MULTIPLICITY_SUFFIX_RE = re.compile(r"\[x\d+\]$")
+
 # Configure logger
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+class AnalysisProviderError(Exception):
+    """The last available AI provider failed; the message is shown to the user"""
+
 class AIService:
     def __init__(self):
         """Initialize multi-provider AI service with Gemini as primary and OpenAI as fallback"""
@@ -37,10 +67,10 @@ class AIService:
         
         # Try to initialize OpenAI
         try:
-            from openai import OpenAI
+            from openai import AsyncOpenAI
             openai_key = os.getenv("OPENAI_API_KEY")
             if openai_key and openai_key.startswith("sk-"):
-                self.openai_client = OpenAI(api_key=openai_key)
+                self.openai_client = AsyncOpenAI(api_key=openai_key, timeout=AI_CALL_TIMEOUT_SECONDS)
                 self.openai_available = True
                 if not self.primary_provider:
                     self.primary_provider = "openai"
@@ -53,7 +83,7 @@ class AIService:
             # Do not raise error to allow server startup
             pass
     
-    async def analyze_feedback(self, feedback_entries: List[Dict], upload_id: str, plan_tier: str = "demo", ignored_words: Optional[str] = None, persona: Optional[str] = None) -> Dict:
+    async def analyze_feedback(self, feedback_entries: List[Dict], upload_id: str, plan_tier: str = "demo", ignored_words: Optional[str] = None, persona: Optional[str] = None, analysis_mode: Optional[str] = None, sampling_strategy: Optional[str] = None) -> Dict:
         """
         Analyze feedback using available AI provider (Gemini primary, OpenAI fallback).
         
@@ -61,6 +91,8 @@ class AIService:
             feedback_entries: List of feedback entry dicts with 'content' field
             upload_id: UUID of the upload
             plan_tier: User's subscription tier to conditionally run advanced models
+            analysis_mode: "sample" or "map_reduce" (defaults to ANALYSIS_MODE)
+            sampling_strategy: How the sample is drawn (see services/sampling.py)
             
         Returns:
             Dict with themes, sentiment, confidence scores, and executive summary
@@ -68,73 +100,76 @@ class AIService:
         start_time = time.time()
         
         try:
-            # Extract feedback text
-            feedback_texts = [entry.get('content', '') for entry in feedback_entries if entry.get('content')]
+            # Extract feedback entries with text
+            feedback_entries = [entry for entry in feedback_entries if entry.get('content')]
             
-            if not feedback_texts:
+            if not feedback_entries:
                 return self._empty_analysis()
+            feedback_count = len(feedback_entries)
+
+            # Collapse near-identical rows locally; each representative carries its
+            # multiplicity into the prompt so theme counts keep the true frequency
+            if DEDUP_ENABLED:
+                feedback_entries = await asyncio.to_thread(collapse_near_duplicates, feedback_entries)
+            feedback_texts = [self._with_multiplicity(entry) for entry in feedback_entries]
             
             # Prepare feedback (limit to 100 for cost control)
-            feedback_sample = feedback_texts[:100]
-            
-            # Try primary provider first, then fallback
-            result = None
-            provider_used = None
+            sampled_entries, strategy_used = await asyncio.to_thread(sample_entries, feedback_entries, ANALYSIS_SAMPLE_SIZE, sampling_strategy)
+            feedback_sample = [self._with_multiplicity(entry) for entry in sampled_entries]
+            map_reduce = (analysis_mode or ANALYSIS_MODE) == "map_reduce" and len(feedback_texts) > len(feedback_sample)
+
+            # Identical inputs (re-uploads, retries) are answered from the cache
+            cache_key = analysis_cache.make_key(
+                "analyze_feedback",
+                feedback=[" ".join(text.split()) for text in (feedback_texts if map_reduce else feedback_sample)],
+                models=self._model_chain(),
+                persona=persona or "",
+                ignored_words=(ignored_words or "").strip().lower(),
+                plan_tier=plan_tier,
+                map_reduce=map_reduce
+            )
+            cached = await asyncio.to_thread(analysis_cache.get, cache_key)
+            if cached:
+                logger.info(f"⚡ Analysis cache hit for upload {upload_id}")
+                cached['processing_time_ms'] = int((time.time() - start_time) * 1000)
+                cached['cache_hit'] = True
+                return cached
             
-            if self.gemini_available:
-                try:
-                    logger.info(f"--- Starting Gemini Analysis for upload {upload_id} ---")
-                    # Try 2.0 Flash first
-                    try:
-                        result = await self._analyze_with_gemini(feedback_sample, model_id='gemini-2.0-flash', ignored_words=ignored_words, persona=persona)
-                        provider_used = "gemini-2.0-flash"
-                    except Exception as e:
-                        error_str = str(e)
-                        if "404" in error_str or "RESOURCE_EXHAUSTED" in error_str or "429" in error_str:
-                            logger.info(f"🔄 Gemini 2.0 Flash failed ({'Quota' if '429' in error_str or 'EXHAUSTED' in error_str else 'Missing'}). Retrying with 1.5 Flash...")
-                            result = await self._analyze_with_gemini(feedback_sample, model_id='gemini-flash-latest', ignored_words=ignored_words, persona=persona)
-                            provider_used = "gemini-1.5-flash"
-                        else:
-                            raise e
-
-                    logger.info(f"✅ Gemini Analysis Success ({provider_used})")
-                except Exception as e:
-                    logger.error(f"⚠️ Gemini analysis failed completely: {str(e)}")
-                    if self.openai_available:
-                        logger.info("🔄 Falling back to OpenAI...")
+            # Themes and agile anti-patterns are independent prompts over the same sample,
+            # so they run concurrently. Agile detection (Pro Tier & Above Only) starts
+            # speculatively on the primary provider's model and is only re-run if the
+            # theme stage had to fall back to a different model family.
+            stage_timings = {}
+            token_log = start_token_log()
+            agile_task = None
+            agile_model = None
+            if plan_tier != "demo" and (self.gemini_available or self.openai_available):
+                agile_model = 'gemini-2.0-flash' if self.gemini_available else 'gpt-4o-mini'
+                agile_task = asyncio.create_task(self._timed_agile_detection(feedback_sample, agile_model, upload_id))
 
-            if not result and self.openai_available:
-                try:
-                    logger.info(f"--- Starting OpenAI Analysis for upload {upload_id} ---")
-                    result = await self._analyze_with_openai(feedback_sample, ignored_words=ignored_words, persona=persona)
-                    provider_used = "gpt-4o-mini"
-                    logger.info("✅ OpenAI Analysis Success")
-                except Exception as e:
-                    error_msg = str(e)
-                    logger.error(f"❌ OpenAI analysis failed: {error_msg}")
-                    
-                    # Special handling for quota errors to give better user feedback
-                    if "insufficient_quota" in error_msg or "429" in error_msg:
-                        return self._error_analysis("AI Analysis Credits Exhausted. Both Gemini and OpenAI are currently at their limit. Please try again in 60 seconds or contact support.")
-                    
-                    return self._error_analysis(error_msg)
-            
-            # Anti-Pattern Detection (Pro Tier & Above Only)
-            if result and plan_tier != "demo":
+            try:
+                theme_start = time.time()
                 try:
-                    logger.info(f"--- Starting Agile Anti-Pattern Detection for {upload_id} ---")
-                    if provider_used and "gemini" in provider_used.lower():
-                        # Use the same model family as the primary analysis
-                        model_id = 'gemini-2.0-flash' if '2.0' in provider_used else 'gemini-1.5-flash'
-                        agile_risks = await self._detect_agile_anti_patterns_gemini(feedback_sample, model_id=model_id)
+                    if map_reduce:
+                        result, provider_used = await self._map_reduce_themes(feedback_texts, upload_id, ignored_words=ignored_words, persona=persona)
                     else:
-                        agile_risks = await self._detect_agile_anti_patterns_openai(feedback_sample)
-                    
-                    result['agile_risks'] = agile_risks
-                except Exception as e:
-                    logger.error(f"⚠️ Agile Anti-Pattern detection failed: {e}")
-                    # Don't fail the whole analysis if just this optional extra fails
-                    result['agile_risks'] = {"error": str(e), "detected_patterns": []}
+                        result, provider_used = await self._extract_themes(feedback_sample, upload_id, ignored_words=ignored_words, persona=persona)
+                except AnalysisProviderError as e:
+                    return self._error_analysis(str(e))
+                finally:
+                    stage_timings['themes'] = int((time.time() - theme_start) * 1000)
+
+                if result and agile_task:
+                    # Use the same model family as the primary analysis
+                    paired_model = self._agile_model_for(provider_used)
+                    if paired_model != agile_model:
+                        logger.info(f"🔄 Theme stage used {provider_used}; re-running agile detection on {paired_model}")
+                        agile_task.cancel()
+                        agile_task = asyncio.create_task(self._timed_agile_detection(feedback_sample, paired_model, upload_id))
+                    result['agile_risks'], stage_timings['agile_risks'] = await agile_task
+            finally:
+                if agile_task and not agile_task.done():
+                    agile_task.cancel()
             
             if not result:
                 logger.error("❌ All AI providers failed or were unavailable")
@@ -144,8 +179,13 @@ class AIService:
             processing_time_ms = int((time.time() - start_time) * 1000)
             result['processing_time_ms'] = processing_time_ms
             result['model_used'] = provider_used
-            result['feedback_count'] = len(feedback_texts)
-            result['feedback_analyzed'] = len(feedback_sample)
+            result['feedback_count'] = feedback_count
+            result['duplicates_collapsed'] = feedback_count - len(feedback_texts)
+            result['feedback_analyzed'] = result.pop('map_reduce_coverage', len(feedback_sample))
+            result['analysis_mode'] = "map_reduce" if map_reduce else "sample"
+            result['sampling_strategy'] = strategy_used
+            result['stage_timings_ms'] = stage_timings
+            result['prompt_tokens'] = summarize_token_log(token_log)
             
             # Calculate overall confidence
             if result.get('themes'):
@@ -153,6 +193,11 @@ class AIService:
                 result['confidence_score'] = avg_confidence
             else:
                 result['confidence_score'] = 0
+
+            # Only cache complete runs; a failed optional agile stage should be retried
+            if not (result.get('agile_risks') or {}).get('error'):
+                await asyncio.to_thread(analysis_cache.set, cache_key, result)
+            result['cache_hit'] = False
             
             return result
             
@@ -160,9 +205,276 @@ class AIService:
             print(f"❌ AI analysis error: {e}")
             return self._error_analysis(str(e))
     
+    async def _extract_themes(self, feedback_sample: List[str], upload_id: str, ignored_words: Optional[str] = None, persona: Optional[str] = None):
+        """
+        Theme extraction with provider fallback (Gemini 2.0 Flash -> Gemini Flash latest -> OpenAI).
+
+        Returns (result, provider_used); result is None when no provider produced one.
+        Raises AnalysisProviderError with a user-facing message when the last provider fails.
+        """
+        result = None
+        provider_used = None
+
+        if self.gemini_available:
+            try:
+                logger.info(f"--- Starting Gemini Analysis for upload {upload_id} ---")
+                # Try 2.0 Flash first
+                try:
+                    result = await self._analyze_with_gemini(feedback_sample, model_id='gemini-2.0-flash', ignored_words=ignored_words, persona=persona)
+                    provider_used = "gemini-2.0-flash"
+                except Exception as e:
+                    error_str = str(e)
+                    if "404" in error_str or "RESOURCE_EXHAUSTED" in error_str or "429" in error_str:
+                        logger.info(f"🔄 Gemini 2.0 Flash failed ({'Quota' if '429' in error_str or 'EXHAUSTED' in error_str else 'Missing'}). Retrying with 1.5 Flash...")
+                        result = await self._analyze_with_gemini(feedback_sample, model_id='gemini-flash-latest', ignored_words=ignored_words, persona=persona)
+                        provider_used = "gemini-1.5-flash"
+                    else:
+                        raise e
+
+                logger.info(f"✅ Gemini Analysis Success ({provider_used})")
+            except Exception as e:
+                logger.error(f"⚠️ Gemini analysis failed completely: {str(e)}")
+                if self.openai_available:
+                    logger.info("🔄 Falling back to OpenAI...")
+
+        if not result and self.openai_available:
+            try:
+                logger.info(f"--- Starting OpenAI Analysis for upload {upload_id} ---")
+                result = await self._analyze_with_openai(feedback_sample, ignored_words=ignored_words, persona=persona)
+                provider_used = "gpt-4o-mini"
+                logger.info("✅ OpenAI Analysis Success")
+            except Exception as e:
+                error_msg = str(e)
+                logger.error(f"❌ OpenAI analysis failed: {error_msg}")
+
+                # Special handling for quota errors to give better user feedback
+                if "insufficient_quota" in error_msg or "429" in error_msg:
+                    raise AnalysisProviderError("AI Analysis Credits Exhausted. Both Gemini and OpenAI are currently at their limit. Please try again in 60 seconds or contact support.")
+
+                raise AnalysisProviderError(error_msg)
+
+        return result, provider_used
+
+    async def _map_reduce_themes(self, feedback_texts: List[str], upload_id: str, ignored_words: Optional[str] = None, persona: Optional[str] = None):
+        """
+        Full-coverage theme extraction.
+
+        Map: split all entries into token-budgeted batches and run the normal theme
+        extraction (with provider fallback) on each, bounded by AI_MAX_CONCURRENCY.
+        Reduce: merge the per-batch themes into 3-5 final themes whose counts are the
+        sum of the batch counts. Returns (result, provider_used) like _extract_themes.
+        """
+        batches = self._token_batches(feedback_texts)
+        logger.info(f"--- Map-reduce analysis for upload {upload_id}: {len(feedback_texts)} entries in {len(batches)} batches ---")
+        semaphore = asyncio.Semaphore(AI_MAX_CONCURRENCY)
+
+        async def map_batch(index: int, batch: List[str]):
+            async with semaphore:
+                return await self._extract_themes(batch, f"{upload_id} (batch {index + 1}/{len(batches)})", ignored_words=ignored_words, persona=persona)
+
+        outcomes = await asyncio.gather(*(map_batch(i, b) for i, b in enumerate(batches)), return_exceptions=True)
+
+        partials = []
+        providers = []
+        covered = 0
+        errors = []
+        for batch, outcome in zip(batches, outcomes):
+            if isinstance(outcome, Exception):
+                errors.append(outcome)
+                continue
+            batch_result, batch_provider = outcome
+            if batch_result:
+                partials.append(batch_result)
+                providers.append(batch_provider)
+                covered += len(batch)
+
+        if not partials:
+            for error in errors:
+                if isinstance(error, AnalysisProviderError):
+                    raise error
+            if errors:
+                raise AnalysisProviderError(str(errors[0]))
+            return None, None
+        if errors:
+            logger.error(f"⚠️ {len(errors)} of {len(batches)} map batches failed for {upload_id}; continuing with partial coverage")
+
+        # Report the model family that produced most of the batches
+        provider_used = max(set(providers), key=providers.count)
+        result = await self._reduce_themes(partials, provider_used, ignored_words=ignored_words)
+        result['map_reduce_coverage'] = covered
+        return result, provider_used
+
+    def _token_batches(self, feedback_texts: List[str]) -> List[List[str]]:
+        """Greedy packing of entries into batches under MAP_BATCH_TOKEN_BUDGET"""
+        batches, current, current_tokens = [], [], 0
+        for text in feedback_texts:
+            tokens = estimate_tokens(truncate_item(text)) + 2
+            if current and (current_tokens + tokens > MAP_BATCH_TOKEN_BUDGET or len(current) >= MAP_BATCH_MAX_ITEMS):
+                batches.append(current)
+                current, current_tokens = [], 0
+            current.append(text)
+            current_tokens += tokens
+        if current:
+            batches.append(current)
+        return batches
+
+    async def _reduce_themes(self, partials: List[Dict], provider_used: str, ignored_words: Optional[str] = None) -> Dict:
+        """Merge per-batch themes: exact-name merge locally, then an LLM pass to group near-duplicates"""
+        candidates: Dict[str, Dict] = {}
+        for partial in partials:
+            for theme in partial.get('themes', []):
+                key = " ".join("".join(c for c in str(theme.get('name', '')).lower() if c.isalnum() or c.isspace()).split())
+                if not key:
+                    continue
+                merged = candidates.setdefault(key, {"name": theme.get('name'), "count": 0, "confidence": [], "sentiment": theme.get('sentiment'), "summary": theme.get('summary', ''), "evidence": []})
+                merged["count"] += int(theme.get('count') or 0)
+                merged["confidence"].append(theme.get('confidence', 0) or 0)
+                merged["evidence"].extend(q for q in theme.get('evidence', []) if q not in merged["evidence"])
+        candidate_list = sorted(candidates.values(), key=lambda t: t["count"], reverse=True)
+        for theme in candidate_list:
+            theme["confidence"] = round(sum(theme["confidence"]) / len(theme["confidence"])) if theme["confidence"] else 0
+
+        batch_summaries = [p.get('executive_summary', '') for p in partials if p.get('executive_summary')]
+
+        try:
+            grouping = await self._group_themes_with_provider(candidate_list, batch_summaries, provider_used, ignored_words=ignored_words)
+        except Exception as e:
+            logger.error(f"⚠️ Theme reduce call failed, using local merge: {e}")
+            grouping = None
+
+        themes = []
+        if grouping and grouping.get('themes'):
+            for group in grouping['themes']:
+                members = [candidate_list[i] for i in group.get('members', []) if isinstance(i, int) and 0 <= i < len(candidate_list)]
+                if not members:
+                    continue
+                evidence = []
+                for member in members:
+                    evidence.extend(q for q in member["evidence"] if q not in evidence)
+                themes.append({
+                    "name": group.get('name') or members[0]["name"],
+                    "confidence": group.get('confidence', members[0]["confidence"]),
+                    "sentiment": group.get('sentiment') or members[0]["sentiment"],
+                    "count": sum(m["count"] for m in members),
+                    "summary": group.get('summary') or members[0]["summary"],
+                    "evidence": evidence[:5]
+                })
+            executive_summary = grouping.get('executive_summary') or " ".join(batch_summaries[:2])
+        else:
+            themes = [dict(t, evidence=t["evidence"][:5]) for t in candidate_list[:5]]
+            executive_summary = " ".join(batch_summaries[:2])
+
+        themes.sort(key=lambda t: t["count"], reverse=True)
+        return {"themes": themes, "executive_summary": executive_summary}
+
+    async def _group_themes_with_provider(self, candidates: List[Dict], batch_summaries: List[str], provider_used: str, ignored_words: Optional[str] = None) -> Dict:
+        """Ask the model which candidate themes describe the same issue; counts are summed locally"""
+        candidate_text = json.dumps([
+            {"index": i, "name": t["name"], "count": t["count"], "sentiment": t["sentiment"], "summary": t["summary"]}
+            for i, t in enumerate(candidates)
+        ], indent=1)
+        summaries_text = "\n".join(f"- {summary}" for summary in batch_summaries)
+
+        ignored_instruction = ""
+        if ignored_words and ignored_words.strip():
+            ignored_instruction = f"\n\nEXCLUSION RULE: Drop any themes related to these topics: [{ignored_words}]."
+
+        prompt = f"""You are an expert product feedback analyst. The themes below were extracted from separate batches of the same customer feedback dataset. Several of them may describe the same underlying issue.{ignored_instruction}
+
+Your task:
+1. Group the candidate themes into the top 3-5 distinct themes. Every group lists the candidate indexes it merges in "members".
+2. For each group provide a concise name, a confidence score (0-100), a sentiment (Positive, Neutral, Negative, or Critical) and a 1-2 sentence summary.
+3. Write an executive summary (2-3 sentences) for the whole dataset.
+
+Do NOT compute counts; they are summed from the members.
+
+Candidate themes:
+{candidate_text}
+
+Batch summaries:
+{summaries_text}
+
+Return valid JSON with this structure:
+{{
+  "themes": [
+    {{"name": "Theme name", "members": [0, 3], "confidence": 85, "sentiment": "Critical", "summary": "Brief description"}}
+  ],
+  "executive_summary": "Overall analysis..."
+}}
+
+Return ONLY the JSON object."""
+
+        reduce_model = 'gemini-2.0-flash' if '2.0' in provider_used else 'gemini-flash-latest'
+        record_prompt("reduce", reduce_model if "gemini" in provider_used else "gpt-4o-mini", prompt)
+        if "gemini" in provider_used:
+            from google.genai import types
+            response = await self._gemini_generate(
+                model=reduce_model,
+                contents=prompt,
+                config=types.GenerateContentConfig(
+                    temperature=0.2,
+                    max_output_tokens=2000,
+                    response_mime_type="application/json"
+                )
+            )
+            return json.loads(response.text)
+
+        response = await self._openai_chat(
+            model="gpt-4o-mini",
+            messages=[{"role": "user", "content": prompt}],
+            temperature=0.2,
+            max_tokens=2000,
+            response_format={"type": "json_object"}
+        )
+        return json.loads(response.choices[0].message.content)
+
+    def _model_chain(self) -> List[str]:
+        """Models that can answer, in fallback order; part of every cache key"""
+        chain = []
+        if self.gemini_available:
+            chain += ['gemini-2.0-flash', 'gemini-flash-latest']
+        if self.openai_available:
+            chain.append('gpt-4o-mini')
+        return chain
+
+    def _agile_model_for(self, provider_used: Optional[str]) -> str:
+        """Agile detection model paired with the model family that produced the themes"""
+        if provider_used and "gemini" in provider_used.lower():
+            return 'gemini-2.0-flash' if '2.0' in provider_used else 'gemini-1.5-flash'
+        return 'gpt-4o-mini'
+
+    async def _timed_agile_detection(self, feedback_sample: List[str], model_id: str, upload_id: str):
+        """Run agile anti-pattern detection on one model; returns (agile_risks, elapsed_ms)"""
+        stage_start = time.time()
+        try:
+            logger.info(f"--- Starting Agile Anti-Pattern Detection for {upload_id} ({model_id}) ---")
+            if "gemini" in model_id:
+                agile_risks = await self._detect_agile_anti_patterns_gemini(feedback_sample, model_id=model_id)
+            else:
+                agile_risks = await self._detect_agile_anti_patterns_openai(feedback_sample)
+        except Exception as e:
+            logger.error(f"⚠️ Agile Anti-Pattern detection failed: {e}")
+            # Don't fail the whole analysis if just this optional extra fails
+            agile_risks = {"error": str(e), "detected_patterns": []}
+        return agile_risks, int((time.time() - stage_start) * 1000)
+
+    @staticmethod
+    def _with_multiplicity(entry: Dict) -> str:
+        """Prompt text for an entry: 'text [xN]' when it stands for N near-identical rows"""
+        multiplicity = entry.get('multiplicity', 1)
+        return f"{entry['content']} [x{multiplicity}]" if multiplicity > 1 else entry['content']
+
+    @staticmethod
+    def _multiplicity_instruction(feedback_sample: List[str]) -> str:
+        """Tell the model how to count collapsed items, only when the sample has any"""
+        if any(MULTIPLICITY_SUFFIX_RE.search(text) for text in feedback_sample):
+            return "\n\nWEIGHTING RULE: An item ending in [xN] stands for N near-identical submissions. Count it as N items when estimating theme counts."
+        return ""
+
     async def _analyze_with_gemini(self, feedback_sample: List[str], model_id: str = 'gemini-1.5-flash', ignored_words: Optional[str] = None, persona: Optional[str] = None) -> Dict:
         """Analyze feedback using Gemini"""
-        feedback_list = "\n".join([f"{i+1}. {text}" for i, text in enumerate(feedback_sample)])
+        packed = pack_items(feedback_sample)
+        feedback_list = packed.text
 
         persona_instruction = ""
         if persona and persona in PERSONA_PROMPTS:
@@ -172,7 +484,7 @@ class AIService:
         if ignored_words and ignored_words.strip():
             ignored_instruction = f"\n\nEXCLUSION RULE: You MUST exclude any themes related to these topics: [{ignored_words}]. Do not create themes around these words."
 
-        prompt = f"""You are an expert product feedback analyst. Analyze the following {len(feedback_sample)} customer feedback items and extract key insights.{persona_instruction}{ignored_instruction}
+        prompt = f"""You are an expert product feedback analyst. Analyze the following {packed.count} customer feedback items and extract key insights.{persona_instruction}{ignored_instruction}{self._multiplicity_instruction(feedback_sample)}
 
 Your task:
 1. Identify the top 3-5 most important themes
@@ -208,7 +520,8 @@ Return ONLY the JSON object."""
         from google import genai
         from google.genai import types
         
-        response = self.gemini_client.models.generate_content(
+        record_prompt("themes", model_id, prompt)
+        response = await self._gemini_generate(
             model=model_id,
             contents=prompt,
             config=types.GenerateContentConfig(
@@ -222,7 +535,8 @@ Return ONLY the JSON object."""
     
     async def _analyze_with_openai(self, feedback_sample: List[str], ignored_words: Optional[str] = None, persona: Optional[str] = None) -> Dict:
         """Analyze feedback using OpenAI"""
-        feedback_list = "\n".join([f"{i+1}. {text}" for i, text in enumerate(feedback_sample)])
+        packed = pack_items(feedback_sample)
+        feedback_list = packed.text
 
         persona_instruction = ""
         if persona and persona in PERSONA_PROMPTS:
@@ -232,26 +546,26 @@ Return ONLY the JSON object."""
         if ignored_words and ignored_words.strip():
             ignored_instruction = f" EXCLUSION RULE: Exclude any themes related to: [{ignored_words}]. Do not create themes around these words."
 
-        system_prompt = f"""You are an expert product feedback analyst. Extract key themes, sentiment, and insights.{persona_instruction}{ignored_instruction}
+        system_prompt = f"""You are an expert product feedback analyst. Extract key themes, sentiment, and insights.{persona_instruction}{ignored_instruction}{self._multiplicity_instruction(feedback_sample)}
 
 Return valid JSON with this structure:
-{
+{{
   "themes": [
-    {
+    {{
       "name": "Theme name",
       "confidence": 85,
       "sentiment": "Critical",
       "count": 12,
       "summary": "Brief description",
       "evidence": ["quote 1", "quote 2", "quote 3"]
-    }
+    }}
   ],
   "executive_summary": "Overall analysis..."
-}
+}}
 
 Sentiment must be: Positive, Neutral, Negative, or Critical"""
 
-        user_prompt = f"""Analyze these {len(feedback_sample)} feedback items and extract:
+        user_prompt = f"""Analyze these {packed.count} feedback items and extract:
 1. Top 3-5 themes
 2. Confidence score (0-100) for each
 3. Sentiment for each
@@ -263,7 +577,8 @@ Feedback:
 
 Return ONLY valid JSON."""
 
-        response = self.openai_client.chat.completions.create(
+        record_prompt("themes", "gpt-4o-mini", system_prompt, user_prompt)
+        response = await self._openai_chat(
             model="gpt-4o-mini",
             messages=[
                 {"role": "system", "content": system_prompt},
@@ -283,7 +598,8 @@ Return ONLY valid JSON."""
         from google import genai
         from google.genai import types
         
-        response = self.gemini_client.models.generate_content(
+        record_prompt("agile_risks", model_id, prompt)
+        response = await self._gemini_generate(
             model=model_id,
             contents=prompt,
             config=types.GenerateContentConfig(
@@ -299,7 +615,8 @@ Return ONLY valid JSON."""
         """Detect agile anti-patterns using OpenAI"""
         prompt = self._get_agile_prompt(feedback_sample)
         
-        response = self.openai_client.chat.completions.create(
+        record_prompt("agile_risks", "gpt-4o-mini", prompt)
+        response = await self._openai_chat(
             model="gpt-4o-mini",
             messages=[
                 {"role": "system", "content": "You are a Senior Agile Coach & Product Strategy Expert. Analyze feedback for dysfunctions."},
@@ -313,8 +630,9 @@ Return ONLY valid JSON."""
         return json.loads(response.choices[0].message.content)
         
     def _get_agile_prompt(self, feedback_sample: List[str]) -> str:
-        feedback_list = "\n".join([f"{i+1}. {text}" for i, text in enumerate(feedback_sample)])
-        return f"""You are a Senior Agile Coach & Product Strategy Expert. Analyze the following {len(feedback_sample)} feedback items/updates to detect any of the following 3 Agile anti-patterns:
+        packed = pack_items(feedback_sample)
+        feedback_list = packed.text
+        return f"""You are a Senior Agile Coach & Product Strategy Expert. Analyze the following {packed.count} feedback items/updates to detect any of the following 3 Agile anti-patterns:
 
 1. 'Output over Outcome' (The Build Trap): Focuses on shipping volume (velocity, story points, features) rather than value, user satisfaction, or impact.
 2. 'Stakeholder-Driven Development' (The HiPPO Effect): Priorities dictated by a specific internal person (CEO, Sales) without mentioning user validation.
@@ -355,8 +673,20 @@ Return ONLY valid JSON."""
     
     async def compare_analyses(self, themes_a: list, summary_a: str, themes_b: list, summary_b: str) -> str:
         """Compare two analyses and return a 2-paragraph synthesis."""
-        themes_a_text = json.dumps([{"name": t.get("name"), "sentiment": t.get("sentiment"), "count": t.get("count")} for t in themes_a], indent=2)
-        themes_b_text = json.dumps([{"name": t.get("name"), "sentiment": t.get("sentiment"), "count": t.get("count")} for t in themes_b], indent=2)
+        themes_a_text = json.dumps([{"name": truncate_item(str(t.get("name")), 30), "sentiment": t.get("sentiment"), "count": t.get("count")} for t in themes_a[:COMPARE_MAX_THEMES]], indent=2)
+        themes_b_text = json.dumps([{"name": truncate_item(str(t.get("name")), 30), "sentiment": t.get("sentiment"), "count": t.get("count")} for t in themes_b[:COMPARE_MAX_THEMES]], indent=2)
+        summary_a = truncate_item(summary_a, COMPARE_SUMMARY_MAX_TOKENS)
+        summary_b = truncate_item(summary_b, COMPARE_SUMMARY_MAX_TOKENS)
+
+        cache_key = analysis_cache.make_key(
+            "compare_analyses",
+            themes_a=themes_a_text, summary_a=summary_a,
+            themes_b=themes_b_text, summary_b=summary_b,
+            models=self._model_chain()
+        )
+        cached = await asyncio.to_thread(analysis_cache.get, cache_key)
+        if cached:
+            return cached
 
         prompt = f"""You are an expert product analyst. Compare two customer feedback datasets.
 
@@ -371,31 +701,55 @@ Paragraph 1: What themes or sentiments IMPROVED or remained consistent from Data
 Paragraph 2: What themes or sentiments DETERIORATED or newly emerged in Dataset B compared to Dataset A?
 
 Be specific. Reference actual theme names from both datasets. Keep each paragraph to 3-4 sentences."""
+        record_prompt("compare", "gemini-2.0-flash" if self.gemini_available else "gpt-4o-mini", prompt)
 
         if self.gemini_available:
             try:
                 from google import genai
                 from google.genai import types
-                response = self.gemini_client.models.generate_content(
+                response = await self._gemini_generate(
                     model='gemini-2.0-flash',
                     contents=prompt,
                     config=types.GenerateContentConfig(temperature=0.3, max_output_tokens=600)
                 )
+                await asyncio.to_thread(analysis_cache.set, cache_key, response.text)
                 return response.text
             except Exception as e:
                 logger.error(f"Gemini compare failed: {e}")
 
         if self.openai_available:
-            response = self.openai_client.chat.completions.create(
+            response = await self._openai_chat(
                 model="gpt-4o-mini",
                 messages=[{"role": "user", "content": prompt}],
                 temperature=0.3,
                 max_tokens=600
             )
-            return response.choices[0].message.content
+            synthesis = response.choices[0].message.content
+            await asyncio.to_thread(analysis_cache.set, cache_key, synthesis)
+            return synthesis
 
         raise Exception("No AI provider available for comparison")
 
+    async def _gemini_generate(self, **kwargs):
+        """Non-blocking Gemini call bounded by AI_CALL_TIMEOUT_SECONDS"""
+        try:
+            return await asyncio.wait_for(
+                self.gemini_client.aio.models.generate_content(**kwargs),
+                timeout=AI_CALL_TIMEOUT_SECONDS
+            )
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"Gemini {kwargs.get('model')} call timed out after {AI_CALL_TIMEOUT_SECONDS:.0f}s")
+
+    async def _openai_chat(self, **kwargs):
+        """Non-blocking OpenAI chat completion bounded by AI_CALL_TIMEOUT_SECONDS"""
+        try:
+            return await asyncio.wait_for(
+                self.openai_client.chat.completions.create(**kwargs),
+                timeout=AI_CALL_TIMEOUT_SECONDS
+            )
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"OpenAI {kwargs.get('model')} call timed out after {AI_CALL_TIMEOUT_SECONDS:.0f}s")
+
     def _empty_analysis(self) -> Dict:
         """Return empty analysis when no feedback provided"""
         return {
@@ -0,0 +1,124 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from typing import Optional, Any
+
+logger = logging.getLogger(__name__)
+
+# --- Config ---
+ANALYSIS_CACHE_ENABLED = os.getenv("ANALYSIS_CACHE_ENABLED", "true").lower() == "true"
+ANALYSIS_CACHE_PATH = os.getenv(
+    "ANALYSIS_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache", "analysis_cache.sqlite3")
+)
+ANALYSIS_CACHE_TTL_SECONDS = int(os.getenv("ANALYSIS_CACHE_TTL_SECONDS", 7 * 24 * 3600))
+ANALYSIS_CACHE_MAX_ENTRIES = int(os.getenv("ANALYSIS_CACHE_MAX_ENTRIES", 1000))
+
+
+class AnalysisCache:
+    """
+    Content-addressed cache for LLM results, backed by a local SQLite file so it
+    survives restarts and is shared by the API and worker processes on one host.
+
+    Entries expire after `ttl_seconds`; once more than `max_entries` are stored the
+    least recently used ones are evicted.
+    """
+
+    def __init__(self, path: str = ANALYSIS_CACHE_PATH, ttl_seconds: int = ANALYSIS_CACHE_TTL_SECONDS, max_entries: int = ANALYSIS_CACHE_MAX_ENTRIES, enabled: bool = ANALYSIS_CACHE_ENABLED):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._ready = False
+
+    @staticmethod
+    def make_key(kind: str, **parts: Any) -> str:
+        """Stable sha256 over the kind and all parts that influence the LLM output"""
+        payload = json.dumps({"kind": kind, **parts}, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=5)
+        if not self._ready:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                " key TEXT PRIMARY KEY, value TEXT NOT NULL,"
+                " created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_accessed ON llm_cache(accessed_at)")
+            self._ready = True
+        return conn
+
+    def get(self, key: str) -> Optional[Any]:
+        if not self.enabled:
+            return None
+        try:
+            with self._lock:
+                if not self._ready:
+                    os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                conn = self._connect()
+                try:
+                    now = time.time()
+                    row = conn.execute("SELECT value, created_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+                    if row and now - row[1] <= self.ttl_seconds:
+                        conn.execute("UPDATE llm_cache SET accessed_at = ? WHERE key = ?", (now, key))
+                        conn.commit()
+                        self.hits += 1
+                        return json.loads(row[0])
+                    if row:
+                        conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                        conn.commit()
+                    self.misses += 1
+                    return None
+                finally:
+                    conn.close()
+        except Exception as e:
+            logger.error(f"⚠️ Analysis cache read failed: {e}")
+            return None
+
+    def set(self, key: str, value: Any):
+        if not self.enabled:
+            return
+        try:
+            with self._lock:
+                if not self._ready:
+                    os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                conn = self._connect()
+                try:
+                    now = time.time()
+                    conn.execute(
+                        "INSERT OR REPLACE INTO llm_cache (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                        (key, json.dumps(value, default=str), now, now)
+                    )
+                    # Expire old entries, then trim to max_entries by least recent access
+                    conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (now - self.ttl_seconds,))
+                    conn.execute(
+                        "DELETE FROM llm_cache WHERE key IN ("
+                        " SELECT key FROM llm_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                        (self.max_entries,)
+                    )
+                    conn.commit()
+                finally:
+                    conn.close()
+        except Exception as e:
+            logger.error(f"⚠️ Analysis cache write failed: {e}")
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0
+        }
+
+
+analysis_cache = AnalysisCache()
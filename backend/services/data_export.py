@@ -0,0 +1,204 @@
+import io
+import os
+import csv
+import json
+import logging
+import tempfile
+from typing import Dict, Iterator, List
+
+from sqlalchemy import select
+
+from models import FeedbackEntry
+from services.report_renderer import THEME_COLUMNS, CSV_START_ENCODING, theme_rows
+
+logger = logging.getLogger(__name__)
+
+# --- Config ---
+# Rows fetched per round trip from the server-side cursor, and rows per streamed chunk
+DATA_EXPORT_BATCH_SIZE = int(os.getenv("DATA_EXPORT_BATCH_SIZE", 1000))
+
+DATA_EXPORT_FORMATS = ("csv", "xlsx", "ndjson")
+DATA_EXPORT_MEDIA_TYPES = {
+    "csv": "text/csv",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "ndjson": "application/x-ndjson"
+}
+
+ENTRY_COLUMNS = ["entry_id", "created_at", "source", "sentiment_score", "themes", "content", "metadata"]
+# Excel rejects longer cell values
+XLSX_MAX_CELL_LENGTH = 32767
+XLSX_READ_CHUNK_BYTES = 64 * 1024
+
+
+def _normalize(text) -> str:
+    return " ".join(str(text).split()).lower()
+
+
+class EvidenceMatcher:
+    """
+    Links feedback entries to themes through the theme's evidence quotes. The AI
+    quotes entries verbatim or trims them, so an entry belongs to a theme when a
+    quote appears in it (whitespace and case ignored).
+    """
+
+    def __init__(self, themes: List[Dict]):
+        self.quotes: List[tuple] = []
+        for theme in themes or []:
+            if not isinstance(theme, dict):
+                continue
+            name = theme.get("name") or "Unknown"
+            for quote in theme.get("evidence") or []:
+                normalized = _normalize(quote).strip('"')
+                if normalized:
+                    self.quotes.append((normalized, name))
+
+    def match(self, content: str) -> List[str]:
+        if not self.quotes or not content:
+            return []
+        text = _normalize(content)
+        names: List[str] = []
+        for quote, name in self.quotes:
+            if quote in text and name not in names:
+                names.append(name)
+        return names
+
+
+def _entries(session_factory, upload_id) -> Iterator[Dict]:
+    """
+    Feedback entries of one upload in file order, read through a server-side cursor
+    on a session owned by the export (the request's session is gone once streaming
+    starts). Entries stored before row_index existed sort last, oldest first.
+    """
+    db = session_factory()
+    try:
+        stmt = select(
+            FeedbackEntry.id,
+            FeedbackEntry.created_at,
+            FeedbackEntry.source,
+            FeedbackEntry.sentiment_score,
+            FeedbackEntry.content,
+            FeedbackEntry.metadata_json
+        ).where(
+            FeedbackEntry.upload_id == upload_id
+        ).order_by(
+            FeedbackEntry.row_index.asc().nullslast(), FeedbackEntry.created_at, FeedbackEntry.id
+        ).execution_options(yield_per=DATA_EXPORT_BATCH_SIZE)
+        for row in db.execute(stmt):
+            yield {
+                "entry_id": str(row.id),
+                "created_at": row.created_at.isoformat() if row.created_at else None,
+                "source": row.source,
+                "sentiment_score": row.sentiment_score,
+                "content": row.content,
+                "metadata": row.metadata_json
+            }
+    finally:
+        db.close()
+
+
+def _entry_row(entry: Dict, themes: List[str]) -> list:
+    return [
+        entry["entry_id"],
+        entry["created_at"],
+        entry["source"],
+        entry["sentiment_score"],
+        "; ".join(themes),
+        entry["content"],
+        json.dumps(entry["metadata"], ensure_ascii=False, default=str) if entry["metadata"] is not None else ""
+    ]
+
+
+def stream_csv(session_factory, upload_id, themes: List[Dict]) -> Iterator[bytes]:
+    """One row per feedback entry with the themes it is evidence for"""
+    matcher = EvidenceMatcher(themes)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(ENTRY_COLUMNS)
+    yield buffer.getvalue().encode(CSV_START_ENCODING)
+    buffer.seek(0)
+    buffer.truncate()
+
+    rows = 0
+    for entry in _entries(session_factory, upload_id):
+        writer.writerow(_entry_row(entry, matcher.match(entry["content"])))
+        rows += 1
+        if rows % DATA_EXPORT_BATCH_SIZE == 0:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+def stream_ndjson(session_factory, upload_id, themes: List[Dict], header: Dict) -> Iterator[bytes]:
+    """
+    One JSON object per line: the analysis header, then each theme, then each
+    feedback entry (metadata kept as JSON) with its matched themes
+    """
+    def line(record: Dict) -> str:
+        return json.dumps(record, ensure_ascii=False, default=str) + "\n"
+
+    matcher = EvidenceMatcher(themes)
+    yield line({"type": "analysis", **header}).encode("utf-8")
+    for theme in themes or []:
+        if isinstance(theme, dict):
+            yield line({"type": "theme", **theme}).encode("utf-8")
+
+    chunk: List[str] = []
+    for entry in _entries(session_factory, upload_id):
+        chunk.append(line({"type": "entry", **entry, "themes": matcher.match(entry["content"])}))
+        if len(chunk) >= DATA_EXPORT_BATCH_SIZE:
+            yield "".join(chunk).encode("utf-8")
+            chunk = []
+    if chunk:
+        yield "".join(chunk).encode("utf-8")
+
+
+def xlsx_available() -> bool:
+    try:
+        import openpyxl  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def stream_xlsx(session_factory, upload_id, themes: List[Dict]) -> Iterator[bytes]:
+    """
+    Workbook with a Themes and a Feedback sheet. openpyxl's write-only mode keeps
+    rows on disk while building; the finished file is then streamed in chunks.
+    """
+    from openpyxl import Workbook
+    from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+
+    def cell(value):
+        if isinstance(value, str):
+            return ILLEGAL_CHARACTERS_RE.sub("", value)[:XLSX_MAX_CELL_LENGTH]
+        return value
+
+    matcher = EvidenceMatcher(themes)
+    workbook = Workbook(write_only=True)
+    theme_sheet = workbook.create_sheet("Themes")
+    theme_sheet.append(THEME_COLUMNS)
+    for row in theme_rows(themes):
+        theme_sheet.append([cell(value) for value in row])
+
+    entry_sheet = workbook.create_sheet("Feedback")
+    entry_sheet.append(ENTRY_COLUMNS)
+    for entry in _entries(session_factory, upload_id):
+        entry_sheet.append([cell(value) for value in _entry_row(entry, matcher.match(entry["content"]))])
+
+    fd, path = tempfile.mkstemp(suffix=".xlsx")
+    os.close(fd)
+    try:
+        workbook.save(path)
+        with open(path, "rb") as f:
+            while True:
+                data = f.read(XLSX_READ_CHUNK_BYTES)
+                if not data:
+                    break
+                yield data
+    finally:
+        try:
+            os.remove(path)
+        except OSError:
+            logger.error(f"⚠️ Could not remove temporary export {path}")
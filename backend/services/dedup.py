@@ -0,0 +1,116 @@
+import os
+import re
+import zlib
+import logging
+from typing import List, Dict
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# --- Config ---
+DEDUP_ENABLED = os.getenv("ANALYSIS_DEDUP_ENABLED", "true").lower() == "true"
+DEDUP_SIMILARITY_THRESHOLD = float(os.getenv("ANALYSIS_DEDUP_THRESHOLD", 0.8))
+
+# 128 MinHash permutations split into 16 LSH bands of 8 rows: pairs with a Jaccard
+# similarity above ~0.7 almost always share a band and are then verified exactly
+# against DEDUP_SIMILARITY_THRESHOLD on their signatures.
+NUM_PERMUTATIONS = 128
+LSH_BANDS = 16
+MAX_BUCKET_COMPARISONS = 20
+_MERSENNE_PRIME = (1 << 61) - 1
+_rng = np.random.default_rng(20240501)
+_PERM_A = _rng.integers(1, (1 << 31) - 1, size=NUM_PERMUTATIONS, dtype=np.uint64)
+_PERM_B = _rng.integers(0, (1 << 31) - 1, size=NUM_PERMUTATIONS, dtype=np.uint64)
+
+_WORD_RE = re.compile(r"[a-z0-9']+")
+
+
+def _normalize(text: str) -> str:
+    return " ".join(_WORD_RE.findall(text.lower()))
+
+
+def _shingles(normalized: str) -> np.ndarray:
+    """Word 3-grams (character 4-grams for very short texts), hashed to uint32"""
+    words = normalized.split()
+    if len(words) >= 3:
+        grams = {" ".join(words[i:i + 3]) for i in range(len(words) - 2)}
+    else:
+        grams = {normalized[i:i + 4] for i in range(max(1, len(normalized) - 3))}
+    return np.fromiter((zlib.crc32(g.encode("utf-8")) for g in grams), dtype=np.uint64, count=len(grams))
+
+
+def _signature(shingle_hashes: np.ndarray) -> np.ndarray:
+    """MinHash signature using universal hashing (a*x + b) mod p across all permutations at once"""
+    hashed = (np.outer(_PERM_A, shingle_hashes) + _PERM_B[:, None]) % _MERSENNE_PRIME
+    return hashed.min(axis=1)
+
+
+def collapse_near_duplicates(entries: List[Dict], threshold: float = DEDUP_SIMILARITY_THRESHOLD) -> List[Dict]:
+    """
+    Collapse near-identical feedback entries into one representative per cluster.
+
+    Runs locally (no network): exact duplicates are grouped on normalized text, the
+    rest are clustered with MinHash + LSH over word shingles. Each returned entry is
+    the first member of its cluster with a `multiplicity` field holding the cluster
+    size, in original order, so true frequencies survive for theme counts.
+    """
+    if not entries:
+        return []
+
+    # 1. Exact duplicates after normalization
+    groups: Dict[str, int] = {}
+    uniques: List[Dict] = []
+    normalized_texts: List[str] = []
+    for entry in entries:
+        content = entry.get('content') or ''
+        key = _normalize(content) or content.strip()
+        if key in groups:
+            uniques[groups[key]]['multiplicity'] += entry.get('multiplicity', 1)
+            continue
+        groups[key] = len(uniques)
+        uniques.append(dict(entry, multiplicity=entry.get('multiplicity', 1)))
+        normalized_texts.append(key)
+
+    if len(uniques) < 2:
+        return uniques
+
+    # 2. Near duplicates: MinHash signatures bucketed by LSH band
+    signatures = np.vstack([_signature(_shingles(text)) for text in normalized_texts])
+    parent = list(range(len(uniques)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    rows_per_band = NUM_PERMUTATIONS // LSH_BANDS
+    for band in range(LSH_BANDS):
+        buckets: Dict[bytes, List[int]] = {}
+        band_slice = signatures[:, band * rows_per_band:(band + 1) * rows_per_band]
+        for i, band_key in enumerate(band_slice):
+            members = buckets.setdefault(band_key.tobytes(), [])
+            # Verify against a bounded number of bucket members
+            for j in members[:MAX_BUCKET_COMPARISONS]:
+                root_j, root_i = find(j), find(i)
+                if root_j == root_i:
+                    break
+                if np.mean(signatures[j] == signatures[i]) >= threshold:
+                    # Keep the earliest entry as the cluster representative
+                    parent[max(root_j, root_i)] = min(root_j, root_i)
+                    break
+            members.append(i)
+
+    collapsed: Dict[int, Dict] = {}
+    for i, entry in enumerate(uniques):
+        root = find(i)
+        if root in collapsed:
+            collapsed[root]['multiplicity'] += entry['multiplicity']
+        else:
+            collapsed[root] = entry
+
+    representatives = [collapsed[root] for root in sorted(collapsed)]
+    if len(representatives) < len(entries):
+        logger.info(f"🧹 Collapsed {len(entries)} feedback entries into {len(representatives)} representatives")
+    return representatives
@@ -0,0 +1,286 @@
+import os
+import socket
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Dict, Iterable, List
+
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+from models import AnalysisJob, AnalysisResult, Upload
+
+logger = logging.getLogger(__name__)
+
+# --- Config ---
+# A job whose lease has not been renewed for JOB_LEASE_SECONDS belongs to a dead
+# worker (pm2 restart, memory-limit kill) and is handed back to the queue.
+JOB_LEASE_SECONDS = int(os.getenv("ANALYSIS_JOB_LEASE_SECONDS", 120))
+JOB_POLL_INTERVAL_SECONDS = float(os.getenv("ANALYSIS_JOB_POLL_SECONDS", 2))
+JOB_MAX_ATTEMPTS = int(os.getenv("ANALYSIS_JOB_MAX_ATTEMPTS", 3))
+WORKER_CONCURRENCY = int(os.getenv("ANALYSIS_WORKER_CONCURRENCY", 2))
+
+
+def enqueue_analysis(db: Session, upload_id, ignored_words: Optional[str] = None, persona: Optional[str] = None) -> AnalysisJob:
+    """
+    Add an analysis job for an upload to the caller's transaction.
+    The caller commits, so the job becomes visible together with the upload rows.
+    """
+    job = AnalysisJob(
+        upload_id=upload_id,
+        status="pending",
+        attempts=0,
+        ignored_words=ignored_words,
+        persona=persona
+    )
+    db.add(job)
+    return job
+
+
+def claim_next_job(db_session_factory, worker_id: str) -> Optional[Dict]:
+    """
+    Claim the oldest pending job with SELECT ... FOR UPDATE SKIP LOCKED so
+    concurrent workers never pick up the same row.
+    """
+    db = db_session_factory()
+    try:
+        job = db.query(AnalysisJob).filter(
+            AnalysisJob.status == "pending"
+        ).order_by(AnalysisJob.created_at.asc()).with_for_update(skip_locked=True).first()
+
+        if not job:
+            db.rollback()
+            return None
+
+        job.status = "processing"
+        job.worker_id = worker_id
+        job.locked_at = datetime.now(timezone.utc)
+        job.attempts = (job.attempts or 0) + 1
+        claimed = {
+            "job_id": str(job.id),
+            "upload_id": str(job.upload_id),
+            "ignored_words": job.ignored_words,
+            "persona": job.persona,
+            "attempts": job.attempts
+        }
+        db.commit()
+        return claimed
+    finally:
+        db.close()
+
+
+def renew_lease(db_session_factory, job_id: str, worker_id: str):
+    """Heartbeat: push the lease forward while the job is still running"""
+    db = db_session_factory()
+    try:
+        db.query(AnalysisJob).filter(
+            AnalysisJob.id == job_id,
+            AnalysisJob.worker_id == worker_id,
+            AnalysisJob.status == "processing"
+        ).update({AnalysisJob.locked_at: datetime.now(timezone.utc)}, synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+
+def finish_job(db_session_factory, job_id: str, succeeded: bool, error_message: Optional[str] = None):
+    """Mark a claimed job completed or failed"""
+    db = db_session_factory()
+    try:
+        db.query(AnalysisJob).filter(AnalysisJob.id == job_id).update({
+            AnalysisJob.status: "completed" if succeeded else "failed",
+            AnalysisJob.error_message: error_message,
+            AnalysisJob.locked_at: None
+        }, synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+
+def _local_worker_dead(worker_id: Optional[str]) -> bool:
+    """
+    True when a worker id ("host:pid:suffix") belongs to a process on this host
+    that no longer exists. Workers on other hosts are left to the lease timeout.
+    """
+    try:
+        host, pid, _ = (worker_id or "").split(":")
+        pid = int(pid)
+    except ValueError:
+        return False
+    if host != socket.gethostname():
+        return False
+    if pid == os.getpid():
+        # Same pid as this (new) process: the previous holder is gone
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return True
+    except PermissionError:
+        return False
+    return False
+
+
+def find_dead_workers(db_session_factory, own_worker_id: str) -> List[str]:
+    """Ids of workers on this host that still hold processing jobs but have exited"""
+    db = db_session_factory()
+    try:
+        holders = db.query(AnalysisJob.worker_id).filter(
+            AnalysisJob.status == "processing",
+            AnalysisJob.worker_id.isnot(None)
+        ).distinct().all()
+        return [row.worker_id for row in holders if row.worker_id != own_worker_id and _local_worker_dead(row.worker_id)]
+    finally:
+        db.close()
+
+
+def recover_orphaned_jobs(db_session_factory, dead_workers: Iterable[str] = ()) -> int:
+    """
+    Return jobs with an expired lease, or held by one of `dead_workers`, to the
+    queue, or fail them (and their upload) once JOB_MAX_ATTEMPTS is used up.
+    Returns the number of jobs touched.
+    """
+    db = db_session_factory()
+    try:
+        stale_before = datetime.now(timezone.utc) - timedelta(seconds=JOB_LEASE_SECONDS)
+        orphan_filter = AnalysisJob.locked_at < stale_before
+        dead_workers = list(dead_workers)
+        if dead_workers:
+            orphan_filter = or_(orphan_filter, AnalysisJob.worker_id.in_(dead_workers))
+        orphaned = db.query(AnalysisJob).filter(
+            AnalysisJob.status == "processing",
+            orphan_filter
+        ).with_for_update(skip_locked=True).all()
+
+        for job in orphaned:
+            job.worker_id = None
+            job.locked_at = None
+            if (job.attempts or 0) >= JOB_MAX_ATTEMPTS:
+                job.status = "failed"
+                job.error_message = "Worker stopped responding; retry limit reached"
+                db.query(Upload).filter(Upload.id == job.upload_id).update(
+                    {Upload.status: "failed"}, synchronize_session=False
+                )
+                has_result = db.query(AnalysisResult.id).filter(AnalysisResult.upload_id == job.upload_id).first()
+                if not has_result:
+                    db.add(AnalysisResult(
+                        upload_id=job.upload_id,
+                        executive_summary="Analysis failed: the analysis worker stopped responding. Please retry.",
+                        themes_json=[],
+                        confidence_score=0
+                    ))
+            else:
+                job.status = "pending"
+                db.query(Upload).filter(Upload.id == job.upload_id).update(
+                    {Upload.status: "pending"}, synchronize_session=False
+                )
+
+        db.commit()
+        if orphaned:
+            logger.warning(f"♻️ Recovered {len(orphaned)} orphaned analysis job(s)")
+        return len(orphaned)
+    finally:
+        db.close()
+
+
+class AnalysisWorker:
+    """
+    Polls the analysis_jobs table and runs up to `concurrency` analyses at once.
+    Runs inside the API process (see main.py lifespan) or standalone via worker.py.
+    """
+
+    def __init__(self, db_session_factory, concurrency: int = WORKER_CONCURRENCY, worker_id: Optional[str] = None):
+        self.db_session_factory = db_session_factory
+        self.concurrency = max(1, concurrency)
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self._stopping = asyncio.Event()
+
+    def stop(self):
+        self._stopping.set()
+
+    async def run(self):
+        logger.info(f"👷 Analysis worker {self.worker_id} starting with concurrency={self.concurrency}")
+        # Jobs of a worker that died on this host (restart) are reclaimed right away
+        # instead of waiting out their lease
+        await self._recover(startup=True)
+        backfill = asyncio.create_task(self._backfill_rollups())
+        slots = [asyncio.create_task(self._slot()) for _ in range(self.concurrency)]
+        try:
+            await self._stopping.wait()
+        finally:
+            for slot in slots:
+                slot.cancel()
+            await asyncio.gather(*slots, backfill, return_exceptions=True)
+            logger.info(f"👷 Analysis worker {self.worker_id} stopped")
+
+    async def _recover(self, startup: bool = False):
+        try:
+            dead_workers = []
+            if startup:
+                dead_workers = await asyncio.to_thread(find_dead_workers, self.db_session_factory, self.worker_id)
+            await asyncio.to_thread(recover_orphaned_jobs, self.db_session_factory, dead_workers)
+        except Exception as e:
+            logger.error(f"⚠️ Orphaned job recovery failed: {e}")
+
+    async def _backfill_rollups(self):
+        # Analyses stored before analysis_rollups existed; runs alongside the slots
+        from services.trends import backfill_all_rollups
+        try:
+            await asyncio.to_thread(backfill_all_rollups, self.db_session_factory, self._stopping.is_set)
+        except Exception as e:
+            logger.error(f"⚠️ Trend rollup backfill failed: {e}")
+
+    async def _slot(self):
+        polls = 0
+        while not self._stopping.is_set():
+            try:
+                job = await asyncio.to_thread(claim_next_job, self.db_session_factory, self.worker_id)
+            except Exception as e:
+                logger.error(f"⚠️ Failed to claim analysis job: {e}")
+                job = None
+
+            if job:
+                await self._process(job)
+                continue
+
+            # Idle: periodically sweep for jobs left behind by dead workers
+            polls += 1
+            if polls * JOB_POLL_INTERVAL_SECONDS >= JOB_LEASE_SECONDS:
+                polls = 0
+                await self._recover()
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=JOB_POLL_INTERVAL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _process(self, job: Dict):
+        from upload import run_ai_analysis
+
+        heartbeat = asyncio.create_task(self._heartbeat(job["job_id"]))
+        succeeded, error_message = False, None
+        try:
+            logger.info(f"👷 Worker {self.worker_id} running job {job['job_id']} (attempt {job['attempts']})")
+            succeeded = await run_ai_analysis(job["upload_id"], self.db_session_factory, job["ignored_words"], job["persona"])
+            if not succeeded:
+                error_message = "Analysis failed"
+        except Exception as e:
+            error_message = str(e)
+            logger.error(f"❌ Analysis job {job['job_id']} crashed: {e}")
+        finally:
+            heartbeat.cancel()
+
+        try:
+            await asyncio.to_thread(finish_job, self.db_session_factory, job["job_id"], succeeded, error_message)
+        except Exception as e:
+            # Lease will expire and recovery will re-run the (idempotent) job
+            logger.error(f"⚠️ Failed to finalize analysis job {job['job_id']}: {e}")
+
+    async def _heartbeat(self, job_id: str):
+        interval = max(1, JOB_LEASE_SECONDS // 3)
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await asyncio.to_thread(renew_lease, self.db_session_factory, job_id, self.worker_id)
+            except Exception as e:
+                logger.error(f"⚠️ Lease renewal failed for job {job_id}: {e}")
@@ -0,0 +1,115 @@
+import os
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+
+logger = logging.getLogger(__name__)
+
+# --- Config ---
+# bcrypt releases the GIL while hashing, so a thread pool scales with cores. Routes
+# await the pool from the event loop, so a burst of logins waits here without
+# holding request threadpool workers that other endpoints need.
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", max(1, min(4, os.cpu_count() or 1))))
+# Requests beyond this many queued/running hashes are rejected instead of piling up
+PASSWORD_HASH_MAX_QUEUE = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", 64))
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when the hashing queue is full"""
+
+
+class PasswordHasher:
+    """
+    Bounded pool for bcrypt hashing and verification. Request handlers await
+    hash_async() and verify_async(); hash() and verify() block the calling thread
+    and are meant for scripts. All of them raise PasswordHasherBusy instead of
+    queueing once too many hashes are waiting.
+    """
+
+    def __init__(self, rounds: int = BCRYPT_ROUNDS, workers: int = PASSWORD_HASH_WORKERS, max_queue: int = PASSWORD_HASH_MAX_QUEUE):
+        self.rounds = rounds
+        self.workers = max(1, workers)
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="password-hash")
+        self._lock = threading.Lock()
+        self._pending = 0
+        self.completed = 0
+        self.rejected = 0
+
+    @staticmethod
+    def _hash(password: str, rounds: int) -> str:
+        return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=rounds)).decode('utf-8')
+
+    @staticmethod
+    def _verify(password: str, hashed_password: str) -> bool:
+        try:
+            return bcrypt.checkpw(password.encode('utf-8'), hashed_password.encode('utf-8'))
+        except ValueError:
+            # Malformed hash in the database
+            return False
+
+    def _reserve(self):
+        with self._lock:
+            if self._pending >= self.max_queue:
+                self.rejected += 1
+                raise PasswordHasherBusy("Password hashing queue is full")
+            self._pending += 1
+
+    def _release(self):
+        with self._lock:
+            self._pending -= 1
+            self.completed += 1
+
+    def _submit(self, fn, *args):
+        self._reserve()
+        try:
+            return self._executor.submit(fn, *args).result()
+        finally:
+            self._release()
+
+    async def _submit_async(self, fn, *args):
+        self._reserve()
+        try:
+            return await asyncio.wrap_future(self._executor.submit(fn, *args))
+        finally:
+            self._release()
+
+    def hash(self, password: str) -> str:
+        return self._submit(self._hash, password, self.rounds)
+
+    def verify(self, password: str, hashed_password: str) -> bool:
+        return self._submit(self._verify, password, hashed_password)
+
+    async def hash_async(self, password: str) -> str:
+        return await self._submit_async(self._hash, password, self.rounds)
+
+    async def verify_async(self, password: str, hashed_password: str) -> bool:
+        return await self._submit_async(self._verify, password, hashed_password)
+
+    def needs_rehash(self, hashed_password: str) -> bool:
+        """True when the stored hash was made with a different work factor"""
+        try:
+            return int(hashed_password.split("$")[2]) != self.rounds
+        except (IndexError, ValueError):
+            return False
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "rounds": self.rounds,
+            "in_flight": self._pending,
+            "queue_depth": max(0, self._pending - self.workers),
+            "max_queue": self.max_queue,
+            "completed": self.completed,
+            "rejected": self.rejected
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+password_hasher = PasswordHasher()
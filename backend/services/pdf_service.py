@@ -1,21 +1,72 @@
 import io
+from typing import List, Tuple
+from xml.sax.saxutils import escape
 from reportlab.lib.pagesizes import A4
 from reportlab.lib import colors
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
+from reportlab.platypus import BaseDocTemplate, PageTemplate, Frame, Paragraph, Spacer
+from reportlab.platypus.paraparser import ParaParser
 from reportlab.lib.units import cm
-from reportlab.pdfgen import canvas
 
-class PDFService:
+# Bump whenever the report layout changes so cached PDFs are rendered again
+REPORT_TEMPLATE_VERSION = "2"
+
+
+def _draw_demo_watermark(canvas_obj, doc_obj):
+    canvas_obj.saveState()
+    canvas_obj.setFont('Helvetica-Bold', 60)
+    canvas_obj.setFillAlpha(0.1)
+    canvas_obj.setStrokeColor(colors.lightgrey)
+    canvas_obj.translate(A4[0]/2, A4[1]/2)
+    canvas_obj.rotate(45)
+    canvas_obj.drawCentredString(0, 0, "DEMO - PRODUCTLOGIK")
+    canvas_obj.restoreState()
+
+
+def _no_decoration(canvas_obj, doc_obj):
+    pass
+
+
+class ReportTemplate:
+    """
+    The parts of a report that never change, compiled once per process: paragraph
+    styles, the parsed markup of fixed headings and labels, one text fragment per
+    style to copy dynamic text into, and the page layout (with or without the demo
+    watermark). Reports only build their dynamic sections from these.
+
+    Dynamic text placed through text()/labelled() bypasses the markup parser, so
+    characters like < and & in feedback are rendered literally. Anything passed to
+    markup() must be escaped by the caller.
+    """
+
+    pagesize = A4
+    margin = 2*cm
+
     def __init__(self):
         self.styles = getSampleStyleSheet()
         self._setup_custom_styles()
 
+        # Fixed headings and labels, parsed once
+        self._title = self._parse("ProductLogik Intelligence Report", self.title_style)
+        self._health_heading = self._parse("Product Health Score", self.styles['Heading2'])
+        self._themes_heading = self._parse("Key Problem Themes", self.styles['Heading2'])
+        self._evidence_label = self._parse("<i>Key Evidence:</i>", self.body_style)
+
+        # Fragments that dynamic text is copied into
+        self._text_frags = {
+            "body": self._parse("x", self.body_style)[0],
+            "body_bold": self._parse("<b>x</b>", self.body_style)[0],
+            "theme": self._parse("x", self.theme_style)[0]
+        }
+
+        width, height = self.pagesize
+        self._frame_geometry = (self.margin, self.margin, width - 2*self.margin, height - 2*self.margin)
+
     def _setup_custom_styles(self):
         """Setup custom styles for a premium look"""
         self.brand_color = colors.HexColor("#059669")  # Brand green
         self.text_color = colors.HexColor("#1f2937")  # Dark gray
-        
+
         self.title_style = ParagraphStyle(
             'BrandTitle',
             parent=self.styles['Heading1'],
@@ -24,7 +75,7 @@ class PDFService:
             spaceAfter=12,
             fontName='Helvetica-Bold'
         )
-        
+
         self.theme_style = ParagraphStyle(
             'ThemeTitle',
             parent=self.styles['Heading2'],
@@ -34,7 +85,7 @@ class PDFService:
             spaceAfter=6,
             fontName='Helvetica-Bold'
         )
-        
+
         self.body_style = ParagraphStyle(
             'CustomBody',
             parent=self.styles['BodyText'],
@@ -43,32 +94,87 @@ class PDFService:
             leading=14
         )
 
+    @staticmethod
+    def _parse(markup: str, style: ParagraphStyle) -> list:
+        _, frags, _ = ParaParser().parse(markup, style)
+        if frags is None:
+            raise ValueError(f"Invalid report template markup: {markup!r}")
+        return frags
+
+    @staticmethod
+    def _paragraph(frags: list, style: ParagraphStyle) -> Paragraph:
+        # Paragraphs keep per-layout state, so each report gets its own copies
+        return Paragraph("", style, frags=[frag.clone() for frag in frags])
+
+    # --- Static parts ---
+    def title(self) -> Paragraph:
+        return self._paragraph(self._title, self.title_style)
+
+    def health_heading(self) -> Paragraph:
+        return self._paragraph(self._health_heading, self.styles['Heading2'])
+
+    def themes_heading(self) -> Paragraph:
+        return self._paragraph(self._themes_heading, self.styles['Heading2'])
+
+    def evidence_label(self) -> Paragraph:
+        return self._paragraph(self._evidence_label, self.body_style)
+
+    # --- Dynamic parts ---
+    def text(self, value, kind: str = "body") -> Paragraph:
+        """Plain text in the body or theme-title style, without markup parsing"""
+        style = self.theme_style if kind == "theme" else self.body_style
+        return Paragraph("", style, frags=[self._text_frags[kind].clone(text=str(value))])
+
+    def labelled(self, parts: List[Tuple[str, bool]]) -> Paragraph:
+        """Body paragraph from (text, bold) runs, without markup parsing"""
+        frags = [self._text_frags["body_bold" if bold else "body"].clone(text=str(text)) for text, bold in parts]
+        return Paragraph("", self.body_style, frags=frags)
+
+    def markup(self, markup: str, kind: str = "body") -> Paragraph:
+        """Parsed paragraph for one-off markup; dynamic values must be escape()d"""
+        style = self.theme_style if kind == "theme" else self.body_style
+        return Paragraph(markup, style)
+
+    def page_templates(self, tier: str) -> List[PageTemplate]:
+        # Frames track layout position, so they are created per document
+        frame = Frame(*self._frame_geometry, id="normal")
+        on_page = _draw_demo_watermark if tier == "demo" else _no_decoration
+        return [PageTemplate(id="report", frames=[frame], onPage=on_page)]
+
+
+class PDFService:
+    def __init__(self):
+        self.template = ReportTemplate()
+        self.styles = self.template.styles
+
     def generate_report(self, analysis_data: dict, tier: str = "demo") -> io.BytesIO:
         """
         Generate a professional PDF report from analysis results.
-        
+
         Args:
             analysis_data: The JSON result from AI analysis.
             tier: User tier ('demo', 'pro', or 'team').
-            
+
         Returns:
             io.BytesIO: Buffer containing the PDF data.
         """
+        template = self.template
         buffer = io.BytesIO()
-        doc = SimpleDocTemplate(
+        doc = BaseDocTemplate(
             buffer,
-            pagesize=A4,
-            rightMargin=2*cm,
-            leftMargin=2*cm,
-            topMargin=2*cm,
-            bottomMargin=2*cm
+            pagesize=template.pagesize,
+            rightMargin=template.margin,
+            leftMargin=template.margin,
+            topMargin=template.margin,
+            bottomMargin=template.margin,
+            pageTemplates=template.page_templates(tier)
         )
-        
+
         elements = []
-        
+
         # --- 1. Header ---
-        elements.append(Paragraph("ProductLogik Intelligence Report", self.title_style))
-        elements.append(Paragraph(f"Analysis Summary: {analysis_data.get('executive_summary', 'No summary available.')}", self.body_style))
+        elements.append(template.title())
+        elements.append(template.text(f"Analysis Summary: {analysis_data.get('executive_summary') or 'No summary available.'}"))
         elements.append(Spacer(1, 0.6*cm))
 
         # --- Product Health Score (Pro/Team only) ---
@@ -76,52 +182,43 @@ class PDFService:
             agile_risks = analysis_data['agile_risks']
             score = agile_risks.get('product_health_score')
             if score is not None:
-                elements.append(Paragraph("Product Health Score", self.styles['Heading2']))
+                elements.append(template.health_heading())
                 elements.append(Spacer(1, 0.2*cm))
-                
+
                 status = "Excellent Alignment" if score >= 80 else "Monitor Closely" if score >= 50 else "Critical Risk"
                 score_color = 'green' if score >= 80 else '#d97706' if score >= 50 else 'red'
-                
-                elements.append(Paragraph(f"<b>Score:</b> <font color='{score_color}'>{score}/100</font> ({status})", self.body_style))
-                
+
+                elements.append(template.markup(f"<b>Score:</b> <font color='{score_color}'>{escape(str(score))}/100</font> ({status})"))
+
                 reasoning = agile_risks.get('product_health_reasoning')
                 if reasoning:
-                    elements.append(Paragraph(f"<b>Assessment:</b> {reasoning}", self.body_style))
-                
+                    elements.append(template.labelled([("Assessment:", True), (f" {reasoning}", False)]))
+
                 elements.append(Spacer(1, 0.8*cm))
-        
+
         # --- 2. Themes Section ---
-        elements.append(Paragraph("Key Problem Themes", self.styles['Heading2']))
+        elements.append(template.themes_heading())
         elements.append(Spacer(1, 0.5*cm))
-        
+
         for theme in analysis_data.get('themes', []):
-            elements.append(Paragraph(theme.get('name', 'Unnamed Theme'), self.theme_style))
-            elements.append(Paragraph(f"<b>Sentiment:</b> {theme.get('sentiment')} | <b>Confidence:</b> {theme.get('confidence')}%", self.body_style))
-            elements.append(Paragraph(theme.get('summary', ''), self.body_style))
-            
+            elements.append(template.text(theme.get('name', 'Unnamed Theme'), kind="theme"))
+            elements.append(template.labelled([
+                ("Sentiment:", True), (f" {theme.get('sentiment')} | ", False),
+                ("Confidence:", True), (f" {theme.get('confidence')}%", False)
+            ]))
+            elements.append(template.text(theme.get('summary', '')))
+
             # Evidence Sub-section
             if theme.get('evidence'):
-                elements.append(Paragraph("<i>Key Evidence:</i>", self.body_style))
+                elements.append(template.evidence_label())
                 for quote in theme.get('evidence', []):
-                    elements.append(Paragraph(f"• \"{quote}\"", self.body_style))
-            
-            elements.append(Spacer(1, 0.5*cm))
+                    elements.append(template.text(f"• \"{quote}\""))
 
-        # --- Watermark for Demo Tier ---
-        def add_watermark(canvas_obj, doc_obj):
-            if tier == "demo":
-                canvas_obj.saveState()
-                canvas_obj.setFont('Helvetica-Bold', 60)
-                canvas_obj.setFillAlpha(0.1)
-                canvas_obj.setStrokeColor(colors.lightgrey)
-                canvas_obj.translate(A4[0]/2, A4[1]/2)
-                canvas_obj.rotate(45)
-                canvas_obj.drawCentredString(0, 0, "DEMO - PRODUCTLOGIK")
-                canvas_obj.restoreState()
+            elements.append(Spacer(1, 0.5*cm))
 
         # Build PDF
-        doc.build(elements, onFirstPage=add_watermark, onLaterPages=add_watermark)
-        
+        doc.build(elements)
+
         buffer.seek(0)
         return buffer
 
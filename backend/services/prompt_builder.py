@@ -0,0 +1,122 @@
+import os
+import re
+import math
+import logging
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import List, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# --- Config ---
+# Token budget for the feedback list inside one prompt, and the cap for a single
+# item (a 20KB pasted log is cut down to this with head/tail truncation).
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", 12000))
+PROMPT_ITEM_MAX_TOKENS = int(os.getenv("PROMPT_ITEM_MAX_TOKENS", 300))
+
+_TRUNCATION_MARKER = " […] "
+_MULTIPLICITY_RE = re.compile(r"\s\[x\d+\]$")
+
+# Optional exact tokenizer; the character heuristic is within ~10% for English prose
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("cl100k_base")
+except Exception:
+    _encoding = None
+
+# Per-analysis log of prompt sizes, set by AIService.analyze_feedback
+_prompt_token_log: ContextVar[Optional[List]] = ContextVar("prompt_token_log", default=None)
+
+
+def estimate_tokens(text: str) -> int:
+    """Local token estimate (tiktoken when installed, else ~4 characters per token)"""
+    if not text:
+        return 0
+    if _encoding is not None:
+        return len(_encoding.encode(text, disallowed_special=()))
+    return math.ceil(len(text) / 4)
+
+
+def truncate_item(text: str, max_tokens: int = PROMPT_ITEM_MAX_TOKENS) -> str:
+    """
+    Cap one item at max_tokens. Keeps the beginning (where the point usually is)
+    and the end (stack-trace tails, sign-offs with the actual ask), cut on word
+    boundaries. A trailing [xN] multiplicity marker is preserved.
+    """
+    text = " ".join(text.split())
+    if estimate_tokens(text) <= max_tokens:
+        return text
+
+    suffix = ""
+    match = _MULTIPLICITY_RE.search(text)
+    if match:
+        suffix = match.group(0)
+        text = text[:match.start()]
+
+    # Work in characters using the observed chars/token ratio of this text
+    chars_per_token = len(text) / max(1, estimate_tokens(text))
+    keep_chars = max(16, int(max_tokens * chars_per_token) - len(_TRUNCATION_MARKER))
+    head_chars = int(keep_chars * 0.7)
+    tail_chars = keep_chars - head_chars
+
+    head = text[:head_chars].rsplit(" ", 1)[0] if " " in text[:head_chars] else text[:head_chars]
+    tail = text[-tail_chars:].split(" ", 1)[-1] if " " in text[-tail_chars:] else text[-tail_chars:]
+    return f"{head}{_TRUNCATION_MARKER}{tail}{suffix}"
+
+
+@dataclass
+class PackedItems:
+    """A numbered feedback list that fits the prompt budget"""
+    text: str
+    count: int
+    tokens: int
+    truncated: int
+    dropped: int
+
+
+def pack_items(items: List[str], budget: int = PROMPT_TOKEN_BUDGET, item_max_tokens: int = PROMPT_ITEM_MAX_TOKENS) -> PackedItems:
+    """Truncate each item, then number and add items in order until the budget is used"""
+    lines = []
+    tokens = 0
+    truncated = 0
+    for item in items:
+        capped = truncate_item(item, item_max_tokens)
+        line = f"{len(lines) + 1}. {capped}"
+        line_tokens = estimate_tokens(line) + 1
+        if lines and tokens + line_tokens > budget:
+            break
+        lines.append(line)
+        tokens += line_tokens
+        if capped != " ".join(item.split()):
+            truncated += 1
+
+    dropped = len(items) - len(lines)
+    if truncated or dropped:
+        logger.info(f"✂️ Prompt packing: {len(lines)} items (~{tokens} tokens), {truncated} truncated, {dropped} dropped for budget {budget}")
+    return PackedItems(text="\n".join(lines), count=len(lines), tokens=tokens, truncated=truncated, dropped=dropped)
+
+
+def start_token_log() -> List:
+    """Begin collecting prompt sizes for the current analysis (inherited by its tasks)"""
+    log: List = []
+    _prompt_token_log.set(log)
+    return log
+
+
+def record_prompt(stage: str, model: str, *prompt_parts: str) -> int:
+    """Estimate and log the size of a prompt about to be sent; returns the token count"""
+    tokens = sum(estimate_tokens(part) for part in prompt_parts)
+    logger.info(f"🧮 {stage} prompt for {model}: ~{tokens} tokens")
+    log = _prompt_token_log.get()
+    if log is not None:
+        log.append({"stage": stage, "model": model, "tokens": tokens})
+    return tokens
+
+
+def summarize_token_log(log: List) -> Dict:
+    """Total estimated prompt tokens per stage plus the number of calls"""
+    summary: Dict = {"calls": len(log), "total": 0, "by_stage": {}}
+    for call in log:
+        summary["total"] += call["tokens"]
+        summary["by_stage"][call["stage"]] = summary["by_stage"].get(call["stage"], 0) + call["tokens"]
+    return summary
@@ -0,0 +1,461 @@
+import io
+import os
+import re
+import csv
+import json
+import time
+import uuid
+import asyncio
+import logging
+import zipfile
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from typing import AsyncIterator, Callable, Dict, Iterator, List, Optional, Set, Union
+
+from services.pdf_service import pdf_service, REPORT_TEMPLATE_VERSION
+
+logger = logging.getLogger(__name__)
+
+# --- Config ---
+# ReportLab layout is pure Python and holds the GIL, so reports render in worker
+# processes instead of threads
+PDF_RENDER_WORKERS = int(os.getenv("PDF_RENDER_WORKERS", 2))
+REPORT_CACHE_ENABLED = os.getenv("REPORT_CACHE_ENABLED", "true").lower() == "true"
+REPORT_CACHE_DIR = os.getenv(
+    "REPORT_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache", "reports")
+)
+REPORT_CACHE_MAX_BYTES = int(os.getenv("REPORT_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+# Build every export format right after an analysis is stored
+EXPORT_PRERENDER_ENABLED = os.getenv("EXPORT_PRERENDER_ENABLED", "true").lower() == "true"
+
+EXPORT_FORMATS = ("pdf", "json", "csv")
+EXPORT_MEDIA_TYPES = {"pdf": "application/pdf", "json": "application/json", "csv": "text/csv"}
+# Cache variant for the tier-independent JSON/CSV exports
+DATA_EXPORT_VARIANT = "all"
+
+THEME_COLUMNS = ["theme", "sentiment", "confidence", "count", "summary", "evidence"]
+# Encoding for the start of a CSV file: the BOM makes Excel open it as UTF-8
+CSV_START_ENCODING = "utf-8-sig"
+
+
+def _render_pdf(report_data: dict, tier: str) -> bytes:
+    """Runs in a pool process"""
+    return pdf_service.generate_report(report_data, tier=tier).getvalue()
+
+
+def _lower_priority():
+    """Pool initializer for pre-renders: yield the CPU to request handling"""
+    if hasattr(os, "nice"):
+        try:
+            os.nice(10)
+        except OSError:
+            pass
+
+
+def theme_rows(themes: List[Dict]) -> Iterator[list]:
+    """One THEME_COLUMNS row per theme, with its evidence quotes pipe-separated"""
+    for theme in themes or []:
+        if not isinstance(theme, dict):
+            continue
+        yield [
+            theme.get("name", ""),
+            theme.get("sentiment", ""),
+            theme.get("confidence", ""),
+            theme.get("count", ""),
+            theme.get("summary", ""),
+            " | ".join(str(quote) for quote in theme.get("evidence") or [])
+        ]
+
+
+def render_data_export(report_data: dict, fmt: str) -> bytes:
+    """JSON or CSV export of the executive summary and themes"""
+    themes = report_data.get("themes") or []
+    if fmt == "json":
+        return json.dumps({
+            "filename": report_data.get("filename"),
+            "executive_summary": report_data.get("executive_summary"),
+            "themes": themes
+        }, ensure_ascii=False, default=str).encode("utf-8")
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(THEME_COLUMNS)
+    writer.writerows(theme_rows(themes))
+    return buffer.getvalue().encode(CSV_START_ENCODING)
+
+
+class ReportCache:
+    """
+    Finished exports on local disk, one file per (analysis id, tier or "all" for
+    tier-independent formats, template version, format). A stored analysis never changes in place (retry creates a new id), so
+    entries need no expiry. Once the directory grows past `max_bytes` the least
+    recently served files are removed.
+    """
+
+    def __init__(self, directory: str = REPORT_CACHE_DIR, max_bytes: int = REPORT_CACHE_MAX_BYTES, enabled: bool = REPORT_CACHE_ENABLED):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    def path_for(self, analysis_id, tier: str, extension: str = "pdf") -> str:
+        safe_tier = re.sub(r"[^A-Za-z0-9_-]", "", str(tier or "demo"))
+        return os.path.join(self.directory, f"{analysis_id}_{safe_tier}_v{REPORT_TEMPLATE_VERSION}.{extension}")
+
+    def get(self, analysis_id, tier: str, extension: str = "pdf") -> Optional[str]:
+        """Path of the cached file, or None. Serving a file marks it as recently used."""
+        if not self.enabled:
+            return None
+        path = self.path_for(analysis_id, tier, extension)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return path
+
+    def put(self, analysis_id, tier: str, content: bytes, extension: str = "pdf") -> Optional[str]:
+        """Store atomically and return the path; None when caching is off or the write fails"""
+        if not self.enabled:
+            return None
+        path = self.path_for(analysis_id, tier, extension)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(tmp_path, "wb") as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.error(f"⚠️ Report cache write failed: {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return None
+        self._evict(keep=path)
+        return path
+
+    def discard(self, analysis_id):
+        """Remove every cached file for an analysis (upload deleted or analysis retried)"""
+        if not self.enabled or not os.path.isdir(self.directory):
+            return
+        prefix = f"{analysis_id}_"
+        for name in os.listdir(self.directory):
+            if name.startswith(prefix):
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    pass
+
+    def _evict(self, keep: str):
+        with self._lock:
+            try:
+                entries = []
+                for entry in os.scandir(self.directory):
+                    if entry.is_file() and not entry.name.endswith(".tmp"):
+                        stat = entry.stat()
+                        entries.append((stat.st_mtime, stat.st_size, entry.path))
+            except OSError as e:
+                logger.error(f"⚠️ Report cache scan failed: {e}")
+                return
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                if path == keep:
+                    continue
+                try:
+                    os.remove(path)
+                    total -= size
+                    self.evictions += 1
+                except OSError:
+                    pass
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0
+        }
+
+
+@dataclass
+class BulkReport:
+    """
+    One PDF in a bulk export. load_data is a blocking call that reads the analysis
+    document (None when it is gone); it only runs when the PDF is not cached.
+    """
+    archive_name: str
+    analysis_id: object
+    load_data: Callable[[], Optional[dict]]
+
+
+class _ZipStream(io.RawIOBase):
+    """Unseekable sink for zipfile; drain() hands out what has been written since the last call"""
+
+    def __init__(self):
+        self._pending = bytearray()
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._pending += data
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = bytes(self._pending)
+        self._pending.clear()
+        return data
+
+
+def _read_file(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+class ReportRenderer:
+    """
+    Builds export artifacts and stores them in the report cache: PDF reports in a
+    small process pool, JSON/CSV theme exports in a thread. Concurrent requests for
+    the same artifact share one build.
+
+    Pre-renders (queued when an analysis completes) run in their own single,
+    lower-priority process so they never hold up an interactive export.
+    """
+
+    def __init__(self, cache: ReportCache, workers: int = PDF_RENDER_WORKERS):
+        self.cache = cache
+        self.workers = max(1, workers)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._prerender_executor: Optional[ProcessPoolExecutor] = None
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._prerender_tasks: Set[asyncio.Task] = set()
+        self.rendered = 0
+        self.prerendered = 0
+
+    def _get_executor(self, background: bool = False) -> ProcessPoolExecutor:
+        # spawn: the API process runs threads (DB pools, hashing) that must not be forked
+        if background:
+            if self._prerender_executor is None:
+                self._prerender_executor = ProcessPoolExecutor(
+                    max_workers=1, mp_context=multiprocessing.get_context("spawn"), initializer=_lower_priority
+                )
+            return self._prerender_executor
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+
+    def _discard_executor(self, executor: ProcessPoolExecutor):
+        """Drop a pool whose worker died; the next render starts a fresh one"""
+        if executor is self._executor:
+            self._executor = None
+        elif executor is self._prerender_executor:
+            self._prerender_executor = None
+        else:
+            return
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    async def _render_in_pool(self, report_data: dict, tier: str, background: bool) -> bytes:
+        # A killed worker (OOM, segfault) breaks the whole pool for good, so replace
+        # it and retry once rather than failing every later export
+        for attempt in range(2):
+            executor = self._get_executor(background)
+            try:
+                return await asyncio.get_running_loop().run_in_executor(executor, _render_pdf, report_data, tier)
+            except BrokenProcessPool:
+                self._discard_executor(executor)
+                if attempt:
+                    raise
+                logger.warning("⚠️ PDF render pool broke, retrying on a fresh pool")
+
+    @staticmethod
+    def _variant(fmt: str, tier: str) -> str:
+        # Only the PDF differs by tier (health score section, demo watermark)
+        return tier if fmt == "pdf" else DATA_EXPORT_VARIANT
+
+    async def _build(self, analysis_id, tier: str, report_data: dict, fmt: str, background: bool) -> bytes:
+        started = time.perf_counter()
+        if fmt == "pdf":
+            content = await self._render_in_pool(report_data, tier, background)
+        else:
+            content = await asyncio.to_thread(render_data_export, report_data, fmt)
+        self.rendered += 1
+        logger.info(f"📄 Built {fmt} export for analysis {analysis_id} ({tier}) in {(time.perf_counter() - started) * 1000:.0f}ms")
+        return content
+
+    def _start(self, analysis_id, tier: str, report_data: dict, fmt: str, background: bool = False) -> asyncio.Future:
+        key = self.cache.path_for(analysis_id, self._variant(fmt, tier), fmt)
+        pending = self._inflight.get(key)
+        if pending is None:
+            pending = asyncio.ensure_future(self._build_and_store(analysis_id, tier, report_data, fmt, background))
+            self._inflight[key] = pending
+            pending.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return pending
+
+    async def _build_and_store(self, analysis_id, tier: str, report_data: dict, fmt: str, background: bool) -> Union[str, bytes]:
+        content = await self._build(analysis_id, tier, report_data, fmt, background)
+        path = await asyncio.to_thread(self.cache.put, analysis_id, self._variant(fmt, tier), content, fmt)
+        return path or content
+
+    def cached(self, analysis_id, tier: str, fmt: str = "pdf") -> Optional[str]:
+        return self.cache.get(analysis_id, self._variant(fmt, tier), fmt)
+
+    async def get_export(self, analysis_id, tier: str, report_data: dict, fmt: str = "pdf") -> Union[str, bytes]:
+        """
+        Path to the cached artifact, building it first when needed (or waiting for a
+        pre-render already under way). When the cache is disabled or unwritable the
+        content is returned instead.
+        """
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"Unknown export format '{fmt}'")
+        path = self.cached(analysis_id, tier, fmt)
+        if path:
+            return path
+        return await asyncio.shield(self._start(analysis_id, tier, report_data, fmt))
+
+    async def read_cached(self, analysis_id, tier: str, fmt: str = "pdf") -> Optional[bytes]:
+        """Content of the cached artifact, or None when it is missing or was evicted before it could be read"""
+        path = self.cached(analysis_id, tier, fmt)
+        if not path:
+            return None
+        try:
+            return await asyncio.to_thread(_read_file, path)
+        except FileNotFoundError:
+            return None
+
+    async def read_export(self, analysis_id, tier: str, report_data: dict, fmt: str = "pdf") -> bytes:
+        """
+        Content of the artifact, building it when needed. Exports are small, so they
+        are read into memory before a response starts; a cached file evicted while
+        being served would otherwise break the download halfway.
+        """
+        result = await self.get_export(analysis_id, tier, report_data, fmt)
+        if isinstance(result, bytes):
+            return result
+        try:
+            return await asyncio.to_thread(_read_file, result)
+        except FileNotFoundError:
+            # Evicted between the build and the read: render once more, bypassing the cache
+            return await self._build(analysis_id, tier, report_data, fmt, background=False)
+
+    def export_status(self, analysis_id, tier: str) -> Dict[str, str]:
+        """ready / rendering / missing per format, without building anything"""
+        status = {}
+        for fmt in EXPORT_FORMATS:
+            path = self.cache.path_for(analysis_id, self._variant(fmt, tier), fmt)
+            if path in self._inflight:
+                status[fmt] = "rendering"
+            elif self.cache.enabled and os.path.exists(path):
+                status[fmt] = "ready"
+            else:
+                status[fmt] = "missing"
+        return status
+
+    def schedule_prerender(self, analysis_id, tier: str, report_data: dict):
+        """
+        Build every export format in the background. Must be called from a running
+        event loop; failures are logged and never reach the caller.
+        """
+        if not (EXPORT_PRERENDER_ENABLED and self.cache.enabled):
+            return
+        task = asyncio.ensure_future(self._prerender(analysis_id, tier, report_data))
+        self._prerender_tasks.add(task)
+        task.add_done_callback(self._prerender_tasks.discard)
+
+    async def _prerender(self, analysis_id, tier: str, report_data: dict):
+        for fmt in EXPORT_FORMATS:
+            if self.cached(analysis_id, tier, fmt):
+                continue
+            try:
+                await self._start(analysis_id, tier, report_data, fmt, background=True)
+                self.prerendered += 1
+            except Exception as e:
+                logger.error(f"⚠️ Pre-render of {fmt} export for analysis {analysis_id} failed: {e}")
+
+    async def _bulk_entry(self, report: BulkReport, tier: str, slots: asyncio.Semaphore):
+        """(report, cached path or PDF bytes, error message)"""
+        try:
+            path = self.cached(report.analysis_id, tier)
+            if path:
+                return report, path, None
+            # The document is read only once a render slot is free
+            async with slots:
+                report_data = await asyncio.to_thread(report.load_data)
+                if report_data is None:
+                    raise RuntimeError("analysis no longer exists")
+                return report, await self.get_export(report.analysis_id, tier, report_data), None
+        except Exception as e:
+            logger.error(f"⚠️ Bulk export of {report.archive_name} failed: {e}")
+            return report, None, f"{report.archive_name}: report could not be generated ({e})"
+
+    async def stream_zip(self, reports: List[BulkReport], tier: str, notes: Optional[List[str]] = None) -> AsyncIterator[bytes]:
+        """
+        ZIP archive of PDF reports. Missing PDFs render in parallel on the process
+        pool, loading their analysis document only when one of the pool's slots is
+        free, and each entry is written to the stream as soon as its PDF is ready.
+        Reports that fail are listed in export_errors.txt together with `notes`.
+        """
+        sink = _ZipStream()
+        # PDFs are already compressed; storing them keeps the archive cheap to build
+        archive = zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_STORED)
+        errors = list(notes or [])
+        slots = asyncio.Semaphore(self.workers)
+        pending = [asyncio.ensure_future(self._bulk_entry(report, tier, slots)) for report in reports]
+        try:
+            for next_done in asyncio.as_completed(pending):
+                report, result, error = await next_done
+                if error:
+                    errors.append(error)
+                    continue
+                # Cached reports are read only when their turn comes
+                try:
+                    content = result if isinstance(result, bytes) else await asyncio.to_thread(_read_file, result)
+                except OSError as e:
+                    errors.append(f"{report.archive_name}: report could not be read ({e})")
+                    continue
+                archive.writestr(report.archive_name, content)
+                del content
+                yield sink.drain()
+            if errors:
+                archive.writestr("export_errors.txt", "\n".join(errors) + "\n")
+            archive.close()
+            yield sink.drain()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "rendered": self.rendered,
+            "prerendered": self.prerendered,
+            "in_flight": len(self._inflight),
+            **self.cache.stats()
+        }
+
+    def shutdown(self):
+        for task in list(self._prerender_tasks):
+            task.cancel()
+        for executor in (self._executor, self._prerender_executor):
+            if executor is not None:
+                executor.shutdown(wait=False, cancel_futures=True)
+        self._executor = None
+        self._prerender_executor = None
+
+
+report_cache = ReportCache()
+report_renderer = ReportRenderer(report_cache)
@@ -0,0 +1,69 @@
+import os
+import json
+import uuid
+import hashlib
+from dataclasses import dataclass
+from typing import Any, Optional
+
+from fastapi import Response, status
+from fastapi.encoders import jsonable_encoder
+
+from services.ttl_cache import TTLCache
+
+# --- Config ---
+# Serialized analysis responses kept per process. Stored analyses never change in
+# place (retry deletes and recreates them), so entries are only dropped on retry,
+# delete or expiry; other processes converge within the TTL.
+RESPONSE_CACHE_TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", 300))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", 2000))
+# Browser and CDN lifetimes for public share links
+PUBLIC_ANALYSIS_MAX_AGE = int(os.getenv("PUBLIC_ANALYSIS_MAX_AGE", 60))
+PUBLIC_ANALYSIS_CDN_MAX_AGE = int(os.getenv("PUBLIC_ANALYSIS_CDN_MAX_AGE", 300))
+
+# Authenticated responses may be stored by the browser only and are revalidated every time
+PRIVATE_CACHE_CONTROL = "private, no-cache"
+PUBLIC_CACHE_CONTROL = f"public, max-age={PUBLIC_ANALYSIS_MAX_AGE}, s-maxage={PUBLIC_ANALYSIS_CDN_MAX_AGE}"
+
+response_cache = TTLCache(maxsize=RESPONSE_CACHE_MAX_ENTRIES, ttl=RESPONSE_CACHE_TTL_SECONDS)
+
+
+@dataclass(frozen=True)
+class CachedResponse:
+    etag: str
+    body: bytes
+
+
+def make_etag(*parts: Any) -> str:
+    """Strong ETag over the values that identify one version of a response"""
+    digest = hashlib.sha256("|".join(str(part) for part in parts).encode("utf-8")).hexdigest()
+    return f'"{digest[:32]}"'
+
+
+def serialize(payload: dict) -> bytes:
+    """Encode once, the same way JSONResponse would"""
+    return json.dumps(
+        jsonable_encoder(payload), ensure_ascii=False, allow_nan=False, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match uses weak comparison, so W/"x" matches "x" """
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    return "*" in candidates or any(candidate.removeprefix("W/") == etag for candidate in candidates)
+
+
+def conditional_response(cached: CachedResponse, if_none_match: Optional[str], cache_control: str) -> Response:
+    """304 when the client already has this version, otherwise the cached body"""
+    headers = {"ETag": cached.etag, "Cache-Control": cache_control}
+    if etag_matches(if_none_match, cached.etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=cached.body, media_type="application/json", headers=headers)
+
+
+def invalidate_analysis_responses(upload_id):
+    """Forget cached responses for an upload (analysis retried, upload deleted)"""
+    # Keys hold the canonical uuid string
+    upload_id = str(uuid.UUID(str(upload_id)))
+    response_cache.invalidate_where(lambda key: key[1] == upload_id)
@@ -0,0 +1,164 @@
+import os
+import re
+import zlib
+import logging
+from typing import List, Dict, Optional, Iterable, Tuple
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# --- Config ---
+# head            first N entries (legacy behaviour)
+# stratified      proportional allocation across FeedbackEntry.source or a metadata column
+# length_weighted random sample weighted towards longer, more informative entries
+# diversity       greedy k-center over hashed bag-of-words vectors (maximises coverage)
+# reservoir       single-pass uniform sample, usable on streams
+SAMPLING_STRATEGIES = ("head", "stratified", "length_weighted", "diversity", "reservoir")
+ANALYSIS_SAMPLING_STRATEGY = os.getenv("ANALYSIS_SAMPLING_STRATEGY", "stratified")
+# "source" or "metadata:<column name>"
+ANALYSIS_STRATIFY_BY = os.getenv("ANALYSIS_STRATIFY_BY", "source")
+
+# Fixed seed so identical uploads draw identical samples (and hit the analysis cache)
+SAMPLING_SEED = 0
+_HASH_DIMENSIONS = 512
+_TOKEN_RE = re.compile(r"[a-z0-9']+")
+
+
+class ReservoirSampler:
+    """Algorithm R: uniform sample of k items from a stream of unknown length"""
+
+    def __init__(self, k: int, seed: int = SAMPLING_SEED):
+        self.k = k
+        self.seen = 0
+        self.items: List = []
+        self._rng = np.random.default_rng(seed)
+
+    def add(self, item):
+        self.seen += 1
+        if len(self.items) < self.k:
+            self.items.append(item)
+            return
+        slot = int(self._rng.integers(0, self.seen))
+        if slot < self.k:
+            self.items[slot] = item
+
+    def extend(self, items: Iterable):
+        for item in items:
+            self.add(item)
+
+
+def _weights(entries: List[Dict]) -> np.ndarray:
+    return np.fromiter((entry.get('multiplicity', 1) for entry in entries), dtype=float, count=len(entries))
+
+
+def _stratum_keys(entries: List[Dict], stratify_by: str) -> pd.Series:
+    if stratify_by.startswith("metadata:"):
+        column = stratify_by.split(":", 1)[1]
+        values = [(entry.get('metadata') or {}).get(column) for entry in entries]
+    else:
+        values = [entry.get('source') for entry in entries]
+    return pd.Series(values, dtype=object).fillna("(none)")
+
+
+def _stratified(entries: List[Dict], k: int, stratify_by: str, rng: np.random.Generator) -> np.ndarray:
+    codes, strata = pd.factorize(_stratum_keys(entries, stratify_by))
+    weights = _weights(entries)
+    stratum_weight = np.bincount(codes, weights=weights, minlength=len(strata))
+    stratum_size = np.bincount(codes, minlength=len(strata))
+
+    # Largest-remainder proportional allocation, capped by stratum size
+    quota = stratum_weight / stratum_weight.sum() * k
+    allocation = np.minimum(np.floor(quota).astype(int), stratum_size)
+    if k >= len(strata):
+        # Every stratum gets at least one slot so small sources are not dropped
+        allocation = np.maximum(allocation, np.minimum(1, stratum_size))
+    remainder_order = np.argsort(-(quota - np.floor(quota)))
+    while allocation.sum() < k:
+        progressed = False
+        for stratum in remainder_order:
+            if allocation.sum() >= k:
+                break
+            if allocation[stratum] < stratum_size[stratum]:
+                allocation[stratum] += 1
+                progressed = True
+        if not progressed:
+            break
+    while allocation.sum() > k:
+        allocation[np.argmax(allocation)] -= 1
+
+    chosen = []
+    for stratum, take in enumerate(allocation):
+        if take <= 0:
+            continue
+        members = np.flatnonzero(codes == stratum)
+        p = weights[members] / weights[members].sum()
+        chosen.append(rng.choice(members, size=take, replace=False, p=p))
+    return np.concatenate(chosen) if chosen else np.arange(0)
+
+
+def _length_weighted(entries: List[Dict], k: int, rng: np.random.Generator) -> np.ndarray:
+    lengths = np.fromiter((len(entry.get('content') or '') for entry in entries), dtype=float, count=len(entries))
+    weights = np.log1p(lengths) * _weights(entries)
+    p = weights / weights.sum() if weights.sum() > 0 else None
+    return rng.choice(len(entries), size=k, replace=False, p=p)
+
+
+def _hashed_vectors(entries: List[Dict]) -> np.ndarray:
+    """L2-normalised hashed bag-of-words vectors; cheap, local and vocabulary-free"""
+    vectors = np.zeros((len(entries), _HASH_DIMENSIONS), dtype=np.float32)
+    for row, entry in enumerate(entries):
+        for token in _TOKEN_RE.findall((entry.get('content') or '').lower()):
+            vectors[row, zlib.crc32(token.encode("utf-8")) % _HASH_DIMENSIONS] += 1.0
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _diversity(entries: List[Dict], k: int) -> np.ndarray:
+    """Greedy k-center: repeatedly add the entry farthest (cosine) from everything chosen"""
+    vectors = _hashed_vectors(entries)
+    weights = _weights(entries)
+    # Start from the most frequent entry, ties broken by position
+    chosen = [int(np.argmax(weights))]
+    distance = 1.0 - vectors @ vectors[chosen[0]]
+    for _ in range(k - 1):
+        candidate = int(np.argmax(distance))
+        chosen.append(candidate)
+        distance = np.minimum(distance, 1.0 - vectors @ vectors[candidate])
+        distance[chosen] = -1.0
+    return np.array(chosen)
+
+
+def sample_entries(entries: List[Dict], k: int, strategy: Optional[str] = None, stratify_by: Optional[str] = None) -> Tuple[List[Dict], str]:
+    """
+    Pick up to k entries for the analysis prompt.
+
+    Entries are dicts with 'content', 'source', 'metadata' and optionally
+    'multiplicity' (from near-duplicate collapsing, used as a weight). The sample
+    keeps the original order. Returns (sample, strategy_used).
+    """
+    strategy = strategy or ANALYSIS_SAMPLING_STRATEGY
+    if strategy not in SAMPLING_STRATEGIES:
+        logger.warning(f"⚠️ Unknown sampling strategy '{strategy}', using 'head'")
+        strategy = "head"
+
+    if len(entries) <= k:
+        return list(entries), strategy
+    if strategy == "head":
+        return list(entries[:k]), strategy
+
+    rng = np.random.default_rng(SAMPLING_SEED)
+    if strategy == "stratified":
+        indices = _stratified(entries, k, stratify_by or ANALYSIS_STRATIFY_BY, rng)
+    elif strategy == "length_weighted":
+        indices = _length_weighted(entries, k, rng)
+    elif strategy == "diversity":
+        indices = _diversity(entries, k)
+    else:
+        sampler = ReservoirSampler(k)
+        sampler.extend(range(len(entries)))
+        indices = np.array(sampler.items)
+
+    return [entries[i] for i in np.sort(indices)], strategy
@@ -0,0 +1,190 @@
+import logging
+from datetime import datetime
+from typing import Callable, Optional, List, Dict
+
+from sqlalchemy import Integer, func, literal_column, true
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from models import Upload, AnalysisResult, AnalysisRollup
+from services.ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+TREND_BUCKETS = ("day", "week", "month")
+# Rollups for analyses stored before rollups existed are created in batches of this
+# size: all of them by the analysis worker at startup, and one batch per trends
+# request until that has caught up
+BACKFILL_BATCH_SIZE = 200
+# Users known to have no gaps skip the gap scan on trends requests for this long
+BACKFILL_DONE_TTL_SECONDS = 3600
+
+backfilled_users = TTLCache(maxsize=10000, ttl=BACKFILL_DONE_TTL_SECONDS)
+
+
+def _theme_counts(themes) -> Dict[str, int]:
+    counts: Dict[str, int] = {}
+    for theme in themes or []:
+        if not isinstance(theme, dict):
+            continue
+        try:
+            count = int(theme.get('count') or 0)
+        except (TypeError, ValueError):
+            count = 0
+        counts[theme.get('name') or 'Unknown'] = count
+    return counts
+
+
+def _health_score(agile_risks) -> Optional[float]:
+    if not isinstance(agile_risks, dict):
+        return None
+    score = agile_risks.get('product_health_score')
+    try:
+        return float(score) if score is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def build_rollup(upload: Upload, themes, agile_risks) -> Optional[AnalysisRollup]:
+    """Rollup row for a completed analysis; None when there are no themes to trend"""
+    if not themes:
+        return None
+    return AnalysisRollup(
+        upload_id=upload.id,
+        user_id=upload.user_id,
+        analyzed_at=upload.created_at or datetime.now().astimezone(),
+        filename=upload.filename,
+        health_score=_health_score(agile_risks),
+        theme_counts=_theme_counts(themes)
+    )
+
+
+def backfill_rollups(db: Session, user_id=None, batch_size: int = BACKFILL_BATCH_SIZE) -> int:
+    """
+    Create rollups for up to `batch_size` completed analyses (of one user, or of
+    everyone) that predate the rollup table; returns how many gaps were found, so
+    fewer than `batch_size` means none are left.
+    Only ids are scanned to find the gaps; full results are loaded for those alone.
+    Concurrent callers can find the same gaps, so rows another one already
+    inserted are skipped (ON CONFLICT DO NOTHING).
+    """
+    filters = [Upload.status == "completed", AnalysisRollup.upload_id.is_(None)]
+    if user_id is not None:
+        filters.append(Upload.user_id == user_id)
+    missing = db.query(Upload.id).join(
+        AnalysisResult, AnalysisResult.upload_id == Upload.id
+    ).outerjoin(
+        AnalysisRollup, AnalysisRollup.upload_id == Upload.id
+    ).filter(*filters).limit(batch_size).all()
+    if not missing:
+        return 0
+
+    records = db.query(Upload, AnalysisResult.themes_json, AnalysisResult.agile_risks_json).join(
+        AnalysisResult, AnalysisResult.upload_id == Upload.id
+    ).filter(Upload.id.in_([row.id for row in missing])).all()
+
+    rows = []
+    for upload, themes, agile_risks in records:
+        rollup = build_rollup(upload, themes, agile_risks)
+        if rollup is None:
+            # Completed without themes: store an empty rollup so it is not rescanned
+            rollup = AnalysisRollup(upload_id=upload.id, user_id=upload.user_id, analyzed_at=upload.created_at,
+                                    filename=upload.filename, theme_counts={})
+        rows.append({
+            "upload_id": rollup.upload_id,
+            "user_id": rollup.user_id,
+            "analyzed_at": rollup.analyzed_at,
+            "filename": rollup.filename,
+            "health_score": rollup.health_score,
+            "theme_counts": rollup.theme_counts
+        })
+    result = db.execute(
+        insert(AnalysisRollup).values(rows).on_conflict_do_nothing(index_elements=["upload_id"])
+    )
+    db.commit()
+    logger.info(f"📈 Backfilled {result.rowcount} trend rollup(s) for {f'user {user_id}' if user_id is not None else 'all users'}")
+    return len(missing)
+
+
+def backfill_all_rollups(db_session_factory, should_stop: Callable[[], bool] = lambda: False) -> None:
+    """Backfill every user's missing rollups, one batch per transaction, until done or should_stop()"""
+    while not should_stop():
+        db = db_session_factory()
+        try:
+            found = backfill_rollups(db)
+        finally:
+            db.close()
+        if found < BACKFILL_BATCH_SIZE:
+            return
+
+
+def ensure_user_rollups(db: Session, user_id) -> bool:
+    """
+    Backfill one batch of the user's missing rollups unless they are known to be
+    complete. Returns False while gaps remain (the trends are then partial).
+    """
+    if backfilled_users.get(str(user_id)):
+        return True
+    complete = backfill_rollups(db, user_id) < BACKFILL_BATCH_SIZE
+    if complete:
+        backfilled_users.set(str(user_id), True)
+    return complete
+
+
+def query_trends(db: Session, user_id, start: Optional[datetime] = None, end: Optional[datetime] = None, bucket: Optional[str] = None) -> List[Dict]:
+    """
+    Trend points from analysis_rollups, oldest first. Without a bucket there is one
+    point per analysis; with day/week/month, health scores are averaged and theme
+    counts summed per bucket in Postgres.
+    """
+    if bucket and bucket not in TREND_BUCKETS:
+        raise ValueError(f"Unknown trend bucket '{bucket}'")
+
+    filters = [AnalysisRollup.user_id == user_id, AnalysisRollup.theme_counts != {}]
+    if start:
+        filters.append(AnalysisRollup.analyzed_at >= start)
+    if end:
+        filters.append(AnalysisRollup.analyzed_at < end)
+
+    if not bucket:
+        rows = db.query(
+            AnalysisRollup.upload_id,
+            AnalysisRollup.analyzed_at,
+            AnalysisRollup.filename,
+            AnalysisRollup.health_score,
+            AnalysisRollup.theme_counts
+        ).filter(*filters).order_by(AnalysisRollup.analyzed_at.asc()).all()
+        return [{
+            "upload_id": str(row.upload_id),
+            "date": row.analyzed_at.isoformat() if row.analyzed_at else None,
+            "filename": row.filename,
+            "health_score": row.health_score,
+            "themes": row.theme_counts
+        } for row in rows]
+
+    # Unit is whitelisted above; rendered inline so SELECT and GROUP BY are the same expression
+    bucket_start = func.date_trunc(literal_column(f"'{bucket}'"), AnalysisRollup.analyzed_at).label("bucket_start")
+    summaries = db.query(
+        bucket_start,
+        func.count().label("analysis_count"),
+        func.avg(AnalysisRollup.health_score).label("health_score")
+    ).filter(*filters).group_by(bucket_start).order_by(bucket_start.asc()).all()
+
+    theme_rows = func.jsonb_each_text(AnalysisRollup.theme_counts).table_valued("key", "value").render_derived(name="theme")
+    theme_totals = db.query(
+        bucket_start,
+        theme_rows.c.key,
+        func.sum(theme_rows.c.value.cast(Integer)).label("total")
+    ).select_from(AnalysisRollup).join(theme_rows, true()).filter(*filters).group_by(bucket_start, theme_rows.c.key).all()
+
+    themes_by_bucket: Dict[datetime, Dict[str, int]] = {}
+    for row in theme_totals:
+        themes_by_bucket.setdefault(row.bucket_start, {})[row.key] = int(row.total or 0)
+
+    return [{
+        "date": row.bucket_start.isoformat(),
+        "bucket": bucket,
+        "analysis_count": row.analysis_count,
+        "health_score": round(float(row.health_score), 1) if row.health_score is not None else None,
+        "themes": themes_by_bucket.get(row.bucket_start, {})
+    } for row in summaries]
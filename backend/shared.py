@@ -1,27 +1,54 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from database import get_db
+import uuid
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Header, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import undefer
+from database import get_async_db
 from models import Upload, AnalysisResult
+from services.response_cache import (
+    CachedResponse, PUBLIC_CACHE_CONTROL, response_cache,
+    make_etag, serialize, conditional_response
+)
 
 router = APIRouter()
 
 
 @router.get("/public/analysis/{upload_id}")
-async def get_public_analysis(upload_id: str, db: Session = Depends(get_db)):
+async def get_public_analysis(
+    upload_id: str,
+    db: AsyncSession = Depends(get_async_db),
+    if_none_match: Optional[str] = Header(None)
+):
     """
     Public read-only endpoint. No authentication required.
     The upload_id UUID itself acts as the secret — cryptographically random, not guessable.
+    Responses carry an ETag and are cacheable by browsers and CDNs.
     """
-    upload = db.query(Upload).filter(Upload.id == upload_id).first()
-    if not upload:
+    try:
+        parsed_id = uuid.UUID(upload_id)
+    except ValueError:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Analysis not found")
 
-    analysis = db.query(AnalysisResult).filter(AnalysisResult.upload_id == upload_id).first()
+    cache_key = ("public", str(parsed_id))
+    cached = response_cache.get(cache_key)
+    if cached is not None:
+        return conditional_response(cached, if_none_match, PUBLIC_CACHE_CONTROL)
+
+    row = (await db.execute(
+        select(Upload, AnalysisResult).outerjoin(
+            AnalysisResult, AnalysisResult.upload_id == Upload.id
+        ).options(undefer(AnalysisResult.themes_json)).where(Upload.id == parsed_id)
+    )).first()
+    if not row:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Analysis not found")
+
+    upload, analysis = row
     if not analysis or not analysis.themes_json or len(analysis.themes_json) == 0:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Analysis results are not available for this link")
 
-    return {
-        "upload_id": upload_id,
+    payload = {
+        "upload_id": str(parsed_id),
         "filename": upload.filename,
         "row_count": upload.row_count,
         "themes": analysis.themes_json,
@@ -29,3 +56,9 @@ async def get_public_analysis(upload_id: str, db: Session = Depends(get_db)):
         "confidence_score": analysis.confidence_score,
         "created_at": analysis.created_at.isoformat() if analysis.created_at else None,
     }
+    cached = CachedResponse(
+        etag=make_etag(analysis.id, payload["created_at"]),
+        body=serialize(payload)
+    )
+    response_cache.set(cache_key, cached)
+    return conditional_response(cached, if_none_match, PUBLIC_CACHE_CONTROL)
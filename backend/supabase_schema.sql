@@ -46,6 +46,7 @@ CREATE TABLE IF NOT EXISTS public.feedback_entries (
     source TEXT,           -- e.g., "Jira", "Zendesk", "CSV"
     sentiment_score FLOAT, -- Optional pre-calc
     metadata JSONB,        -- Store extra columns dynamically
+    row_index INTEGER,     -- Position in the uploaded file
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
 
@@ -62,13 +63,84 @@ CREATE TABLE IF NOT EXISTS public.analysis_results (
     
     confidence_score FLOAT,
     processing_time_ms INTEGER,
+    run_metadata_json JSONB, -- Model used, per-stage timings, run diagnostics
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
 
+-- Columns added after the initial release (safe to re-run on existing databases)
+ALTER TABLE public.analysis_results ADD COLUMN IF NOT EXISTS run_metadata_json JSONB;
+ALTER TABLE public.feedback_entries ADD COLUMN IF NOT EXISTS row_index INTEGER;
+
+-- 6. ANALYSIS_JOBS Table
+-- Durable queue of AI analyses. Workers claim rows with FOR UPDATE SKIP LOCKED
+-- and renew locked_at while running; expired leases are recovered.
+CREATE TABLE IF NOT EXISTS public.analysis_jobs (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    upload_id UUID NOT NULL REFERENCES public.uploads(id) ON DELETE CASCADE,
+    status TEXT DEFAULT 'pending' CHECK (status IN ('pending', 'processing', 'completed', 'failed')),
+    attempts INTEGER DEFAULT 0,
+    ignored_words TEXT,
+    persona TEXT,
+    worker_id TEXT,
+    locked_at TIMESTAMP WITH TIME ZONE,
+    error_message TEXT,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+-- 7. ANALYSIS_ROLLUPS Table
+-- One narrow row per completed analysis (health score + theme -> count map),
+-- written when the analysis is stored. Serves /analysis/trends.
+CREATE TABLE IF NOT EXISTS public.analysis_rollups (
+    upload_id UUID PRIMARY KEY REFERENCES public.uploads(id) ON DELETE CASCADE,
+    user_id UUID NOT NULL REFERENCES public.users(id) ON DELETE CASCADE,
+    analyzed_at TIMESTAMP WITH TIME ZONE NOT NULL,
+    filename TEXT,
+    health_score FLOAT,
+    theme_counts JSONB NOT NULL DEFAULT '{}'::jsonb,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+-- 8. REFRESH_TOKENS Table
+-- Rotating refresh tokens (SHA-256 stored, never the token). Reusing a rotated
+-- token revokes its whole family.
+CREATE TABLE IF NOT EXISTS public.refresh_tokens (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    user_id UUID NOT NULL REFERENCES public.users(id) ON DELETE CASCADE,
+    family_id UUID NOT NULL,
+    token_hash TEXT UNIQUE NOT NULL,
+    expires_at TIMESTAMP WITH TIME ZONE NOT NULL,
+    revoked_at TIMESTAMP WITH TIME ZONE,
+    replaced_by_id UUID,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+-- 9. UPLOAD_SHARES Table
+-- Access granted by an upload's owner to another user (or a pending invite by
+-- email until that user registers).
+CREATE TABLE IF NOT EXISTS public.upload_shares (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    upload_id UUID NOT NULL REFERENCES public.uploads(id) ON DELETE CASCADE,
+    owner_id UUID NOT NULL REFERENCES public.users(id) ON DELETE CASCADE,
+    shared_with_user_id UUID REFERENCES public.users(id) ON DELETE CASCADE,
+    invited_email TEXT,
+    permission_level TEXT DEFAULT 'view',
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    expires_at TIMESTAMP WITH TIME ZONE
+);
+
 -- Indexes for performance
 CREATE INDEX IF NOT EXISTS idx_uploads_user_id ON public.uploads(user_id);
+CREATE INDEX IF NOT EXISTS idx_uploads_user_created ON public.uploads(user_id, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_upload_shares_recipient_created ON public.upload_shares(shared_with_user_id, created_at DESC, id DESC);
 CREATE INDEX IF NOT EXISTS idx_feedback_upload_id ON public.feedback_entries(upload_id);
+CREATE INDEX IF NOT EXISTS idx_feedback_upload_row ON public.feedback_entries(upload_id, row_index);
 CREATE INDEX IF NOT EXISTS idx_analysis_upload_id ON public.analysis_results(upload_id);
+CREATE INDEX IF NOT EXISTS ix_analysis_jobs_upload_id ON public.analysis_jobs(upload_id);
+CREATE INDEX IF NOT EXISTS idx_analysis_jobs_status_created ON public.analysis_jobs(status, created_at);
+CREATE INDEX IF NOT EXISTS idx_analysis_rollups_user_analyzed ON public.analysis_rollups(user_id, analyzed_at);
+CREATE INDEX IF NOT EXISTS ix_refresh_tokens_user_id ON public.refresh_tokens(user_id);
+CREATE INDEX IF NOT EXISTS ix_refresh_tokens_family_id ON public.refresh_tokens(family_id);
 
 -- Function to automatically update 'updated_at' timestamp
 CREATE OR REPLACE FUNCTION update_modified_column()
@@ -0,0 +1,171 @@
+"""
+Unit tests for the in-process caches and the keyset pagination cursor.
+
+No database needed.
+Run with: python -m pytest test_caches.py -q
+"""
+import asyncio
+import base64
+import json
+import os
+import uuid
+from datetime import datetime, timezone
+
+import pytest
+from fastapi import HTTPException
+
+from services import ttl_cache
+from services.ttl_cache import TTLCache
+from services.report_renderer import DATA_EXPORT_VARIANT, ReportCache, ReportRenderer
+from services.response_cache import (
+    CachedResponse, conditional_response, etag_matches, invalidate_analysis_responses,
+    make_etag, response_cache, serialize
+)
+
+
+@pytest.fixture(scope="module")
+def analysis(import_without_db):
+    return import_without_db("analysis")
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(ttl_cache.time, "monotonic", lambda: now[0])
+    return now
+
+
+# --- Cursor ---
+
+def test_cursor_round_trip(analysis):
+    created_at = datetime(2026, 3, 1, 12, 30, 15, 123456, tzinfo=timezone.utc)
+    row_id = uuid.uuid4()
+    cursor = analysis._encode_cursor(created_at, row_id)
+
+    assert "=" not in cursor
+    assert analysis._decode_cursor(cursor) == (created_at, row_id)
+
+
+@pytest.mark.parametrize("cursor", [
+    "not-a-cursor",
+    base64.urlsafe_b64encode(json.dumps({"c": "2026-03-01T12:00:00", "i": "not-a-uuid"}).encode()).decode(),
+    base64.urlsafe_b64encode(json.dumps({"c": "yesterday", "i": str(uuid.uuid4())}).encode()).decode(),
+    base64.urlsafe_b64encode(b'{"i": "missing created_at"}').decode()
+])
+def test_tampered_cursor_is_rejected(analysis, cursor):
+    with pytest.raises(HTTPException) as error:
+        analysis._decode_cursor(cursor)
+    assert error.value.status_code == 400
+
+
+# --- TTLCache ---
+
+def test_entries_expire_after_ttl(clock):
+    cache = TTLCache(maxsize=10, ttl=30)
+    cache.set("a", 1)
+    clock[0] += 29
+    assert cache.get("a") == 1
+    clock[0] += 2
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_per_entry_ttl_is_capped_by_default(clock):
+    cache = TTLCache(maxsize=10, ttl=30)
+    cache.set("short", 1, ttl=5)
+    cache.set("long", 2, ttl=300)
+    cache.set("expired", 3, ttl=0)
+    clock[0] += 10
+    assert cache.get("short") is None
+    assert cache.get("long") == 2
+    clock[0] += 25
+    assert cache.get("long") is None
+    assert cache.get("expired") is None
+
+
+def test_least_recently_used_entry_is_evicted(clock):
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+
+
+def test_invalidate_where_and_stats(clock):
+    cache = TTLCache(maxsize=10, ttl=60)
+    cache.set(("x", 1), "a")
+    cache.set(("x", 2), "b")
+    cache.set(("y", 1), "c")
+    assert cache.invalidate_where(lambda key: key[0] == "x") == 2
+    assert cache.get(("y", 1)) == "c"
+    assert cache.get(("x", 1)) is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+# --- Response cache ---
+
+def test_etag_changes_with_its_parts():
+    assert make_etag("analysis", 1) == make_etag("analysis", 1)
+    assert make_etag("analysis", 1) != make_etag("analysis", 2)
+    assert make_etag("analysis", 1).startswith('"')
+
+
+def test_etag_matching_is_weak_and_handles_lists():
+    etag = make_etag("v1")
+    assert etag_matches(etag, etag)
+    assert etag_matches(f'W/{etag}', etag)
+    assert etag_matches(f'"other", {etag}', etag)
+    assert etag_matches("*", etag)
+    assert not etag_matches('"other"', etag)
+    assert not etag_matches(None, etag)
+
+
+def test_conditional_response_returns_304_for_current_version():
+    cached = CachedResponse(etag=make_etag("v1"), body=serialize({"a": 1}))
+    not_modified = conditional_response(cached, cached.etag, "private, no-cache")
+    full = conditional_response(cached, '"stale"', "private, no-cache")
+
+    assert not_modified.status_code == 304
+    assert not_modified.body == b""
+    assert not_modified.headers["etag"] == cached.etag
+    assert full.status_code == 200
+    assert full.body == b'{"a":1}'
+    assert full.headers["cache-control"] == "private, no-cache"
+
+
+def test_invalidation_matches_any_spelling_of_the_upload_id():
+    upload_id = uuid.uuid4()
+    response_cache.set(("analysis", str(upload_id), "user"), "cached")
+    response_cache.set(("public", str(upload_id)), "cached")
+    invalidate_analysis_responses(str(upload_id).upper())
+    assert response_cache.get(("analysis", str(upload_id), "user")) is None
+    assert response_cache.get(("public", str(upload_id))) is None
+
+
+# --- Report cache ---
+
+def test_export_evicted_before_read_is_rendered_again(tmp_path, monkeypatch):
+    renderer = ReportRenderer(ReportCache(directory=str(tmp_path), max_bytes=1 << 20, enabled=True))
+    builds = []
+
+    async def build(analysis_id, tier, report_data, fmt, background):
+        builds.append(fmt)
+        return b"report"
+
+    monkeypatch.setattr(renderer, "_build", build)
+    path = renderer.cache.put("a1", DATA_EXPORT_VARIANT, b"cached", "json")
+
+    assert asyncio.run(renderer.read_cached("a1", "pro", "json")) == b"cached"
+    os.remove(path)
+    assert asyncio.run(renderer.read_cached("a1", "pro", "json")) is None
+
+    async def evicted_path(*args):
+        return path
+
+    monkeypatch.setattr(renderer, "get_export", evicted_path)
+    assert asyncio.run(renderer.read_export("a1", "pro", {}, "json")) == b"report"
+    assert builds == ["json"]
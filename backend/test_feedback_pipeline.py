@@ -0,0 +1,172 @@
+"""
+Unit tests for the feedback path from CSV rows to the analysis prompt: row
+preparation at upload, near-duplicate collapsing, sampling and prompt packing.
+
+No database or API keys needed.
+Run with: python -m pytest test_feedback_pipeline.py -q
+"""
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from services.ai_service import AIService
+from services.dedup import collapse_near_duplicates
+from services.prompt_builder import estimate_tokens, pack_items, truncate_item
+from services.sampling import SAMPLING_STRATEGIES, ReservoirSampler, sample_entries
+
+
+@pytest.fixture(scope="module")
+def prepare_rows(import_without_db):
+    return import_without_db("upload")._prepare_feedback_rows
+
+
+# --- Row preparation ---
+
+def test_rows_prefer_lowercase_source_and_fall_back_to_source(prepare_rows):
+    chunk = pd.DataFrame({
+        "feedback": ["one", "two", "three"],
+        "Source": ["Jira", "Jira", None],
+        "source": ["Zendesk", "", None]
+    })
+    rows = prepare_rows(chunk, "feedback", "upload-1")
+    assert [row["source"] for row in rows] == ["Zendesk", "Jira", None]
+
+
+def test_rows_drop_blank_and_missing_content_and_keep_file_positions(prepare_rows):
+    chunk = pd.read_csv(io.StringIO("feedback,team\n  padded  ,core\n,core\n   ,ops\nlast,\n"))
+    rows = prepare_rows(chunk, "feedback", "upload-1")
+    assert [row["content"] for row in rows] == ["padded", "last"]
+    assert [row["row_index"] for row in rows] == [0, 3]
+    assert all(row["upload_id"] == "upload-1" for row in rows)
+
+
+def test_rows_leave_missing_metadata_cells_out(prepare_rows):
+    chunk = pd.DataFrame({"feedback": ["a", "b"], "team": ["core", np.nan], "score": [5, np.nan]})
+    rows = prepare_rows(chunk, "feedback", "upload-1")
+    assert rows[0]["metadata_json"] == {"team": "core", "score": "5.0"}
+    assert rows[1]["metadata_json"] == {}
+
+
+def test_rows_for_chunk_without_content(prepare_rows):
+    chunk = pd.DataFrame({"feedback": [None, "  "]})
+    assert prepare_rows(chunk, "feedback", "upload-1") == []
+
+
+# --- Near-duplicate collapsing ---
+
+LONG_COMPLAINT = (
+    "The export button on the analytics dashboard does nothing when I click it and "
+    "I have to refresh the whole page several times before the download finally starts"
+)
+
+
+def test_collapse_merges_exact_and_near_duplicates_with_counts():
+    entries = [
+        {"content": LONG_COMPLAINT},
+        {"content": "Dark mode please"},
+        {"content": LONG_COMPLAINT.upper() + "!!!"},
+        {"content": LONG_COMPLAINT + " today"},
+        {"content": "dark mode, please."}
+    ]
+    collapsed = collapse_near_duplicates(entries)
+
+    assert [entry["content"] for entry in collapsed] == [LONG_COMPLAINT, "Dark mode please"]
+    assert [entry["multiplicity"] for entry in collapsed] == [3, 2]
+    assert sum(entry["multiplicity"] for entry in collapsed) == len(entries)
+
+
+def test_collapse_keeps_distinct_entries_apart():
+    entries = [{"content": f"Feature request number {i}: add {word} support"} for i, word in enumerate(["csv", "pdf", "slack", "jira"])]
+    collapsed = collapse_near_duplicates(entries)
+    assert len(collapsed) == 4
+    assert all(entry["multiplicity"] == 1 for entry in collapsed)
+
+
+def test_collapsed_entries_carry_their_count_into_the_prompt():
+    collapsed = collapse_near_duplicates([{"content": "Slow login"}, {"content": "slow login"}, {"content": "Crash on save"}])
+    texts = [AIService._with_multiplicity(entry) for entry in collapsed]
+    assert texts == ["Slow login [x2]", "Crash on save"]
+    assert "WEIGHTING RULE" in AIService._multiplicity_instruction(texts)
+    assert AIService._multiplicity_instruction(["Crash on save"]) == ""
+
+
+# --- Sampling ---
+
+def _entries(count):
+    sources = ["Jira", "Zendesk", "Email", None]
+    return [
+        {"content": f"entry {i} " + "detail " * (i % 7), "source": sources[i % 4], "metadata": {"team": f"t{i % 3}"}}
+        for i in range(count)
+    ]
+
+
+@pytest.mark.parametrize("strategy", SAMPLING_STRATEGIES)
+def test_sample_is_bounded_ordered_and_deterministic(strategy):
+    entries = _entries(250)
+    first, used = sample_entries(entries, 40, strategy=strategy)
+    second, _ = sample_entries(entries, 40, strategy=strategy)
+
+    assert used == strategy
+    assert len(first) == 40
+    assert first == second
+    positions = [entries.index(entry) for entry in first]
+    assert positions == sorted(positions)
+    assert len(set(positions)) == 40
+
+
+def test_sample_returns_everything_when_below_size():
+    entries = _entries(10)
+    sample, _ = sample_entries(entries, 40, strategy="diversity")
+    assert sample == entries
+
+
+def test_stratified_sample_covers_every_source():
+    sample, _ = sample_entries(_entries(400), 20, strategy="stratified", stratify_by="source")
+    assert {entry["source"] for entry in sample} == {"Jira", "Zendesk", "Email", None}
+
+
+def test_unknown_strategy_falls_back_to_head():
+    entries = _entries(30)
+    sample, used = sample_entries(entries, 5, strategy="nope")
+    assert used == "head"
+    assert sample == entries[:5]
+
+
+def test_reservoir_sampler_keeps_k_items():
+    sampler = ReservoirSampler(5, seed=1)
+    sampler.extend(range(1000))
+    assert sampler.seen == 1000
+    assert len(sampler.items) == 5
+    assert len(set(sampler.items)) == 5
+
+
+# --- Prompt token budget ---
+
+def test_pack_items_stays_within_budget_and_counts_drops():
+    items = [f"Feedback item {i} " + "words " * 40 for i in range(200)]
+    packed = pack_items(items, budget=1000, item_max_tokens=300)
+
+    assert 0 < packed.count < len(items)
+    assert packed.tokens <= 1000
+    assert sum(estimate_tokens(line) + 1 for line in packed.text.split("\n")) <= 1000
+    assert packed.dropped == len(items) - packed.count
+    assert packed.text.startswith("1. Feedback item 0")
+
+
+def test_pack_items_always_keeps_the_first_item():
+    packed = pack_items(["x " * 5000], budget=10, item_max_tokens=300)
+    assert packed.count == 1
+    assert packed.truncated == 1
+
+
+def test_truncate_item_caps_long_text_and_keeps_multiplicity():
+    text = " ".join(f"word{i}" for i in range(2000)) + " [x4]"
+    capped = truncate_item(text, max_tokens=100)
+
+    assert estimate_tokens(capped) <= 110
+    assert capped.startswith("word0 ")
+    assert capped.endswith("word1999 [x4]")
+    assert "[…]" in capped
+    assert truncate_item("  short   text ", max_tokens=100) == "short text"
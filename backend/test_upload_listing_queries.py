@@ -0,0 +1,121 @@
+"""
+Query-count regression test for GET /api/uploads and /api/uploads/shared-with-me.
+
+Both listings must issue a constant number of SQL statements no matter how many
+uploads are returned (no per-row owner/analysis lookups).
+
+Needs the Postgres database from .env (jsonb functions); skipped otherwise.
+Run with: python -m pytest test_upload_listing_queries.py -q
+"""
+import os
+import sys
+import uuid
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+import pytest
+from dotenv import load_dotenv
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+load_dotenv()
+
+if not (os.getenv("DATABASE_URL") or os.getenv("host")):
+    pytest.skip("No database configured in .env", allow_module_level=True)
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from main import app
+from auth import get_current_principal
+from database import SessionLocal, engine, get_async_engine
+from models import User, Upload, AnalysisResult, UploadShare
+
+
+@contextmanager
+def count_queries():
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    # Listings run on the async engine; count both so no path is missed
+    engines = (engine, get_async_engine().sync_engine)
+    for target in engines:
+        event.listen(target, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        for target in engines:
+            event.remove(target, "before_cursor_execute", before_cursor_execute)
+
+
+def _create_user(db, label):
+    user = User(
+        email=f"query_count_{label}_{uuid.uuid4().hex[:8]}@example.com",
+        password_hash="not-a-real-hash",
+        full_name=f"Query Count {label}"
+    )
+    db.add(user)
+    db.flush()
+    return user
+
+
+def _create_uploads(db, owner, viewer, count):
+    for i in range(count):
+        upload = Upload(user_id=owner.id, filename=f"feedback_{i}.csv", row_count=10, status="completed")
+        db.add(upload)
+        db.flush()
+        db.add(AnalysisResult(
+            upload_id=upload.id,
+            executive_summary="Summary",
+            themes_json=[{"name": "Theme A"}, {"name": "Theme B"}],
+            confidence_score=80
+        ))
+        db.add(UploadShare(upload_id=upload.id, shared_with_user_id=viewer.id, owner_id=owner.id))
+
+
+@pytest.fixture
+def seeded_users():
+    db = SessionLocal()
+    owner = _create_user(db, "owner")
+    viewer = _create_user(db, "viewer")
+    db.commit()
+    ids = SimpleNamespace(owner=owner.id, viewer=viewer.id, owner_email=owner.email, viewer_email=viewer.email)
+    try:
+        yield db, owner, viewer, ids
+    finally:
+        db.rollback()
+        db.query(User).filter(User.id.in_([ids.owner, ids.viewer])).delete(synchronize_session=False)
+        db.commit()
+        db.close()
+        app.dependency_overrides.clear()
+
+
+def _listing_query_count(path, user_id, email):
+    app.dependency_overrides[get_current_principal] = lambda: SimpleNamespace(id=user_id, email=email)
+    client = TestClient(app)
+    with count_queries() as statements:
+        response = client.get(path)
+    assert response.status_code == 200, response.text
+    return len(statements), response.json()["uploads"]
+
+
+def test_listing_query_count_does_not_grow_with_uploads(seeded_users):
+    db, owner, viewer, ids = seeded_users
+
+    _create_uploads(db, owner, viewer, 1)
+    db.commit()
+    own_small, uploads = _listing_query_count("/api/uploads", ids.owner, ids.owner_email)
+    shared_small, shared = _listing_query_count("/api/uploads/shared-with-me", ids.viewer, ids.viewer_email)
+    assert len(uploads) == 1 and len(shared) == 1
+
+    _create_uploads(db, owner, viewer, 9)
+    db.commit()
+    own_large, uploads = _listing_query_count("/api/uploads", ids.owner, ids.owner_email)
+    shared_large, shared = _listing_query_count("/api/uploads/shared-with-me", ids.viewer, ids.viewer_email)
+    assert len(uploads) == 10 and len(shared) == 10
+
+    assert own_large == own_small
+    assert shared_large == shared_small
+    assert uploads[0]["theme_count"] == 2 and uploads[0]["has_analysis"] is True
+    assert shared[0]["owner_email"] == ids.owner_email
@@ -1,53 +1,161 @@
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Depends, status, BackgroundTasks
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Depends, status
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
-from typing import Optional
+from typing import Optional, List, Dict
 import pandas as pd
-import io
+import os
+import time
+import asyncio
 from datetime import datetime
 import logging
 
-from database import get_db, SessionLocal
-from models import Upload, FeedbackEntry, User, UsageQuota, AnalysisResult
-from auth import get_current_user
+from database import get_db
+from models import Upload, FeedbackEntry, UsageQuota, AnalysisResult, AnalysisJob, AnalysisRollup
+from auth import Principal, get_current_principal
+from access import invalidate_upload_access
+from services.response_cache import invalidate_analysis_responses
+from services.report_renderer import report_cache, report_renderer
+from services.job_queue import enqueue_analysis
+from services.trends import build_rollup
 
 router = APIRouter()
 
-# Maximum file size: 10MB
-MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB in bytes
-MAX_ROWS = 10000
+# Maximum file size: 10MB by default. Ingestion streams the spooled upload in
+# chunks, so peak memory is bounded by INGEST_CHUNK_ROWS rather than file size
+# and these limits can be raised through the environment.
+MAX_FILE_SIZE = int(os.getenv("MAX_UPLOAD_BYTES", 10 * 1024 * 1024))  # bytes
+MAX_ROWS = int(os.getenv("MAX_UPLOAD_ROWS", 10000))
+INGEST_CHUNK_ROWS = int(os.getenv("INGEST_CHUNK_ROWS", 1000))
+
+# Priority keywords to search for when picking the feedback column
+FEEDBACK_COLUMN_KEYWORDS = ['description', 'feedback', 'summary', 'subject', 'content', 'text', 'comment', 'message', 'update', 'note', 'detail', 'retro', 'issue']
 
 logger = logging.getLogger(__name__)
 
-async def run_ai_analysis(upload_id: str, db_session_factory, ignored_words: Optional[str] = None, persona: Optional[str] = None):
-    """Background task to run AI analysis and store results"""
-    # Create a new DB session for the background task
+def _detect_feedback_column(df: pd.DataFrame) -> Optional[str]:
+    """Pick the column holding the free-text feedback from a (first) chunk of the CSV"""
+    # 1. Exact match first
+    for keyword in FEEDBACK_COLUMN_KEYWORDS:
+        for col in df.columns:
+            if str(col).lower().strip() == keyword:
+                return col
+
+    # 2. Contains match (e.g., 'update_text', 'customer feedback')
+    for keyword in FEEDBACK_COLUMN_KEYWORDS:
+        for col in df.columns:
+            if keyword in str(col).lower().strip():
+                return col
+
+    # 3. Intelligent fallback: pick the text column with the longest average string length.
+    # Chunks are read as strings, so skip columns whose values are all numeric.
+    feedback_column = None
+    max_len = -1
+    for col in df.columns:
+        values = df[col].dropna()
+        if len(values) == 0 or pd.to_numeric(values, errors='coerce').notna().all():
+            continue
+        # Calculate mean string length for this column
+        avg_len = values.astype(str).str.len().mean()
+        if avg_len > max_len:
+            max_len = avg_len
+            feedback_column = col
+    return feedback_column
+
+def _prepare_feedback_rows(chunk: pd.DataFrame, feedback_column: str, upload_id) -> List[Dict]:
+    """
+    Build FeedbackEntry insert parameters for a chunk column-wise.
+
+    Content is stripped and blank rows dropped with vectorized string ops; metadata
+    keeps every other non-null cell as a string, and source prefers a 'source'
+    column over 'Source' exactly like the old per-row lookup. row_index is the
+    row's position in the file (read_csv numbers rows across chunks).
+    """
+    content = chunk[feedback_column].astype(str).str.strip()
+    keep = chunk[feedback_column].notna() & (content != "")
+    if not keep.any():
+        return []
+
+    others = chunk.loc[keep, [col for col in chunk.columns if col != feedback_column]]
+    # Missing cells become NaN (not str), which is what the per-record filter drops
+    others = others.astype(str).mask(others.isna())
+
+    source = pd.Series(None, index=others.index, dtype=object)
+    for col in ('Source', 'source'):
+        if col in others.columns:
+            values = others[col]
+            source = values.where(values.notna() & (values != ""), source)
+
+    metadata = [
+        {col: value for col, value in record.items() if isinstance(value, str)}
+        for record in others.to_dict('records')
+    ]
+
+    return [
+        {"upload_id": upload_id, "content": text, "source": src if isinstance(src, str) else None, "metadata_json": meta, "row_index": int(index)}
+        for index, text, src, meta in zip(others.index, content[keep].tolist(), source.tolist(), metadata)
+    ]
+
+def _upload_size(file: UploadFile) -> int:
+    """Size of the spooled upload, measured without reading it into memory"""
+    file.file.seek(0, os.SEEK_END)
+    size = file.file.tell()
+    file.file.seek(0)
+    return size
+
+def _run_metadata(analysis_result: Dict) -> Dict:
+    """Diagnostics from an AI run that are stored next to processing_time_ms"""
+    return {
+        "model_used": analysis_result.get('model_used'),
+        "stage_timings_ms": analysis_result.get('stage_timings_ms', {}),
+        "feedback_count": analysis_result.get('feedback_count'),
+        "feedback_analyzed": analysis_result.get('feedback_analyzed'),
+        "cache_hit": analysis_result.get('cache_hit', False),
+        "analysis_mode": analysis_result.get('analysis_mode'),
+        "sampling_strategy": analysis_result.get('sampling_strategy'),
+        "prompt_tokens": analysis_result.get('prompt_tokens')
+    }
+
+def _load_analysis_input(db_session_factory, upload_id: str):
+    """
+    Blocking first phase of an analysis: mark the upload processing and read its
+    feedback (only the columns the AI service uses). Returns the feedback rows, or
+    a bool when there is nothing to run (missing upload, or a result already stored).
+    """
     db = db_session_factory()
     try:
-        from services.ai_service import ai_service
-        logger.info(f"🚀 Starting Background AI Analysis for Upload {upload_id}...")
-        
-        # Get upload and quota
         upload = db.query(Upload).filter(Upload.id == upload_id).first()
         if not upload:
             logger.error(f"❌ Upload {upload_id} not found for background analysis")
-            return
-            
-        quota = db.query(UsageQuota).filter(UsageQuota.user_id == upload.user_id).first()
-        
-        # Get feedback entries
-        feedback_entries = db.query(FeedbackEntry).filter(
-            FeedbackEntry.upload_id == upload.id
-        ).all()
-        
-        feedback_data = [
-            {"content": entry.content, "source": entry.source, "metadata": entry.metadata_json}
-            for entry in feedback_entries
-        ]
-        
-        # Run AI analysis
-        plan_tier = "pro" # Give all users full features since payment is removed
-        analysis_result = await ai_service.analyze_feedback(feedback_data, str(upload.id), plan_tier, ignored_words=ignored_words, persona=persona)
-        
+            return False
+
+        # Jobs can be re-run after a worker crash; a stored result means we're done
+        existing_result = db.query(AnalysisResult.theme_count).filter(AnalysisResult.upload_id == upload.id).first()
+        if existing_result:
+            logger.info(f"ℹ️ Analysis for {upload.id} already stored, skipping")
+            has_themes = (existing_result.theme_count or 0) > 0
+            upload.status = "completed" if has_themes else "failed"
+            db.commit()
+            return has_themes
+
+        upload.status = "processing"
+        db.commit()
+
+        rows = db.query(
+            FeedbackEntry.content, FeedbackEntry.source, FeedbackEntry.metadata_json
+        ).filter(FeedbackEntry.upload_id == upload_id).all()
+        return [{"content": row.content, "source": row.source, "metadata": row.metadata_json} for row in rows]
+    finally:
+        db.close()
+
+def _store_analysis_result(db_session_factory, upload_id: str, analysis_result: Dict) -> bool:
+    """Blocking last phase of an analysis: persist the result (and rollup, quota) in one commit"""
+    db = db_session_factory()
+    try:
+        upload = db.query(Upload).filter(Upload.id == upload_id).first()
+        if not upload:
+            logger.error(f"❌ Upload {upload_id} was deleted during analysis")
+            return False
+
         # Check if analysis actually succeeded or returned an error
         if analysis_result.get('error'):
             analysis_error = analysis_result.get('error')
@@ -59,61 +167,118 @@ async def run_ai_analysis(upload_id: str, db_session_factory, ignored_words: Opt
                 executive_summary=f"Analysis failed: {analysis_error}",
                 themes_json=[],
                 confidence_score=0,
-                processing_time_ms=analysis_result.get('processing_time_ms', 0)
+                processing_time_ms=analysis_result.get('processing_time_ms', 0),
+                run_metadata_json=_run_metadata(analysis_result)
             )
             db.add(analysis_record)
+            upload.status = "failed"
             db.commit()
-        else:
-            # Store successful analysis results
+            return False
+
+        quota = db.query(UsageQuota).filter(UsageQuota.user_id == upload.user_id).first()
+
+        # Store successful analysis results
+        analysis_record = AnalysisResult(
+            upload_id=upload.id,
+            themes_json=analysis_result.get('themes', []),
+            executive_summary=analysis_result.get('executive_summary', ''),
+            confidence_score=analysis_result.get('confidence_score', 0),
+            processing_time_ms=analysis_result.get('processing_time_ms', 0),
+            agile_risks_json=analysis_result.get('agile_risks', None),
+            run_metadata_json=_run_metadata(analysis_result)
+        )
+        db.add(analysis_record)
+        # Narrow trend rollup, committed together with the result
+        rollup = build_rollup(upload, analysis_record.themes_json, analysis_record.agile_risks_json)
+        if rollup:
+            db.add(rollup)
+        upload.status = "completed"
+        
+        # Increment usage quota (ONLY on success)
+        if quota:
+            quota.analyses_used += 1
+        
+        report_data = {
+            "filename": upload.filename,
+            "executive_summary": analysis_record.executive_summary,
+            "themes": analysis_record.themes_json or [],
+            "agile_risks": analysis_record.agile_risks_json
+        }
+        owner_tier = getattr(quota, "plan_tier", None) or "demo"
+        
+        db.flush()
+        analysis_id = analysis_record.id
+        db.commit()
+        logger.info(f"✅ AI analysis stored for {upload.id}. Quota used: {quota.analyses_used if quota else 'N/A'}")
+        report_renderer.schedule_prerender(analysis_id, owner_tier, report_data)
+        return True
+    finally:
+        db.close()
+
+def _record_analysis_failure(db_session_factory, upload_id: str, error: Exception):
+    """Mark the upload failed after a crash, storing a failed result unless one exists"""
+    db = db_session_factory()
+    try:
+        db.query(Upload).filter(Upload.id == upload_id).update({Upload.status: "failed"}, synchronize_session=False)
+        # Check if record already exists to avoid unique constraint error
+        existing = db.query(AnalysisResult.id).filter(AnalysisResult.upload_id == upload_id).first()
+        if not existing:
             analysis_record = AnalysisResult(
-                upload_id=upload.id,
-                themes_json=analysis_result.get('themes', []),
-                executive_summary=analysis_result.get('executive_summary', ''),
-                confidence_score=analysis_result.get('confidence_score', 0),
-                processing_time_ms=analysis_result.get('processing_time_ms', 0),
-                agile_risks_json=analysis_result.get('agile_risks', None)
+                upload_id=upload_id,
+                executive_summary=f"Analysis failed due to system error: {str(error)}",
+                themes_json=[],
+                confidence_score=0
             )
             db.add(analysis_record)
-            
-            # Increment usage quota (ONLY on success)
-            if quota:
-                quota.analyses_used += 1
-            
-            db.commit()
-            logger.info(f"✅ AI analysis stored for {upload.id}. Quota used: {quota.analyses_used if quota else 'N/A'}")
+        db.commit()
+    finally:
+        db.close()
+
+async def run_ai_analysis(upload_id: str, db_session_factory, ignored_words: Optional[str] = None, persona: Optional[str] = None) -> bool:
+    """
+    Run AI analysis for an upload and store results.
+    Executed by the analysis worker (services/job_queue.py); returns True on success.
+    Moves Upload.status through processing -> completed/failed.
+    The blocking DB phases run in threads so the event loop (the API's, when the
+    worker runs in-process) only ever waits on the AI calls.
+    On success the exports are pre-rendered in the background (EXPORT_PRERENDER_ENABLED)
+    into the report cache of the host running the worker.
+    """
+    try:
+        from services.ai_service import ai_service
+        logger.info(f"🚀 Starting Background AI Analysis for Upload {upload_id}...")
+        
+        feedback_data = await asyncio.to_thread(_load_analysis_input, db_session_factory, upload_id)
+        if isinstance(feedback_data, bool):
+            return feedback_data
+        
+        # Run AI analysis
+        plan_tier = "pro" # Give all users full features since payment is removed
+        analysis_result = await ai_service.analyze_feedback(feedback_data, str(upload_id), plan_tier, ignored_words=ignored_words, persona=persona)
+        del feedback_data
+        
+        return await asyncio.to_thread(_store_analysis_result, db_session_factory, upload_id, analysis_result)
         
     except Exception as e:
         logger.error(f"❌ Critical AI background task exception for {upload_id}: {str(e)}")
         # Try to record failure even if we hit a crash
         try:
-            # Check if record already exists to avoid unique constraint error
-            existing = db.query(AnalysisResult).filter(AnalysisResult.upload_id == upload_id).first()
-            if not existing:
-                analysis_record = AnalysisResult(
-                    upload_id=upload_id,
-                    executive_summary=f"Analysis failed due to system error: {str(e)}",
-                    themes_json=[],
-                    confidence_score=0
-                )
-                db.add(analysis_record)
-                db.commit()
+            await asyncio.to_thread(_record_analysis_failure, db_session_factory, upload_id, e)
         except:
             pass
-    finally:
-        db.close()
+        return False
 
 @router.post("/upload")
-async def upload_csv(
-    background_tasks: BackgroundTasks,
+def upload_csv(
     file: UploadFile = File(...),
     ignored_words: Optional[str] = Form(None),
     persona: Optional[str] = Form(None),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """
     Upload a CSV file containing feedback data.
-    AI analysis runs in the background.
+    AI analysis is queued and picked up by an analysis worker.
     """
     # 0. Check Usage Quota
     quota = db.query(UsageQuota).filter(UsageQuota.user_id == current_user.id).first()
@@ -133,96 +298,75 @@ async def upload_csv(
     if not file.filename.endswith('.csv'):
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Please upload a CSV file")
     
+    file_size = _upload_size(file)
+    if file_size > MAX_FILE_SIZE:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="File too large")
+
+    ingest_start = time.perf_counter()
     try:
-        content = await file.read()
-        file_size = len(content)
-        
-        if file_size > MAX_FILE_SIZE:
-            raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="File too large")
-        
+        # Stream the spooled upload in chunks instead of loading it whole. Values are
+        # read as strings so every chunk yields the same metadata representation.
         try:
-            df = pd.read_csv(io.BytesIO(content))
+            reader = pd.read_csv(file.file, chunksize=INGEST_CHUNK_ROWS, dtype=str)
+            first_chunk = next(reader, None)
         except Exception as e:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid CSV: {str(e)}")
-        
-        if len(df) == 0:
+
+        if first_chunk is None or len(first_chunk) == 0:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="CSV is empty")
-        
-        # Priority keywords to search for
-        feedback_column = None
-        priority_keywords = ['description', 'feedback', 'summary', 'subject', 'content', 'text', 'comment', 'message', 'update', 'note', 'detail', 'retro', 'issue']
-        
-        # 1. Exact match first
-        for keyword in priority_keywords:
-            for col in df.columns:
-                if col.lower().strip() == keyword:
-                    feedback_column = col
-                    break
-            if feedback_column: break
-            
-        # 2. Contains match (e.g., 'update_text', 'customer feedback')
-        if not feedback_column:
-            for keyword in priority_keywords:
-                for col in df.columns:
-                    if keyword in col.lower().strip():
-                        feedback_column = col
-                        break
-                if feedback_column: break
-        
-        # 3. Intelligent fallback: pick the text column with the longest average string length
-        if not feedback_column:
-            object_cols = df.select_dtypes(include=['object']).columns
-            if len(object_cols) > 0:
-                max_len = -1
-                for col in object_cols:
-                    # Calculate mean string length for this column
-                    avg_len = df[col].astype(str).str.len().mean()
-                    if avg_len > max_len:
-                        max_len = avg_len
-                        feedback_column = col
-        
+
+        feedback_column = _detect_feedback_column(first_chunk)
         if not feedback_column:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Could not identify the primary text column in CSV")
-        
+
         # Create Upload record
         upload = Upload(
             user_id=current_user.id,
             filename=file.filename,
             file_size_bytes=file_size,
-            row_count=len(df),
-            status="completed"
+            row_count=0,
+            status="pending"
         )
         db.add(upload)
         db.flush()
-        
+
         feedback_count = 0
-        for index, row in df.iterrows():
-            feedback_text = row[feedback_column]
-            if pd.isna(feedback_text) or str(feedback_text).strip() == "": continue
-            
-            metadata = {col: str(row[col]) for col in df.columns if col != feedback_column and not pd.isna(row[col])}
-            source = metadata.get('source') or metadata.get('Source')
-            
-            feedback_entry = FeedbackEntry(
-                upload_id=upload.id,
-                content=str(feedback_text).strip(),
-                source=source,
-                metadata_json=metadata
-            )
-            db.add(feedback_entry)
-            feedback_count += 1
-        
+        parsed_rows = 0
+        chunk = first_chunk
+        while chunk is not None:
+            parsed_rows += len(chunk)
+            if parsed_rows > MAX_ROWS:
+                db.rollback()
+                raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=f"CSV has too many rows (max {MAX_ROWS})")
+
+            rows = _prepare_feedback_rows(chunk, feedback_column, upload.id)
+            if rows:
+                # Batched executemany (insertmanyvalues) for the whole chunk
+                db.execute(insert(FeedbackEntry), rows)
+            feedback_count += len(rows)
+
+            try:
+                chunk = next(reader, None)
+            except Exception as e:
+                db.rollback()
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid CSV: {str(e)}")
+
         upload.row_count = feedback_count
+        # Queue AI analysis in the same transaction as the upload rows
+        enqueue_analysis(db, upload.id, ignored_words, persona)
         db.commit()
-        
-        # Trigger AI analysis as Background Task
-        background_tasks.add_task(run_ai_analysis, str(upload.id), SessionLocal, ignored_words, persona)
+
+        ingest_seconds = time.perf_counter() - ingest_start
+        rows_per_sec = int(feedback_count / ingest_seconds) if ingest_seconds > 0 else feedback_count
+        logger.info(f"📥 Ingested {feedback_count} feedback rows for upload {upload.id} in {ingest_seconds:.2f}s ({rows_per_sec} rows/sec)")
+
         
         return {
             "upload_id": str(upload.id),
             "filename": upload.filename,
             "row_count": feedback_count,
-            "status": "completed",
+            "ingest_rows_per_sec": rows_per_sec,
+            "status": "pending",
             "message": "Upload successful. AI analysis is running in the background."
         }
         
@@ -233,9 +377,9 @@ async def upload_csv(
         raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
 
 @router.delete("/uploads/{upload_id}")
-async def delete_upload(
+def delete_upload(
     upload_id: str,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """
@@ -249,25 +393,30 @@ async def delete_upload(
     if not upload:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Analysis not found or you don't have permission to delete it.")
         
+    analysis_id = db.query(AnalysisResult.id).filter(AnalysisResult.upload_id == upload.id).scalar()
     try:
         # Delete the upload (cascades to FeedbackEntry, AnalysisResult, UploadShare)
         db.delete(upload)
         db.commit()
+        invalidate_upload_access(upload_id)
+        invalidate_analysis_responses(upload_id)
+        if analysis_id:
+            report_cache.discard(analysis_id)
         return {"status": "success", "message": "Analysis deleted successfully"}
     except Exception as e:
         logger.error(f"Delete upload error {upload_id}: {str(e)}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to delete analysis")
 
 @router.post("/uploads/{upload_id}/retry")
-async def retry_analysis(
+def retry_analysis(
     upload_id: str,
-    background_tasks: BackgroundTasks,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """
     Retry a failed analysis.
-    This deletes the failed AnalysisResult and re-queues the background task.
+    This deletes the failed AnalysisResult and re-queues the analysis job.
+    Returns 409 while a job for the upload is still queued or running.
     """
     # Verify the upload exists and belongs to the user
     upload = db.query(Upload).filter(
@@ -277,24 +426,41 @@ async def retry_analysis(
     
     if not upload:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Analysis not found or you don't have permission to retry it.")
+    
+    # Deleting the result under a queued or running job would race with it
+    last_job = db.query(AnalysisJob).filter(
+        AnalysisJob.upload_id == upload.id
+    ).order_by(AnalysisJob.created_at.desc()).first()
+    if last_job and last_job.status in ("pending", "processing"):
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Analysis is already running. Please wait for it to finish.")
         
     # Find and delete the existing failed result
-    failed_result = db.query(AnalysisResult).filter(AnalysisResult.upload_id == upload_id).first()
+    failed_result = db.query(AnalysisResult.id).filter(AnalysisResult.upload_id == upload_id).first()
     
     if failed_result:
         # Check if it actually failed (or is pending). We don't want to retry a completed one
         # unless forced, but for now we assume the frontend only shows the retry button on failure.
-        db.delete(failed_result)
+        db.query(AnalysisResult).filter(AnalysisResult.id == failed_result.id).delete(synchronize_session=False)
+        db.query(AnalysisRollup).filter(AnalysisRollup.upload_id == upload.id).delete(synchronize_session=False)
         
         # Reset upload status to pending (optional but good practice)
         upload.status = "pending"
         db.commit()
+        invalidate_analysis_responses(upload_id)
+        report_cache.discard(failed_result.id)
     else:
         # If no result exists yet, it might be stuck. We can still try to queue it.
         pass
         
-    # Re-queue the background task
-    background_tasks.add_task(run_ai_analysis, str(upload.id), SessionLocal)
+    # Re-queue the job, keeping the options the upload was analysed with
+    enqueue_analysis(
+        db,
+        upload.id,
+        last_job.ignored_words if last_job else None,
+        last_job.persona if last_job else None
+    )
+    upload.status = "pending"
+    db.commit()
     
     return {
         "status": "success", 
@@ -0,0 +1,51 @@
+"""
+Standalone AI analysis worker.
+
+Claims jobs from the analysis_jobs table and runs them, so analysis capacity can
+be scaled independently of the API. Set ANALYSIS_WORKER_INPROCESS=false on the
+API processes when running dedicated workers:
+
+    python worker.py --concurrency 4
+"""
+import os
+import sys
+import signal
+import asyncio
+import logging
+import argparse
+from dotenv import load_dotenv
+
+env_path = os.path.join(os.path.dirname(__file__), '.env')
+if os.path.exists(env_path):
+    load_dotenv(env_path)
+
+from database import SessionLocal, create_schema
+from services.job_queue import AnalysisWorker, WORKER_CONCURRENCY
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s [%(levelname)s] %(message)s',
+    handlers=[logging.StreamHandler()]
+)
+
+
+async def main(concurrency: int):
+    create_schema()
+    worker = AnalysisWorker(SessionLocal, concurrency=concurrency)
+
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, worker.stop)
+        except NotImplementedError:
+            pass
+
+    await worker.run()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="ProductLogik AI analysis worker")
+    parser.add_argument("--concurrency", type=int, default=WORKER_CONCURRENCY, help="Number of analyses to run at once")
+    args = parser.parse_args()
+    sys.stdout.flush()
+    asyncio.run(main(args.concurrency))
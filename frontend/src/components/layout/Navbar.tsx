@@ -2,7 +2,7 @@ import { Button } from "../ui/Button";
 import { Link } from "react-router";
 import { User, LogOut, Settings } from "lucide-react";
 import { useState, useEffect, useRef } from "react";
-import { getUserProfile } from "../../lib/api";
+import { getUserProfile, logout } from "../../lib/api";
 
 export function Navbar() {
     const [isLoggedIn, setIsLoggedIn] = useState(false);
@@ -55,8 +55,8 @@ export function Navbar() {
         };
     }, []);
 
-    const handleLogout = () => {
-        localStorage.removeItem("token");
+    const handleLogout = async () => {
+        await logout();
         setIsLoggedIn(false);
         setShowUserMenu(false);
         setFirstName("Account");
@@ -60,7 +60,75 @@ export interface Upload {
     permission?: string;
 }
 
-export async function login(email: string, password: string): Promise<{ access_token: string, token_type: string }> {
+export interface AuthTokens {
+    access_token: string;
+    token_type: string;
+    refresh_token?: string;
+    expires_in?: number;
+}
+
+// Tokens live in localStorage: "token" is the short-lived access token, "refresh_token"
+// is exchanged for a new pair when an authenticated request comes back 401.
+export function storeSession(tokens: AuthTokens) {
+    localStorage.setItem("token", tokens.access_token);
+    if (tokens.refresh_token) {
+        localStorage.setItem("refresh_token", tokens.refresh_token);
+    }
+}
+
+export function clearSession() {
+    localStorage.removeItem("token");
+    localStorage.removeItem("refresh_token");
+}
+
+let refreshInFlight: Promise<string | null> | null = null;
+
+// One refresh at a time per tab: concurrent 401s wait for the same rotation
+export function refreshAccessToken(): Promise<string | null> {
+    if (!refreshInFlight) {
+        refreshInFlight = (async () => {
+            const refreshToken = localStorage.getItem("refresh_token");
+            if (!refreshToken) return null;
+            try {
+                const response = await fetch(`${API_URL}/auth/refresh`, {
+                    method: "POST",
+                    headers: {
+                        "Content-Type": "application/json",
+                    },
+                    body: JSON.stringify({ refresh_token: refreshToken }),
+                });
+                if (!response.ok) {
+                    if (response.status === 401) clearSession();
+                    return null;
+                }
+                const tokens: AuthTokens = await response.json();
+                storeSession(tokens);
+                return tokens.access_token;
+            } catch (e) {
+                console.error("Token refresh failed:", e);
+                return null;
+            }
+        })().finally(() => {
+            refreshInFlight = null;
+        });
+    }
+    return refreshInFlight;
+}
+
+// fetch for authenticated endpoints: on 401 the access token is refreshed and the request retried once
+async function authFetch(url: string, init: RequestInit = {}): Promise<Response> {
+    const response = await fetch(url, init);
+    if (response.status !== 401) return response;
+
+    const accessToken = await refreshAccessToken();
+    if (!accessToken) return response;
+
+    const headers = new Headers(init.headers);
+    headers.set("Authorization", `Bearer ${accessToken}`);
+    return fetch(url, { ...init, headers });
+}
+
+export async function login(email: string, password: string): Promise<AuthTokens> {
     const formData = new FormData();
     formData.append("username", email);
     formData.append("password", password);
@@ -78,6 +146,24 @@ export async function login(email: string, password: string): Promise<{ access_t
     return response.json();
 }
 
+// Revokes the refresh token on the server (best effort) and forgets both tokens
+export async function logout(): Promise<void> {
+    const refreshToken = localStorage.getItem("refresh_token");
+    clearSession();
+    if (!refreshToken) return;
+    try {
+        await fetch(`${API_URL}/auth/logout`, {
+            method: "POST",
+            headers: {
+                "Content-Type": "application/json",
+            },
+            body: JSON.stringify({ refresh_token: refreshToken }),
+        });
+    } catch (e) {
+        console.warn("Logout request failed:", e);
+    }
+}
+
 export async function register(email: string, password: string, full_name: string, company_name: string): Promise<any> {
     console.log("Attempting to register:", email, "at", `${API_URL}/auth/register`);
     try {
@@ -133,7 +219,7 @@ export async function getUserProfile(token: string): Promise<{
         plan_tier?: string;
     };
 }> {
-    const response = await fetch(`${API_URL}/auth/me`, {
+    const response = await authFetch(`${API_URL}/auth/me`, {
         method: "GET",
         headers: {
             "Authorization": `Bearer ${token}`,
@@ -164,7 +250,7 @@ export async function updateUserProfile(
         plan_tier?: string;
     };
 }> {
-    const response = await fetch(`${API_URL}/auth/me`, {
+    const response = await authFetch(`${API_URL}/auth/me`, {
         method: "PATCH",
         headers: {
             "Authorization": `Bearer ${token}`,
@@ -193,7 +279,7 @@ export async function uploadCSV(file: File, token: string, ignoredWords?: string
     if (ignoredWords && ignoredWords.trim()) formData.append("ignored_words", ignoredWords.trim());
     if (persona && persona.trim()) formData.append("persona", persona.trim());
 
-    const response = await fetch(`${API_URL}/upload`, {
+    const response = await authFetch(`${API_URL}/upload`, {
         method: "POST",
         headers: {
             "Authorization": `Bearer ${token}`,
@@ -210,7 +296,7 @@ export async function uploadCSV(file: File, token: string, ignoredWords?: string
 }
 
 export async function getUserUploads(token: string): Promise<{ uploads: Upload[] }> {
-    const response = await fetch(`${API_URL}/uploads`, {
+    const response = await authFetch(`${API_URL}/uploads`, {
         method: "GET",
         headers: {
             "Authorization": `Bearer ${token}`,
@@ -229,7 +315,7 @@ export async function getUserUploads(token: string): Promise<{ uploads: Upload[]
 }
 
 export async function getAnalysis(uploadId: string, token: string): Promise<AnalysisResult> {
-    const response = await fetch(`${API_URL}/analysis/${uploadId}`, {
+    const response = await authFetch(`${API_URL}/analysis/${uploadId}`, {
         method: "GET",
         headers: {
             "Authorization": `Bearer ${token}`,
@@ -245,7 +331,7 @@ export async function getAnalysis(uploadId: string, token: string): Promise<Anal
 }
 
 export async function getAnalysisTrends(token: string): Promise<{ trends: any[] }> {
-    const response = await fetch(`${API_URL}/analysis/trends`, {
+    const response = await authFetch(`${API_URL}/analysis/trends`, {
         method: "GET",
         headers: {
             "Authorization": `Bearer ${token}`,
@@ -261,7 +347,7 @@ export async function getAnalysisTrends(token: string): Promise<{ trends: any[]
 }
 
 export async function deleteAnalysis(uploadId: string, token: string): Promise<any> {
-    const response = await fetch(`${API_URL}/uploads/${uploadId}`, {
+    const response = await authFetch(`${API_URL}/uploads/${uploadId}`, {
         method: "DELETE",
         headers: {
             "Authorization": `Bearer ${token}`,
@@ -277,7 +363,7 @@ export async function deleteAnalysis(uploadId: string, token: string): Promise<a
 }
 
 export async function retryAnalysis(uploadId: string, token: string): Promise<any> {
-    const response = await fetch(`${API_URL}/uploads/${uploadId}/retry`, {
+    const response = await authFetch(`${API_URL}/uploads/${uploadId}/retry`, {
         method: "POST",
         headers: {
             "Authorization": `Bearer ${token}`,
@@ -293,7 +379,7 @@ export async function retryAnalysis(uploadId: string, token: string): Promise<an
 }
 
 export async function getSharedUploads(token: string): Promise<{ uploads: Upload[] }> {
-    const response = await fetch(`${API_URL}/uploads/shared-with-me`, {
+    const response = await authFetch(`${API_URL}/uploads/shared-with-me`, {
         method: "GET",
         headers: {
             "Authorization": `Bearer ${token}`,
@@ -309,7 +395,7 @@ export async function getSharedUploads(token: string): Promise<{ uploads: Upload
 }
 
 export async function shareUpload(uploadId: string, email: string, token: string): Promise<any> {
-    const response = await fetch(`${API_URL}/uploads/${uploadId}/share`, {
+    const response = await authFetch(`${API_URL}/uploads/${uploadId}/share`, {
         method: "POST",
         headers: {
             "Authorization": `Bearer ${token}`,
@@ -343,7 +429,7 @@ export async function submitContactForm(name: string, email: string, message: st
 }
 
 export async function submitThemeFeedback(uploadId: string, themeName: string, isHelpful: boolean, token: string): Promise<void> {
-    const response = await fetch(`${API_URL}/analysis/${uploadId}/feedback`, {
+    const response = await authFetch(`${API_URL}/analysis/${uploadId}/feedback`, {
         method: "POST",
         headers: {
             "Authorization": `Bearer ${token}`,
@@ -380,7 +466,7 @@ export async function compareAnalyses(uploadIdA: string, uploadIdB: string, toke
     upload_b: { upload_id: string; filename: string; created_at: string | null };
     synthesis: string;
 }> {
-    const response = await fetch(`${API_URL}/analysis/compare`, {
+    const response = await authFetch(`${API_URL}/analysis/compare`, {
         method: "POST",
         headers: {
             "Authorization": `Bearer ${token}`,
@@ -397,7 +483,7 @@ export async function compareAnalyses(uploadIdA: string, uploadIdB: string, toke
 }
 
 export async function exportAnalysis(uploadId: string, token: string): Promise<Blob> {
-    const response = await fetch(`${API_URL}/analysis/${uploadId}/export`, {
+    const response = await authFetch(`${API_URL}/analysis/${uploadId}/export`, {
         method: "GET",
         headers: {
             "Authorization": `Bearer ${token}`,
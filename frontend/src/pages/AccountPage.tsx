@@ -2,7 +2,7 @@ import { Button } from "../components/ui/Button";
 import { useNavigate } from "react-router";
 import { User, LogOut, CreditCard, Edit2, Save, X } from "lucide-react";
 import { useEffect, useState } from "react";
-import { getUserProfile, updateUserProfile } from "../lib/api";
+import { getUserProfile, updateUserProfile, logout } from "../lib/api";
 import { toast } from "sonner";
 
 export function AccountPage() {
@@ -61,8 +61,8 @@ export function AccountPage() {
         setIsEditing(false);
     };
 
-    const handleLogout = () => {
-        localStorage.removeItem("token");
+    const handleLogout = async () => {
+        await logout();
         navigate("/login");
     };
 
@@ -3,7 +3,7 @@ import { Button } from "../components/ui/Button";
 import { Card, CardContent, CardDescription, CardHeader, CardTitle } from "../components/ui/Card";
 import { Link } from "react-router";
 import { ArrowRight, FileText, Loader2, Plus, Trash2 } from "lucide-react";
-import { getUserUploads, getUserProfile, deleteAnalysis } from "../lib/api";
+import { getUserUploads, getUserProfile, deleteAnalysis, clearSession } from "../lib/api";
 import { Progress } from "../components/ui/Progress";
 import type { Upload } from "../lib/api";
 import { toast } from "sonner";
@@ -38,7 +38,7 @@ export function DashboardPage() {
                 console.error("Failed to fetch uploads:", err);
                 if (err.message && (err.message.includes("401") || err.message.includes("Unauthorized") || err.message.includes("permissions"))) {
                     // Token expired or invalid
-                    localStorage.removeItem("token");
+                    clearSession();
                     window.location.href = "/login";
                     return;
                 }
@@ -2,7 +2,7 @@ import { useState } from "react";
 import { Link, useNavigate } from "react-router";
 import { Button } from "../components/ui/Button";
 import { Card, CardContent, CardDescription, CardFooter, CardHeader, CardTitle } from "../components/ui/Card";
-import { login, getUserUploads } from "../lib/api";
+import { login, getUserUploads, storeSession } from "../lib/api";
 import { toast } from "sonner";
 
 export function LoginPage() {
@@ -17,7 +17,7 @@ export function LoginPage() {
 
         try {
             const data = await login(email, password);
-            localStorage.setItem("token", data.access_token);
+            storeSession(data);
             // Notify navbar of login state change
             window.dispatchEvent(new Event("loginStateChanged"));
 
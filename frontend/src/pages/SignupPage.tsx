@@ -2,7 +2,7 @@ import { useState } from "react";
 import { Link, useNavigate } from "react-router";
 import { Button } from "../components/ui/Button";
 import { Card, CardContent, CardDescription, CardFooter, CardHeader, CardTitle } from "../components/ui/Card";
-import { register } from "../lib/api";
+import { register, storeSession } from "../lib/api";
 import { toast } from "sonner";
 
 export function SignupPage() {
@@ -25,7 +25,7 @@ export function SignupPage() {
                 setSuccess(true);
             } else if (data.access_token) {
                 // Fallback for old behavior (should not happen with new backend)
-                localStorage.setItem("token", data.access_token);
+                storeSession(data);
                 window.dispatchEvent(new Event("loginStateChanged"));
                 navigate("/dashboard");
             }